@@ -0,0 +1,242 @@
+# backtest_estrategia.py
+
+import os
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from indicadores_tecnicos import calcular_indicadores_lote
+from rangos_sesion import cargar_sesiones, mascara_sesion
+from estrategia_trading import RompimientoML
+from motor_estrategias import MotorEstrategias
+from modelo_ml import cargar_modelo, calcular_features, calcular_confianza
+from dataset_particionado import DatasetParticionado
+from config_activos import CONFIG
+
+logger = logging.getLogger(__name__)
+
+def rompimientos_sesion(df, ventana="60D", sesiones=None):
+    """
+    Para cada vela indica si el cierre rompe el máximo o mínimo de cada sesión
+    dentro de la ventana móvil `ventana` (la misma historia que ve el bot en vivo).
+    Devuelve un DataFrame booleano con una columna por sesión.
+    """
+    resultado = pd.DataFrame(index=df.index)
+    close = df["close"]
+    for sesion, (inicio, fin, zona) in cargar_sesiones(sesiones).items():
+        en_sesion, _ = mascara_sesion(df.index, inicio, fin, zona)
+        maximo = df["high"].where(en_sesion).rolling(ventana).max()
+        minimo = df["low"].where(en_sesion).rolling(ventana).min()
+        resultado[sesion] = (close > maximo) | (close < minimo)
+    return resultado
+
+def resolver_salidas(high, low, close, entradas, direccion, sl, tp, horizonte):
+    """
+    Resuelve en bloque el primer toque de SL o TP en las velas posteriores a cada
+    entrada. Si ambos se tocan en la misma vela se asume el SL (criterio conservador).
+    Sin toque, la operación expira al cierre de la vela `horizonte` o queda abierta
+    al final de la serie.
+    """
+    n = len(close)
+    relleno = np.full(horizonte, np.nan)
+    futuros_h = sliding_window_view(np.concatenate([high, relleno]), horizonte)[entradas + 1]
+    futuros_l = sliding_window_view(np.concatenate([low, relleno]), horizonte)[entradas + 1]
+
+    compra = (direccion == 1)[:, None]
+    toca_tp = np.where(compra, futuros_h >= tp[:, None], futuros_l <= tp[:, None])
+    toca_sl = np.where(compra, futuros_l <= sl[:, None], futuros_h >= sl[:, None])
+
+    sin_toque = horizonte + 1
+    primer_tp = np.where(toca_tp.any(axis=1), toca_tp.argmax(axis=1), sin_toque)
+    primer_sl = np.where(toca_sl.any(axis=1), toca_sl.argmax(axis=1), sin_toque)
+
+    disponibles = np.minimum(n - 1 - entradas, horizonte)
+    resultado = np.where(primer_sl <= primer_tp, "SL", "TP")
+    velas = np.minimum(primer_sl, primer_tp) + 1
+    precio_salida = np.where(resultado == "SL", sl, tp)
+
+    sin_salida = np.minimum(primer_sl, primer_tp) == sin_toque
+    ultima = entradas + np.maximum(disponibles, 0)
+    resultado = np.where(sin_salida, np.where(disponibles >= horizonte, "EXPIRA", "ABIERTA"), resultado)
+    velas = np.where(sin_salida, disponibles, velas)
+    precio_salida = np.where(sin_salida, close[ultima], precio_salida)
+    return resultado, velas, precio_salida
+
+def features_historia(df, motor, modelo=None, ventana="60D", min_velas=80):
+    """
+    Features del motor en todas las velas de `df` (con indicadores ya calculados),
+    cada una calculada una sola vez para todas las estrategias. El modelo solo puntúa
+    las velas candidatas de alguna estrategia; sin modelo la confianza es 1 (se omite
+    el filtro). Devuelve las features y los rompimientos por sesión.
+    """
+    rotos = rompimientos_sesion(df, ventana)
+    suficientes = df["close"].rolling(ventana).count().to_numpy() >= min_velas
+    validas = suficientes & df[["atr", "rsi"]].notna().all(axis=1).to_numpy()
+
+    f = {col: df[col].to_numpy(dtype=float) for col in ("atr", "ema_rapida", "ema_lenta", "rsi")}
+    f["precio"] = df["close"].to_numpy(dtype=float)
+    f["rompe"] = rotos.any(axis=1).to_numpy() & validas
+    # Sin temporalidades de confirmación en backtest
+    f["confirma_compra"] = f["confirma_venta"] = np.ones(len(df), dtype=bool)
+
+    if modelo is None or not motor.requiere("confianza"):
+        f["confianza"] = np.ones(len(df))
+    else:
+        f["confianza"] = np.zeros(len(df))
+        X = calcular_features(df, modelo.features)
+        filas = np.flatnonzero(motor.candidatas(f) & X.notna().all(axis=1).to_numpy())
+        if len(filas):
+            # Una sola llamada a predict_proba por activo
+            f["confianza"][filas] = calcular_confianza(modelo, X.iloc[filas])
+    return f, rotos
+
+def backtest_activo(nombre, df, modelo=None, umbral_confianza=0.55, horizonte=30,
+                    ventana="60D", min_velas=80, motor=None):
+    """
+    Evalúa las estrategias de `motor` (por defecto la de rompimiento + ML con
+    `umbral_confianza`) en todas las velas de `df` (con indicadores ya calculados)
+    y devuelve la tabla de operaciones. Sin modelo se omite el filtro de confianza.
+    """
+    motor = motor or MotorEstrategias([RompimientoML(umbral_confianza)])
+    df = df.sort_index()
+    f, rotos = features_historia(df, motor, modelo, ventana, min_velas)
+
+    grupos = motor.evaluar(f)
+    if not grupos:
+        return pd.DataFrame()
+    orden_estrategia = {e.nombre: i for i, e in enumerate(motor.estrategias)}
+    entradas = np.concatenate([filas for _, _, filas, _, _ in grupos])
+    direccion = np.concatenate([np.full(len(filas), d) for _, d, filas, _, _ in grupos])
+    sl = np.concatenate([stops for *_, stops, _ in grupos])
+    tp = np.concatenate([targets for *_, targets in grupos])
+    estrategia = np.concatenate([np.full(len(filas), e.nombre, dtype=object) for e, _, filas, _, _ in grupos])
+    riesgo = np.concatenate([f["atr"][filas] * e.mult_sl for e, _, filas, _, _ in grupos])
+    # Orden cronológico (y por estrategia dentro de una vela)
+    orden = np.lexsort(([orden_estrategia[e] for e in estrategia], entradas))
+    entradas, direccion, sl, tp, estrategia, riesgo = (
+        x[orden] for x in (entradas, direccion, sl, tp, estrategia, riesgo)
+    )
+
+    close = f["precio"]
+    precio = close[entradas]
+    resultado, velas, salida = resolver_salidas(
+        df["high"].to_numpy(dtype=float), df["low"].to_numpy(dtype=float), close,
+        entradas, direccion, sl, tp, horizonte,
+    )
+    retorno = direccion * (salida - precio) / precio
+
+    return pd.DataFrame({
+        "activo": nombre,
+        "estrategia": estrategia,
+        "fecha": df.index[entradas],
+        "tipo": np.where(direccion == 1, "BUY", "SELL"),
+        "precio": precio,
+        "sl": sl,
+        "tp": tp,
+        "confianza": f["confianza"][entradas],
+        "rangos": rotos.iloc[entradas].apply(lambda fila: ", ".join(fila.index[fila]), axis=1).to_numpy(),
+        "resultado": resultado,
+        "velas": velas,
+        "precio_salida": salida,
+        "retorno": retorno,
+        "r_multiplo": direccion * (salida - precio) / riesgo,
+        "fecha_salida": df.index[np.minimum(entradas + velas, len(df) - 1)],
+    })
+
+def resumir(operaciones):
+    """Estadísticas de una tabla de operaciones (cerradas) ordenadas por fecha de salida."""
+    cerradas = operaciones[operaciones["resultado"] != "ABIERTA"].sort_values("fecha_salida")
+    if cerradas.empty:
+        return pd.Series({"operaciones": 0})
+    retornos = cerradas["retorno"].to_numpy()
+    curva = np.cumsum(retornos)
+    ganancias = retornos[retornos > 0].sum()
+    perdidas = -retornos[retornos < 0].sum()
+    return pd.Series({
+        "operaciones": len(cerradas),
+        "aciertos": (retornos > 0).mean(),
+        "tp": (cerradas["resultado"] == "TP").sum(),
+        "sl": (cerradas["resultado"] == "SL").sum(),
+        "expiradas": (cerradas["resultado"] == "EXPIRA").sum(),
+        "retorno_medio": retornos.mean(),
+        "retorno_total": retornos.sum(),
+        "r_medio": cerradas["r_multiplo"].mean(),
+        "profit_factor": ganancias / perdidas if perdidas else np.inf,
+        "max_drawdown": (np.maximum.accumulate(np.concatenate([[0.0], curva])) - np.concatenate([[0.0], curva])).max(),
+        "velas_medias": cerradas["velas"].mean(),
+    })
+
+def backtest(dfs, modelo=None, umbral_confianza=0.55, horizonte=30, ventana="60D", motor=None):
+    """
+    Ejecuta el backtest sobre {activo: DataFrame OHLC}. Devuelve la tabla de
+    operaciones, el resumen por activo y el resumen de la cartera.
+    """
+    motor = motor or MotorEstrategias([RompimientoML(umbral_confianza)])
+    con_indicadores = calcular_indicadores_lote({n: df.copy() for n, df in dfs.items()})
+    tablas = [
+        backtest_activo(nombre, df, modelo, umbral_confianza, horizonte, ventana, motor=motor)
+        for nombre, df in con_indicadores.items() if df is not None
+    ]
+    tablas = [t for t in tablas if not t.empty]
+    if not tablas:
+        return pd.DataFrame(), pd.DataFrame(), pd.Series({"operaciones": 0})
+
+    operaciones = pd.concat(tablas, ignore_index=True)
+    por_activo = operaciones.groupby("activo").apply(resumir, include_groups=False)
+    return operaciones, por_activo, resumir(operaciones)
+
+def cargar_universo(ruta):
+    """Separa el dataset de entrenamiento (particionado o CSV) en un DataFrame OHLC por activo."""
+    if os.path.isdir(ruta):
+        dataset = DatasetParticionado(ruta, CONFIG.get("particion_dataset", "Y"))
+        df = dataset.leer(["open", "high", "low", "close"]).astype({c: float for c in ["open", "high", "low", "close"]})
+        df = df.reset_index()
+    else:
+        df = pd.read_csv(ruta, parse_dates=["Datetime"])
+    df.columns = [col.lower() for col in df.columns]
+    return {
+        activo: grupo.set_index("datetime")[["open", "high", "low", "close"]].sort_index()
+        for activo, grupo in df.groupby("activo")
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest vectorizado de la estrategia de rompimiento + ML")
+    parser.add_argument("--csv", default="datasets/dataset_entrenamiento_pro.csv", help="CSV o directorio particionado")
+    parser.add_argument("--modelo", default=CONFIG["modelo_path"])
+    parser.add_argument("--sin-modelo", action="store_true", help="Omitir el filtro de confianza ML")
+    parser.add_argument("--umbral", type=float, default=CONFIG["umbral_confianza"])
+    parser.add_argument("--horizonte", type=int, default=30, help="Velas máximas por operación")
+    parser.add_argument("--ventana", default=CONFIG["periodo"].upper(), help="Historia visible para los rangos")
+    parser.add_argument("--estrategias", nargs="+",
+                        help="Estrategias registradas o 'modulo:Clase' (por defecto rompimiento_ml con --umbral)")
+    parser.add_argument("--salida", default="backtest_operaciones.csv")
+    args = parser.parse_args()
+
+    modelo = None
+    if not args.sin_modelo:
+        if os.path.exists(args.modelo):
+            modelo = cargar_modelo(args.modelo, n_jobs=-1)
+        else:
+            print(f"⚠️ Modelo {args.modelo} no encontrado, se ejecuta sin filtro ML")
+
+    inicio = time.perf_counter()
+    motor = MotorEstrategias(args.estrategias) if args.estrategias else None
+    operaciones, por_activo, cartera = backtest(
+        cargar_universo(args.csv), modelo, args.umbral, args.horizonte, args.ventana, motor
+    )
+    duracion = time.perf_counter() - inicio
+
+    print("\n====== RESUMEN POR ACTIVO ======")
+    print(por_activo.to_string())
+    print("\n====== CARTERA ======")
+    print(cartera.to_string())
+    print(f"\n⏱️ Backtest completado en {duracion:.2f}s")
+
+    if not operaciones.empty:
+        operaciones.to_csv(args.salida, index=False)
+        print(f"✅ Operaciones guardadas en: {args.salida}")
+
+if __name__ == "__main__":
+    main()
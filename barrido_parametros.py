@@ -0,0 +1,298 @@
+# barrido_parametros.py
+
+import os
+import json
+import time
+import argparse
+import itertools
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from indicadores_tecnicos import construir_panel, calcular_indicadores_panel, calcular_periodos_panel
+from backtest_estrategia import rompimientos_sesion, resolver_salidas, cargar_universo
+from estrategia_trading import RSI_COMPRA, RSI_VENTA, MULT_SL, MULT_TP
+from modelo_ml import cargar_modelo, calcular_features, calcular_confianza
+from config_activos import CONFIG
+
+RUTA_RESULTADOS = "resultados_barrido.csv"
+
+# Grilla por defecto: los valores actuales de la estrategia y alternativas a cada lado.
+# Las bandas de RSI son (mínimo, máximo) exclusivos, como en estrategia_trading.
+GRILLA = {
+    "ema_rapida": [10, 15, 20, 25, 30],
+    "ema_lenta": [40, 50, 75, 100],
+    "rsi": [7, 14, 21],
+    "rsi_compra": [RSI_COMPRA, (45, 75), (50, 80)],
+    "rsi_venta": [RSI_VENTA, (25, 55), (20, 50)],
+    "mult_sl": [1.0, MULT_SL, 2.0],
+    "mult_tp": [1.5, MULT_TP, 3.0],
+    "umbral_confianza": [0.5, 0.55, 0.6, 0.65],
+}
+
+ACTUAL = {
+    "ema_rapida": 25, "ema_lenta": 50, "rsi": 14, "rsi_compra": RSI_COMPRA, "rsi_venta": RSI_VENTA,
+    "mult_sl": MULT_SL, "mult_tp": MULT_TP, "umbral_confianza": CONFIG["umbral_confianza"],
+}
+
+# ============================== PANEL COMPARTIDO ==============================
+
+def preparar_panel(dfs, grilla, modelo=None, ventana="60D", min_velas=80):
+    """
+    Lleva el universo ({activo: DataFrame OHLC}) a arrays (activos x velas) alineados
+    a la derecha: precios, ATR, fechas, velas candidatas (rompimiento de rango con
+    historia suficiente), confianza del modelo y la EMA/RSI de cada período de la
+    grilla, calculada una sola vez. Devuelve los arrays y la primera vela de cada activo.
+    """
+    dfs = {nombre: df.rename(columns=str.lower).sort_index() for nombre, df in dfs.items() if len(df)}
+    nombres, panel = construir_panel(dfs, ("high", "low", "close"))
+    activos, largo = panel["close"].shape
+    inicios = np.array([largo - len(dfs[nombre]) for nombre in nombres], dtype=np.int64)
+
+    arrays = dict(panel)
+    arrays["atr"] = calcular_indicadores_panel(panel["high"], panel["low"], panel["close"])["atr"]
+    arrays["fecha"] = np.zeros((activos, largo), dtype=np.int64)
+    arrays["candidata"] = np.zeros((activos, largo), dtype=bool)
+    arrays["confianza"] = np.zeros((activos, largo))
+
+    for fila, nombre in enumerate(nombres):
+        df, inicio = dfs[nombre], inicios[fila]
+        suficientes = df["close"].rolling(ventana).count().to_numpy() >= min_velas
+        candidata = (rompimientos_sesion(df, ventana).any(axis=1).to_numpy() & suficientes
+                     & ~np.isnan(arrays["atr"][fila, inicio:]))
+        arrays["fecha"][fila, inicio:] = df.index.asi8
+        arrays["candidata"][fila, inicio:] = candidata
+
+        if modelo is None:
+            arrays["confianza"][fila, inicio:] = 1.0
+            continue
+        X = calcular_features(df, modelo.features)
+        filas = np.flatnonzero(candidata & X.notna().all(axis=1).to_numpy())
+        if len(filas):
+            # Una sola llamada a predict_proba por activo, sirve a todos los umbrales
+            arrays["confianza"][fila, inicio + filas] = calcular_confianza(modelo, X.iloc[filas])
+
+    periodos = calcular_periodos_panel(panel["close"], grilla["ema_rapida"] + grilla["ema_lenta"], grilla["rsi"])
+    arrays.update({f"{tipo}_{periodo}": valores for (tipo, periodo), valores in periodos.items()})
+    return arrays, inicios
+
+def compartir(arrays):
+    """Copia {nombre: ndarray} a un bloque de memoria compartida. Devuelve el bloque y su esquema."""
+    esquema, total = {}, 0
+    for nombre, array in arrays.items():
+        total = -(-total // 64) * 64
+        esquema[nombre] = (total, array.shape, array.dtype.str)
+        total += array.nbytes
+    memoria = shared_memory.SharedMemory(create=True, size=max(total, 1))
+    for nombre, vista in vistas(memoria, esquema).items():
+        vista[...] = arrays[nombre]
+    return memoria, esquema
+
+def vistas(memoria, esquema):
+    """Arrays sin copia sobre el bloque `memoria` según `esquema`."""
+    return {
+        nombre: np.ndarray(forma, dtype=np.dtype(tipo), buffer=memoria.buf, offset=desplazamiento)
+        for nombre, (desplazamiento, forma, tipo) in esquema.items()
+    }
+
+# ============================== EVALUACIÓN (PROCESOS DEL POOL) ==============================
+
+# Vistas sobre la memoria compartida, fijadas una vez por proceso
+_MEMORIA = None
+_PANEL = None
+_INICIOS = None
+_HORIZONTE = None
+
+def _inicializar_proceso(nombre, esquema, inicios, horizonte):
+    global _MEMORIA, _PANEL, _INICIOS, _HORIZONTE
+    _MEMORIA = shared_memory.SharedMemory(name=nombre)
+    _PANEL = vistas(_MEMORIA, esquema)
+    _INICIOS, _HORIZONTE = inicios, horizonte
+
+@lru_cache(maxsize=2)
+def _operaciones(mult_sl, mult_tp):
+    """
+    Cada vela candidata del universo como operación en ambas direcciones con el SL y
+    TP dados, resuelta una sola vez por (mult_sl, mult_tp) y compartida por todas las
+    combinaciones de indicadores. Solo las cerradas, ordenadas por fecha de salida
+    (las salidas simultáneas en orden estable: activo, dirección y entrada).
+    """
+    partes = []
+    for fila, inicio in enumerate(_INICIOS):
+        candidatas = np.flatnonzero(_PANEL["candidata"][fila, inicio:])
+        if not len(candidatas):
+            continue
+        high, low, close = (_PANEL[col][fila, inicio:] for col in ("high", "low", "close"))
+        entradas = np.concatenate([candidatas, candidatas])
+        direccion = np.repeat([1, -1], len(candidatas))
+        precio = close[entradas]
+        atr = _PANEL["atr"][fila, inicio:][entradas]
+        sl = precio - direccion * atr * mult_sl
+        tp = precio + direccion * atr * mult_tp
+
+        resultado, velas, salida = resolver_salidas(high, low, close, entradas, direccion, sl, tp, _HORIZONTE)
+        cerrada = resultado != "ABIERTA"
+        posicion = inicio + entradas[cerrada]
+        partes.append((
+            np.full(cerrada.sum(), fila), posicion, direccion[cerrada] == 1,
+            (direccion * (salida - precio) / precio)[cerrada],
+            _PANEL["fecha"][fila, inicio + np.minimum(entradas + velas, len(close) - 1)][cerrada],
+        ))
+
+    if not partes:
+        vacio = np.empty(0)
+        return {"fila": vacio.astype(int), "posicion": vacio.astype(int), "compra": vacio.astype(bool),
+                "retorno": vacio, "confianza": vacio}
+    fila, posicion, compra, retorno, fecha_salida = (np.concatenate(col) for col in zip(*partes))
+    orden = np.argsort(fecha_salida, kind="stable")
+    fila, posicion = fila[orden], posicion[orden]
+    return {
+        "fila": fila, "posicion": posicion, "compra": compra[orden], "retorno": retorno[orden],
+        "confianza": _PANEL["confianza"][fila, posicion],
+    }
+
+def estadisticas(retornos):
+    """Métricas de una secuencia de retornos ordenada por fecha de salida (como `backtest_estrategia.resumir`)."""
+    if not len(retornos):
+        return {"operaciones": 0, "aciertos": np.nan, "retorno_total": 0.0, "retorno_medio": np.nan,
+                "max_drawdown": 0.0, "profit_factor": np.nan}
+    curva = np.concatenate([[0.0], np.cumsum(retornos)])
+    ganancias = retornos[retornos > 0].sum()
+    perdidas = -retornos[retornos < 0].sum()
+    return {
+        "operaciones": len(retornos),
+        "aciertos": (retornos > 0).mean(),
+        "retorno_total": curva[-1],
+        "retorno_medio": retornos.mean(),
+        "max_drawdown": (np.maximum.accumulate(curva) - curva).max(),
+        "profit_factor": ganancias / perdidas if perdidas else np.inf,
+    }
+
+def _evaluar_bloque(tarea):
+    """
+    Evalúa todas las combinaciones de bandas de RSI y umbral que comparten los
+    períodos de EMA/RSI y el SL/TP de `tarea` (dentro de un proceso del pool).
+    """
+    mult_sl, mult_tp, ema_rapida, ema_lenta, periodo_rsi, variantes = tarea
+    ops = _operaciones(mult_sl, mult_tp)
+    fila, posicion = ops["fila"], ops["posicion"]
+
+    rapida = _PANEL[f"ema_{ema_rapida}"][fila, posicion]
+    lenta = _PANEL[f"ema_{ema_lenta}"][fila, posicion]
+    # Solo las operaciones en la dirección de la tendencia pueden entrar con estos períodos
+    tendencia = np.flatnonzero(np.where(ops["compra"], rapida > lenta, rapida < lenta))
+    rsi = _PANEL[f"rsi_{periodo_rsi}"][fila[tendencia], posicion[tendencia]]
+    compra, retorno, confianza = ops["compra"][tendencia], ops["retorno"][tendencia], ops["confianza"][tendencia]
+
+    resultados = []
+    for rsi_compra, rsi_venta, umbral in variantes:
+        entra = np.where(compra, (rsi_compra[0] < rsi) & (rsi < rsi_compra[1]),
+                         (rsi_venta[0] < rsi) & (rsi < rsi_venta[1]))
+        entra &= confianza >= umbral
+        resultados.append({
+            "ema_rapida": ema_rapida, "ema_lenta": ema_lenta, "rsi": periodo_rsi,
+            "rsi_compra": rsi_compra, "rsi_venta": rsi_venta,
+            "mult_sl": mult_sl, "mult_tp": mult_tp, "umbral_confianza": umbral,
+            **estadisticas(retorno[entra]),
+        })
+    return resultados
+
+# ============================== BARRIDO ==============================
+
+def combinaciones(grilla):
+    """Bloques de trabajo: uno por (SL, TP, EMA rápida, EMA lenta, RSI) con sus variantes de bandas y umbral."""
+    variantes = list(itertools.product(grilla["rsi_compra"], grilla["rsi_venta"], grilla["umbral_confianza"]))
+    return [
+        (mult_sl, mult_tp, rapida, lenta, rsi, variantes)
+        # SL/TP por fuera para que los bloques consecutivos reutilicen las salidas resueltas
+        for mult_sl, mult_tp in itertools.product(grilla["mult_sl"], grilla["mult_tp"])
+        for rapida, lenta, rsi in itertools.product(grilla["ema_rapida"], grilla["ema_lenta"], grilla["rsi"])
+        if rapida < lenta
+    ]
+
+def barrido(dfs, grilla=GRILLA, modelo=None, horizonte=30, ventana="60D", procesos=None):
+    """
+    Evalúa en paralelo todas las combinaciones de `grilla` sobre {activo: DataFrame OHLC}
+    con la regla de `backtest_estrategia`. El panel se carga una vez en memoria
+    compartida y los procesos solo lo leen. Devuelve la tabla ordenada por retorno total.
+    """
+    grilla = {clave: list(valores) for clave, valores in grilla.items()}
+    if modelo is None:
+        # Sin modelo la confianza es 1: el umbral no cambia nada
+        grilla["umbral_confianza"] = [CONFIG["umbral_confianza"]]
+
+    inicio = time.perf_counter()
+    arrays, inicios = preparar_panel(dfs, grilla, modelo, ventana)
+    bloques = combinaciones(grilla)
+    total = sum(len(bloque[-1]) for bloque in bloques)
+    procesos = procesos or os.cpu_count()
+    print(f"📦 Panel de {arrays['close'].shape[0]} activos x {arrays['close'].shape[1]} velas "
+          f"({int(arrays['candidata'].sum())} candidatas) preparado en {time.perf_counter() - inicio:.1f}s")
+    print(f"🔎 Evaluando {total} combinaciones en {len(bloques)} bloques con {procesos} procesos...")
+
+    memoria, esquema = compartir(arrays)
+    del arrays
+    try:
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso,
+                                 initargs=(memoria.name, esquema, inicios, horizonte)) as pool:
+            tamano = max(1, len(bloques) // (procesos * 4))
+            resultados = [fila for filas in pool.map(_evaluar_bloque, bloques, chunksize=tamano) for fila in filas]
+    finally:
+        memoria.close()
+        memoria.unlink()
+
+    tabla = pd.DataFrame(resultados).sort_values("retorno_total", ascending=False, ignore_index=True)
+    tabla.index = tabla.index + 1
+    tabla.index.name = "ranking"
+    return tabla
+
+def cargar_grilla(ruta):
+    """GRILLA con los valores de un JSON ({parámetro: [valores]}); las bandas de RSI son pares [min, max]."""
+    grilla = dict(GRILLA)
+    if ruta:
+        with open(ruta) as f:
+            grilla.update(json.load(f))
+    for clave in ("rsi_compra", "rsi_venta"):
+        grilla[clave] = [tuple(banda) for banda in grilla[clave]]
+    return grilla
+
+def main():
+    parser = argparse.ArgumentParser(description="Barrido paralelo de los parámetros de la estrategia")
+    parser.add_argument("--csv", default="datasets/dataset_entrenamiento_pro.csv", help="CSV o directorio particionado")
+    parser.add_argument("--grilla", default=None, help="JSON con los valores a barrer (por defecto GRILLA)")
+    parser.add_argument("--modelo", default=CONFIG["modelo_path"])
+    parser.add_argument("--sin-modelo", action="store_true", help="Omitir el filtro de confianza ML")
+    parser.add_argument("--horizonte", type=int, default=30, help="Velas máximas por operación")
+    parser.add_argument("--ventana", default=CONFIG["periodo"].upper(), help="Historia visible para los rangos")
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--min-operaciones", type=int, default=30, help="Mínimo para el ranking impreso")
+    parser.add_argument("--salida", default=RUTA_RESULTADOS)
+    args = parser.parse_args()
+
+    modelo = None
+    if not args.sin_modelo:
+        if os.path.exists(args.modelo):
+            modelo = cargar_modelo(args.modelo, n_jobs=-1)
+        else:
+            print(f"⚠️ Modelo {args.modelo} no encontrado, se ejecuta sin filtro ML")
+
+    inicio = time.perf_counter()
+    tabla = barrido(cargar_universo(args.csv), cargar_grilla(args.grilla), modelo,
+                    args.horizonte, args.ventana, args.procesos)
+    duracion = time.perf_counter() - inicio
+    tabla.to_csv(args.salida)
+
+    print("\n====== RANKING POR RETORNO TOTAL ======")
+    print(tabla[tabla["operaciones"] >= args.min_operaciones].head(15).to_string())
+    actual = tabla[np.logical_and.reduce([
+        tabla[clave].map(lambda v, x=valor: v == x) for clave, valor in ACTUAL.items() if clave in tabla
+    ])]
+    if not actual.empty:
+        print(f"\n📌 Parámetros actuales en el puesto {actual.index[0]} de {len(tabla)}:")
+        print(actual.to_string())
+    print(f"\n⏱️ Barrido completado en {duracion:.2f}s")
+    print(f"✅ Resultados completos en: {args.salida}")
+
+if __name__ == "__main__":
+    main()
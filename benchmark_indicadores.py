@@ -0,0 +1,43 @@
+# benchmark_indicadores.py
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from indicadores_tecnicos import calcular_indicadores, calcular_indicadores_panel
+
+def generar_panel(activos, velas, semilla=42):
+    """Panel OHLC sintético (activos x velas) con paseo aleatorio geométrico."""
+    rng = np.random.default_rng(semilla)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.005, (activos, velas)), axis=1))
+    rango = np.abs(rng.normal(0, 0.003, (activos, velas))) * close
+    return close + rango, close - rango, close
+
+def medir(funcion, repeticiones=3):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del kernel de indicadores por panel")
+    parser.add_argument("--velas", type=int, default=360)
+    parser.add_argument("--activos", type=int, nargs="+", default=[18, 100, 500, 1000, 2000])
+    args = parser.parse_args()
+
+    print(f"{'activos':>8} {'pandas (s)':>12} {'panel (s)':>10} {'speedup':>8} {'velas/s panel':>14}")
+    for activos in args.activos:
+        high, low, close = generar_panel(activos, args.velas)
+        indice = pd.date_range("2024-01-01", periods=args.velas, freq="4h")
+        dfs = [pd.DataFrame({"high": high[i], "low": low[i], "close": close[i]}, index=indice)
+               for i in range(activos)]
+
+        t_pandas = medir(lambda: [calcular_indicadores(df.copy()) for df in dfs], repeticiones=1)
+        t_panel = medir(lambda: calcular_indicadores_panel(high, low, close))
+        print(f"{activos:>8} {t_pandas:>12.3f} {t_panel:>10.3f} {t_pandas / t_panel:>7.1f}x "
+              f"{activos * args.velas / t_panel:>14,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# benchmark_modelo.py
+
+import sys
+import json
+import argparse
+import subprocess
+
+# Se ejecuta en un proceso limpio para medir importaciones y memoria reales
+_SONDA = """
+import json, resource, sys, time
+inicio = time.perf_counter()
+from modelo_ml import cargar_modelo
+modelo = cargar_modelo(sys.argv[1])
+carga = time.perf_counter() - inicio
+import numpy as np
+X = np.random.default_rng(0).random((18, len(modelo.features)))
+t = time.perf_counter()
+modelo.modelo.predict_proba(X)
+prediccion = time.perf_counter() - t
+print(json.dumps({
+    "carga_s": carga,
+    "prediccion_ms": prediccion * 1000,
+    "rss_max_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "sklearn_importado": "sklearn" in sys.modules,
+}))
+"""
+
+def medir(ruta, repeticiones):
+    resultados = []
+    for _ in range(repeticiones):
+        salida = subprocess.run([sys.executable, "-c", _SONDA, ruta], capture_output=True, text=True, check=True)
+        resultados.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+    return {clave: min(r[clave] for r in resultados) if clave != "sklearn_importado" else resultados[0][clave]
+            for clave in resultados[0]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque y memoria: joblib.load vs bosque compacto")
+    parser.add_argument("--pkl", default="modelo_trained_rf_pro.pkl")
+    parser.add_argument("--compacto", default="modelo_trained_rf_pro_compacto")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'artefacto':>10} {'carga (s)':>10} {'predict 18 (ms)':>16} {'RSS máx (MB)':>13} {'sklearn':>8}")
+    for nombre, ruta in (("joblib", args.pkl), ("compacto", args.compacto)):
+        r = medir(ruta, args.repeticiones)
+        print(f"{nombre:>10} {r['carga_s']:>10.3f} {r['prediccion_ms']:>16.2f} {r['rss_max_mb']:>13.1f} "
+              f"{'sí' if r['sklearn_importado'] else 'no':>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+# benchmark_suite.py
+
+import os
+import gc
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config_activos import CONFIG
+from cache_barras import intervalo_a_timedelta
+from datos_sinteticos import (generar_universo, generar_panel, nombres_universo, respuesta_twelve_data,
+                              ProveedorSimulado, REGIMENES)
+from indicadores_tecnicos import (calcular_indicadores, calcular_indicadores_lote, calcular_indicadores_panel,
+                                  IndicadoresIncrementales)
+from modelo_ml import ModeloML, FEATURES_MODELO, calcular_features, cargar_modelo, confianza_lote
+
+RUTA_BASE = "benchmark_linea_base.json"
+
+# Escalas activos x velas; las dos primeras son las que se corren por defecto
+ESCALAS = ["18x360", "200x5000", "2000x5000", "2000x50000"]
+ESCALAS_POR_DEFECTO = ESCALAS[:2]
+
+# Las etapas por activo en Python se miden sobre una muestra del universo de hasta
+# este número de velas; el throughput (velas/s) sigue siendo comparable entre escalas
+LIMITE_VELAS_MUESTRA = 1_000_000
+LIMITE_VELAS_PARSEO = 250_000
+LIMITE_VELAS_INCREMENTAL = 200_000
+# El kernel por panel procesa la escala completa en bloques de hasta este número de celdas
+CELDAS_BLOQUE_PANEL = 4_000_000
+
+def parsear_escala(texto):
+    activos, velas = texto.lower().split("x")
+    return int(activos), int(velas)
+
+def velas_ventana():
+    """Velas que cubre CONFIG['periodo'] en CONFIG['intervalo'] (la historia de un ciclo)."""
+    dias = int(CONFIG["periodo"].replace("d", ""))
+    return int(pd.Timedelta(days=dias) / intervalo_a_timedelta(CONFIG["intervalo"]))
+
+# Se fija al importar: la etapa de ciclo ajusta CONFIG['periodo'] a la historia sintética
+VELAS_VENTANA = velas_ventana()
+
+def modelo_sintetico(semilla=0):
+    """RandomForest pequeño entrenado sobre datos sintéticos, para no depender del .pkl real."""
+    from sklearn.ensemble import RandomForestClassifier
+
+    X, y = [], []
+    for df in generar_universo(12, 2000, semilla).values():
+        df = calcular_indicadores(df)
+        features = calcular_features(df, FEATURES_MODELO)
+        futuro = df["close"].shift(-6) / df["close"] - 1
+        validas = features.notna().all(axis=1) & futuro.notna()
+        X.append(features[validas])
+        y.append(np.where(futuro[validas] > 0, "GANANCIA", "PERDIDA"))
+    modelo = RandomForestClassifier(n_estimators=50, max_depth=8, random_state=semilla, n_jobs=1)
+    modelo.fit(pd.concat(X), np.concatenate(y))
+    return ModeloML(modelo, FEATURES_MODELO, "sintetico")
+
+def obtener_modelo_benchmark(ruta=None):
+    for candidata in [ruta, CONFIG.get("modelo_compacto_path"), CONFIG.get("modelo_path")]:
+        if candidata and os.path.exists(candidata):
+            return cargar_modelo(candidata, n_jobs=CONFIG.get("n_jobs_inferencia", -1)), candidata
+    return modelo_sintetico(), "sintético"
+
+class Contexto:
+    """Datos de una escala, generados bajo demanda y compartidos entre etapas."""
+
+    def __init__(self, activos, velas, modelo, semilla=0):
+        self.activos = activos
+        self.velas = velas
+        self.modelo = modelo
+        self.semilla = semilla
+        self.fin = pd.Timestamp(datetime.utcnow()).floor(intervalo_a_timedelta(CONFIG["intervalo"]))
+        self._historia = None
+        self._ventana = None
+
+    def historia(self, limite=LIMITE_VELAS_MUESTRA):
+        """Muestra de activos con la historia completa (`velas`), hasta `limite` velas en total."""
+        if self._historia is None:
+            muestra = max(1, min(self.activos, LIMITE_VELAS_MUESTRA // self.velas))
+            self._historia = generar_universo(muestra, self.velas, self.semilla, fin=self.fin)
+        muestra = max(1, min(len(self._historia), limite // self.velas))
+        return dict(list(self._historia.items())[:muestra])
+
+    def ventana(self):
+        """Todos los activos con la historia de un ciclo en vivo (CONFIG['periodo'])."""
+        if self._ventana is None:
+            velas = min(self.velas, VELAS_VENTANA)
+            self._ventana = generar_universo(self.activos, velas, self.semilla, fin=self.fin)
+        return self._ventana
+
+# ============== Etapas ==============
+# Cada etapa prepara sus datos (fuera de la medición) y devuelve
+# (función a medir, velas procesadas por llamada, preparación previa a cada llamada o None)
+
+def etapa_parseo(ctx):
+    import proveedores_datos
+
+    universo = ctx.historia(LIMITE_VELAS_PARSEO)
+    cuerpos = {
+        nombre: respuesta_twelve_data(df, nombre).encode()
+        for nombre, df in universo.items()
+    }
+
+    def ejecutar():
+        for nombre, cuerpo in cuerpos.items():
+            proveedores_datos.parsear_twelve_data(nombre, json.loads(cuerpo))
+    return ejecutar, sum(len(df) for df in universo.values()), None
+
+def etapa_indicadores(ctx):
+    universo = ctx.historia()
+
+    def ejecutar():
+        for df in universo.values():
+            calcular_indicadores(df)
+    return ejecutar, sum(len(df) for df in universo.values()), None
+
+def etapa_indicadores_lote(ctx):
+    universo = ctx.historia()
+    return lambda: calcular_indicadores_lote(universo), sum(len(df) for df in universo.values()), None
+
+def etapa_indicadores_panel(ctx):
+    # El kernel no depende de los valores: se genera un bloque y se repite hasta cubrir la escala
+    filas = max(1, min(ctx.activos, CELDAS_BLOQUE_PANEL // ctx.velas))
+    panel = generar_panel(filas, ctx.velas, "forex", ctx.semilla)
+    bloques = [min(filas, ctx.activos - i) for i in range(0, ctx.activos, filas)]
+
+    def ejecutar():
+        for n in bloques:
+            calcular_indicadores_panel(panel["high"][:n], panel["low"][:n], panel["close"][:n])
+    return ejecutar, ctx.activos * ctx.velas, None
+
+def etapa_incremental(ctx):
+    universo = ctx.historia(LIMITE_VELAS_INCREMENTAL)
+
+    def ejecutar():
+        for df in universo.values():
+            IndicadoresIncrementales.desde_historia(df)
+    return ejecutar, sum(len(df) for df in universo.values()), None
+
+def etapa_estrategia(ctx):
+    from estrategia_trading import evaluar_estrategia
+
+    universo = {nombre: calcular_indicadores(df.copy()) for nombre, df in ctx.ventana().items()}
+
+    def ejecutar():
+        for nombre, df in universo.items():
+            evaluar_estrategia(nombre, df, ctx.modelo, CONFIG["umbral_confianza"])
+    return ejecutar, sum(len(df) for df in universo.values()), None
+
+def etapa_backtest(ctx):
+    from backtest_estrategia import backtest_activo
+
+    universo = {nombre: calcular_indicadores(df.copy()) for nombre, df in ctx.historia().items()}
+
+    def ejecutar():
+        for nombre, df in universo.items():
+            backtest_activo(nombre, df, ctx.modelo, CONFIG["umbral_confianza"])
+    return ejecutar, sum(len(df) for df in universo.values()), None
+
+def etapa_inferencia(ctx):
+    filas = {}
+    for nombre, df in ctx.ventana().items():
+        df = calcular_indicadores(df.iloc[-60:].copy())
+        filas[nombre] = calcular_features(df, ctx.modelo.features).iloc[-1]
+    return lambda: confianza_lote(ctx.modelo, filas), len(filas), None
+
+def etapa_correlacion(ctx):
+    """Filtro de cartera de un ciclo: la vela nueva de todos los activos en la matriz y el filtro de sus señales."""
+    from correlacion_activos import MatrizCorrelacion
+
+    conf = CONFIG.get("correlacion", {})
+    universo = {nombre: df[["close"]] for nombre, df in ctx.ventana().items()}
+    previas = {nombre: df.iloc[:-1] for nombre, df in universo.items()}
+    rng = np.random.default_rng(ctx.semilla)
+    señales = [{"activo": nombre, "tipo": rng.choice(["BUY", "SELL"]), "confianza": rng.random()}
+               for nombre in list(universo)[::10]]
+    estado = {}
+
+    def reiniciar():
+        matriz = MatrizCorrelacion(conf.get("ventana", 100), conf.get("min_observaciones", 30))
+        matriz.actualizar(previas)
+        matriz.aplicar()
+        estado["matriz"] = matriz
+
+    def ejecutar():
+        matriz = estado["matriz"]
+        matriz.actualizar(universo)
+        matriz.aplicar()
+        matriz.filtrar(señales, conf.get("umbral", 0.8))
+    return ejecutar, len(universo), reiniciar
+
+def _preparar_bot(ctx, directorio):
+    """Importa el bot apuntando cache, diario y notificaciones a `directorio` y al proveedor simulado."""
+    CONFIG.update({
+        "cache_dir": os.path.join(directorio, "cache"),
+        "diario_path": os.path.join(directorio, "senales.db"),
+        "notificaciones": {"transporte": "falso"},
+        "limite_api": {"max_requests": 10 ** 9, "periodo": 1, "creditos_por_simbolo": 1},
+        "proveedores": {"orden": ["twelve_data"], "cobertura": False},
+        "metricas": {"activo": False},
+        "periodo": f"{(ctx.fin - next(iter(ctx.ventana().values())).index[0]).days + 1}d",
+    })
+    # Al importarse, el bot intenta cargar el modelo de CONFIG; aquí se usa el del benchmark
+    logging.disable(logging.ERROR)
+    import bot_trading_pro
+    logging.disable(logging.WARNING)
+    import limitador_api
+    import proveedores_datos
+
+    nombres = nombres_universo(ctx.activos)
+    series = {nombres[n][0]: df for n, df in ctx.ventana().items()}
+    decimales = {nombres[n][0]: REGIMENES[nombres[n][1]]["decimales"] for n in ctx.ventana()}
+    proveedores_datos.API_KEY = proveedores_datos.API_KEY or "benchmark"
+    proveedores_datos._sesion = ProveedorSimulado(series, decimales=decimales)
+    proveedores_datos._cadena = None
+    limitador_api._limitador = None
+    limitador_api._limitadores.clear()
+    bot_trading_pro.modelo = ctx.modelo
+    return bot_trading_pro, {n: t for n, (t, _) in nombres.items()}
+
+def _reiniciar_cache(bot, directorio):
+    import correlacion_activos
+    import data_providers
+
+    shutil.rmtree(os.path.join(directorio, "cache"), ignore_errors=True)
+    data_providers._almacen = None
+    data_providers._buffers.clear()
+    data_providers._indicadores.clear()
+    correlacion_activos._matriz = None
+    bot.indices_sesion.clear()
+
+def etapa_ciclo_frio(ctx):
+    """Ciclo completo (descarga, parseo, indicadores, filtro, inferencia, diario) sin cache."""
+    import asyncio
+
+    directorio = tempfile.mkdtemp(prefix="benchmark_")
+    bot, activos = _preparar_bot(ctx, directorio)
+    velas = sum(len(df) for df in ctx.ventana().values())
+    return (lambda: asyncio.run(bot.ejecutar_ciclo(activos)), velas,
+            lambda: _reiniciar_cache(bot, directorio))
+
+def etapa_ciclo_caliente(ctx):
+    """Ciclo completo con la cache de velas vigente (el caso habitual dentro de una misma vela)."""
+    import asyncio
+
+    directorio = tempfile.mkdtemp(prefix="benchmark_")
+    bot, activos = _preparar_bot(ctx, directorio)
+    _reiniciar_cache(bot, directorio)
+    asyncio.run(bot.ejecutar_ciclo(activos))
+    velas = sum(len(df) for df in ctx.ventana().values())
+    return lambda: asyncio.run(bot.ejecutar_ciclo(activos)), velas, None
+
+ETAPAS = {
+    "parseo": etapa_parseo,
+    "indicadores": etapa_indicadores,
+    "indicadores_lote": etapa_indicadores_lote,
+    "indicadores_panel": etapa_indicadores_panel,
+    "incremental": etapa_incremental,
+    "estrategia": etapa_estrategia,
+    "backtest": etapa_backtest,
+    "inferencia": etapa_inferencia,
+    "correlacion": etapa_correlacion,
+    "ciclo_frio": etapa_ciclo_frio,
+    "ciclo_caliente": etapa_ciclo_caliente,
+}
+
+# ============== Medición ==============
+
+def medir_etapa(preparar, ctx, repeticiones=3, memoria=True):
+    """
+    Mejor tiempo de `repeticiones` llamadas y, en una llamada aparte (tracemalloc
+    enlentece el código Python), el pico de memoria asignada.
+    """
+    ejecutar, velas, reiniciar = preparar(ctx)
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        if reiniciar:
+            reiniciar()
+        gc.collect()
+        inicio = time.perf_counter()
+        ejecutar()
+        mejor = min(mejor, time.perf_counter() - inicio)
+
+    pico = None
+    if memoria:
+        if reiniciar:
+            reiniciar()
+        gc.collect()
+        tracemalloc.start()
+        ejecutar()
+        pico = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return {"segundos": mejor, "velas": velas, "velas_s": velas / mejor if mejor else None, "pico_mb": pico}
+
+def comparar(resultado, base, tolerancia):
+    """Devuelve (variación de tiempo, lista de regresiones) respecto de la línea base."""
+    if not base:
+        return None, []
+    regresiones = []
+    variacion = resultado["segundos"] / base["segundos"] - 1
+    # Diferencias mínimas absolutas para no marcar ruido en etapas de microsegundos
+    if variacion > tolerancia and resultado["segundos"] - base["segundos"] > 0.002:
+        regresiones.append(f"tiempo +{variacion:.0%}")
+    if resultado.get("pico_mb") is not None and base.get("pico_mb"):
+        memoria = resultado["pico_mb"] / base["pico_mb"] - 1
+        if memoria > tolerancia and resultado["pico_mb"] - base["pico_mb"] > 1:
+            regresiones.append(f"memoria +{memoria:.0%}")
+    return variacion, regresiones
+
+def cargar_base(ruta):
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta) as f:
+        return json.load(f).get("resultados", {})
+
+def guardar_base(ruta, resultados):
+    """Actualiza la línea base con los resultados medidos (conserva las demás entradas)."""
+    base = cargar_base(ruta)
+    base.update({clave: {k: round(v, 6) if isinstance(v, float) else v for k, v in r.items()}
+                 for clave, r in resultados.items()})
+    with open(ruta, "w") as f:
+        json.dump({
+            "maquina": f"{platform.machine()} {platform.processor() or ''} {os.cpu_count()} CPU".replace("  ", " "),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "fecha": datetime.utcnow().isoformat(timespec="seconds"),
+            "resultados": dict(sorted(base.items())),
+        }, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de benchmarks de las rutas críticas del bot")
+    parser.add_argument("--escalas", nargs="+", default=ESCALAS_POR_DEFECTO,
+                        help=f"activos x velas (por defecto {' '.join(ESCALAS_POR_DEFECTO)}; todas: {' '.join(ESCALAS)})")
+    parser.add_argument("--etapas", nargs="+", choices=list(ETAPAS), default=list(ETAPAS))
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--sin-memoria", action="store_true", help="No medir el pico de memoria")
+    parser.add_argument("--modelo", default=None, help="Artefacto del modelo (por defecto el de CONFIG o uno sintético)")
+    parser.add_argument("--base", default=RUTA_BASE)
+    parser.add_argument("--guardar-base", action="store_true", help="Guardar los resultados como nueva línea base")
+    parser.add_argument("--tolerancia", type=float, default=0.3, help="Variación tolerada antes de marcar regresión")
+    args = parser.parse_args()
+
+    # Los logs por activo dominarían el tiempo de las etapas
+    logging.disable(logging.WARNING)
+    modelo, origen = obtener_modelo_benchmark(args.modelo)
+    base = cargar_base(args.base)
+    print(f"🧪 Modelo: {origen} | línea base: {args.base if base else 'ninguna'}")
+    print(f"{'escala':>11} {'etapa':>18} {'segundos':>10} {'velas/s':>13} {'pico MB':>9} {'vs base':>8}")
+
+    resultados, regresiones = {}, []
+    for escala in args.escalas:
+        activos, velas = parsear_escala(escala)
+        ctx = Contexto(activos, velas, modelo)
+        for etapa in args.etapas:
+            clave = f"{activos}x{velas}/{etapa}"
+            r = medir_etapa(ETAPAS[etapa], ctx, args.repeticiones, not args.sin_memoria)
+            resultados[clave] = r
+            variacion, problemas = comparar(r, base.get(clave), args.tolerancia)
+            regresiones.extend(f"{clave}: {p}" for p in problemas)
+            print(f"{escala:>11} {etapa:>18} {r['segundos']:>10.4f} {r['velas_s']:>13,.0f} "
+                  f"{'-' if r['pico_mb'] is None else format(r['pico_mb'], '.1f'):>9} "
+                  f"{'-' if variacion is None else format(variacion, '+.0%'):>8}{' ⚠️' if problemas else ''}")
+
+    if args.guardar_base:
+        guardar_base(args.base, resultados)
+        print(f"💾 Línea base actualizada en {args.base}")
+    if regresiones:
+        print("\n❌ Regresiones respecto de la línea base:")
+        for regresion in regresiones:
+            print(f"   {regresion}")
+        raise SystemExit(1)
+    if base:
+        print("\n✅ Sin regresiones respecto de la línea base")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# bosque_compacto.py
+
+import os
+import json
+import numpy as np
+
+ARCHIVOS = ("feature", "umbral", "izquierda", "derecha", "faltante_izq", "proba", "raices")
+
+class BosqueCompacto:
+    """
+    RandomForestClassifier aplanado en arrays NumPy contiguos (un nodo por fila,
+    todos los árboles concatenados) con un evaluador NumPy puro que reproduce
+    `predict_proba` de scikit-learn (con n_jobs=1) bit a bit.
+
+    Los arrays se guardan como .npy en un directorio y se cargan con
+    memory-mapping de solo lectura, así varios procesos comparten las mismas
+    páginas del artefacto.
+    """
+
+    def __init__(self, arrays, clases, features, profundidad, version=None):
+        for nombre in ARCHIVOS:
+            setattr(self, nombre, arrays[nombre])
+        self.classes_ = np.asarray(clases)
+        self.features = list(features)
+        self.feature_names_in_ = np.asarray(self.features, dtype=object)
+        self.n_features_in_ = len(self.features)
+        self.profundidad = profundidad
+        self.version = version
+
+    @classmethod
+    def desde_sklearn(cls, modelo, features, version=None):
+        """Aplana un RandomForestClassifier entrenado (una sola salida)."""
+        partes = {nombre: [] for nombre in ARCHIVOS if nombre != "raices"}
+        raices = []
+        desplazamiento = 0
+        n_clases = len(modelo.classes_)
+
+        for estimador in modelo.estimators_:
+            arbol = estimador.tree_
+            n = arbol.node_count
+            hoja = arbol.children_left == -1
+            # Las hojas apuntan a sí mismas para que el descenso sea estable
+            propio = np.arange(n) + desplazamiento
+            izquierda = np.where(hoja, propio, arbol.children_left + desplazamiento)
+            derecha = np.where(hoja, propio, arbol.children_right + desplazamiento)
+
+            # Desde scikit-learn 1.4 `value` ya guarda las proporciones de cada clase;
+            # las versiones anteriores guardan conteos y predict_proba los normaliza
+            proba = arbol.value[:, 0, :n_clases].astype(np.float64)
+            normalizador = proba.sum(axis=1)[:, np.newaxis]
+            if np.any(np.abs(normalizador - 1.0) > 1e-9):
+                normalizador[normalizador == 0.0] = 1.0
+                proba /= normalizador
+
+            faltante = getattr(arbol, "missing_go_to_left", np.zeros(n, dtype=np.uint8))
+            partes["feature"].append(np.where(hoja, 0, arbol.feature).astype(np.int32))
+            partes["umbral"].append(arbol.threshold.astype(np.float64))
+            partes["izquierda"].append(izquierda.astype(np.int32))
+            partes["derecha"].append(derecha.astype(np.int32))
+            partes["faltante_izq"].append(np.asarray(faltante, dtype=np.bool_))
+            partes["proba"].append(proba)
+            raices.append(desplazamiento)
+            desplazamiento += n
+
+        arrays = {nombre: np.ascontiguousarray(np.concatenate(valores)) for nombre, valores in partes.items()}
+        arrays["raices"] = np.asarray(raices, dtype=np.int32)
+        profundidad = max(e.tree_.max_depth for e in modelo.estimators_)
+        return cls(arrays, modelo.classes_, features, profundidad, version)
+
+    def guardar(self, directorio):
+        os.makedirs(directorio, exist_ok=True)
+        for nombre in ARCHIVOS:
+            np.save(os.path.join(directorio, f"{nombre}.npy"), getattr(self, nombre))
+        with open(os.path.join(directorio, "meta.json"), "w") as f:
+            json.dump({
+                "clases": self.classes_.tolist(),
+                "features": self.features,
+                "profundidad": self.profundidad,
+                "version": self.version,
+            }, f)
+
+    @classmethod
+    def cargar(cls, directorio, mmap=True):
+        with open(os.path.join(directorio, "meta.json")) as f:
+            meta = json.load(f)
+        modo = "r" if mmap else None
+        arrays = {nombre: np.load(os.path.join(directorio, f"{nombre}.npy"), mmap_mode=modo) for nombre in ARCHIVOS}
+        return cls(arrays, meta["clases"], meta["features"], meta["profundidad"], meta.get("version"))
+
+    def aplicar(self, X):
+        """Índice de la hoja alcanzada en cada árbol: array (árboles x muestras)."""
+        # scikit-learn evalúa los árboles con X en float32
+        X = np.asarray(X, dtype=np.float32)
+        muestras = np.arange(X.shape[0])
+        nodos = np.repeat(self.raices[:, np.newaxis], X.shape[0], axis=1)
+        for _ in range(self.profundidad):
+            valores = X[muestras, self.feature[nodos]].astype(np.float64)
+            izquierda = valores <= self.umbral[nodos]
+            faltantes = np.isnan(valores)
+            if faltantes.any():
+                izquierda = np.where(faltantes, self.faltante_izq[nodos], izquierda)
+            nodos = np.where(izquierda, self.izquierda[nodos], self.derecha[nodos])
+        return nodos
+
+    def predict_proba(self, X):
+        hojas = self.aplicar(X)
+        total = np.zeros((hojas.shape[1], len(self.classes_)), dtype=np.float64)
+        # Acumulación árbol a árbol, en el mismo orden que RandomForestClassifier
+        for hojas_arbol in hojas:
+            total += self.proba[hojas_arbol]
+        total /= len(self.raices)
+        return total
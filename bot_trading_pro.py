@@ -1,122 +1,432 @@
 import os
 import time
-import joblib
+import asyncio
+import argparse
 import logging
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from data_providers import obtener_datos
+from data_providers import obtener_datos_lote, obtener_temporalidades_lote, obtener_indicadores_lote, velas_cacheadas
+from cache_barras import inicio_vela, intervalo_a_timedelta
 from indicadores_tecnicos import calcular_indicadores
-from estrategia_trading import evaluar_estrategia
-from whatsapp_sender import enviar_whatsapp
+from estrategia_trading import preseleccionar, senales_candidatos, obtener_motor
+from modelo_ml import FEATURES_MODELO, cargar_modelo, confianza_lote
+from whatsapp_sender import obtener_despachador
 from config_activos import CONFIG
-import pandas as pd
+from limitador_api import obtener_limitador
+from rangos_sesion import IndiceSesiones
+from diario_senales import obtener_diario
+from seguimiento_posiciones import obtener_seguimiento
+from correlacion_activos import obtener_matriz_correlacion
+from planificador import Planificador
+from coordinacion import obtener_coordinador
+from streaming import MotorStreaming
+from metricas import obtener_metricas
+from temporalidades import validar_anidamiento
 
 load_dotenv()
-RESULTADOS_PATH = "resultados_estrategia.csv"
+
+# Índices de rangos por sesión de cada activo, mantenidos entre ciclos
+indices_sesion = {}
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 # ======= Cargar modelo ML ===========
 try:
-    modelo = joblib.load(CONFIG["modelo_path"])
-    logger.info("✅ Modelo ML cargado exitosamente")
+    ruta_modelo = CONFIG["modelo_path"]
+    if os.path.isdir(CONFIG.get("modelo_compacto_path", "")):
+        ruta_modelo = CONFIG["modelo_compacto_path"]
+    modelo = cargar_modelo(ruta_modelo, n_jobs=CONFIG.get("n_jobs_inferencia", -1))
+    logger.info(f"✅ Modelo ML cargado exitosamente (versión {modelo.version}, features {modelo.features})")
 except Exception as e:
     logger.error(f"❌ Error cargando el modelo ML: {e}")
     modelo = None
 
 # ======= Evaluar activo individual ===========
-def evaluar_activo(nombre, ticker, intento=1):
-    max_intentos = 3
-    try:
-        logger.info(f"🔍 Evaluando {nombre} ({ticker}) [Intento {intento}]")
-        df = obtener_datos(ticker, CONFIG["intervalo"], CONFIG["periodo"])
-
-        if df is None:
-            logger.warning(f"⚠️ No se pudo obtener datos para {nombre}")
-            return
+def procesar_activo(nombre, df, temporalidades=None):
+    """
+    Etapa de CPU por activo: valida los datos y aplica el filtro de rompimiento.
+    `temporalidades` son las velas de confirmación del activo ({intervalo: DataFrame}).
+    Devuelve el candidato para la etapa de inferencia o None.
+    """
+    if df is None:
+        logger.warning(f"⚠️ No se pudo obtener datos para {nombre}")
+        return None
 
-        if "close" not in df.columns:
-            logger.error(f"❌ Columna 'close' faltante en datos para {nombre}")
-            return
+    if "close" not in df.columns:
+        logger.error(f"❌ Columna 'close' faltante en datos para {nombre}")
+        return None
 
-        if len(df) < 80:
-            logger.warning(f"⚠️ No hay suficientes datos ({len(df)} filas) para {nombre}")
-            return
+    if len(df) < 80:
+        logger.warning(f"⚠️ No hay suficientes datos ({len(df)} filas) para {nombre}")
+        return None
 
+    if "ema_rapida" not in df.columns:
         df = calcular_indicadores(df)
 
-        if modelo is None:
-            logger.error("❌ Modelo ML no cargado, omitiendo evaluación")
-            return
-
-        señales = evaluar_estrategia(nombre, df, modelo, CONFIG["umbral_confianza"])
-        for señal in señales:
-            enviar_whatsapp(señal["mensaje"])
-            registrar_senal(
-                señal["activo"],
-                datetime.now(),
-                señal["precio"],
-                señal["tipo"],
-                CONFIG["modelo_path"]
-            )
+    motor = obtener_motor()
+    if modelo is None and motor.requiere("confianza"):
+        logger.error("❌ Modelo ML no cargado, omitiendo evaluación")
+        return None
+
+    with obtener_metricas().medir("filtro"):
+        indice = indices_sesion.setdefault(nombre, IndiceSesiones())
+        indice.agregar_df(df)
+        indice.recortar(df.index[0])
+        features = modelo.features if modelo is not None else FEATURES_MODELO
+        return preseleccionar(nombre, df, indice, features, temporalidades,
+                              exigir_rompimiento=motor.todas_requieren("rompe"))
+
+def descargar_lote(tickers):
+    """
+    Velas de CONFIG['intervalo'] de cada ticker ({ticker: DataFrame | None}) y, si hay
+    temporalidades de confirmación, las de cada una ({ticker: {intervalo: DataFrame}}).
+    Con una `base` más fina se descarga solo esa y el resto se deriva localmente.
+    """
+    conf = CONFIG.get("temporalidades", {})
+    intervalo = CONFIG["intervalo"]
+    base = conf.get("base") or intervalo
+    confirmacion = [i for i in conf.get("confirmacion", []) if i != intervalo]
+    if base == intervalo and not confirmacion:
+        return obtener_datos_lote(tickers, intervalo, CONFIG["periodo"]), {}
 
+    # Solo velas cerradas de las derivadas: tras el cierre la vela en curso apenas empezó
+    series = obtener_temporalidades_lote(tickers, [intervalo] + confirmacion, CONFIG["periodo"],
+                                         intervalo_base=base, incluir_parcial=False)
+    datos = {ticker: velas[intervalo] for ticker, velas in series.items()}
+    superiores = {ticker: {i: velas[i] for i in confirmacion} for ticker, velas in series.items()}
+    return datos, superiores
+
+def validar_temporalidades():
+    """Rechaza al iniciar una base cuyas velas no anidan en las temporalidades derivadas."""
+    conf = CONFIG.get("temporalidades", {})
+    intervalo = CONFIG["intervalo"]
+    validar_anidamiento(conf.get("base") or intervalo, [intervalo] + list(conf.get("confirmacion", [])),
+                        conf.get("alineacion"))
+
+def etapa_indicadores(datos):
+    """
+    Indicadores de todo el lote: cada activo continúa su estado incremental (guardado
+    junto a la cache) y los que no lo tienen se calculan juntos con el kernel multi-activo.
+    """
+    with obtener_metricas().medir("indicadores"):
+        return obtener_indicadores_lote(datos, CONFIG["intervalo"])
+
+def etapa_seguimiento(velas, intervalo=None):
+    """
+    Resuelve SL, TP o expiración de las posiciones abiertas con las velas cerradas
+    de `velas` ({activo: DataFrame}) y cierra en el diario las resueltas.
+    """
+    if not CONFIG.get("seguimiento", {}).get("activo", True):
+        return []
+    metricas = obtener_metricas()
+    # Solo velas cerradas: la que empieza en la vela en curso todavía puede cambiar
+    limite = inicio_vela(datetime.utcnow(), intervalo or CONFIG["intervalo"])
+    try:
+        with metricas.medir("seguimiento"):
+            cerradas = obtener_seguimiento().actualizar(velas, limite)
+            if cerradas:
+                obtener_diario().cerrar_lote(cerradas)
     except Exception as e:
-        if intento < max_intentos:
-            logger.warning(f"🔄 Reintentando {nombre} en 5 segundos...")
-            time.sleep(5)
-            return evaluar_activo(nombre, ticker, intento + 1)
-        else:
-            logger.error(f"❌ Fallo definitivo para {nombre}: {str(e)}")
+        logger.error(f"❌ Error en el seguimiento de posiciones: {e}")
+        return []
+
+    for r in cerradas:
+        metricas.contar("posiciones_cerradas", estado=r["estado"])
+        logger.info(f"🎯 {r['tipo']} de {r['activo']} cerrada por {r['estado']} tras {r['velas']} velas "
+                    f"({r['retorno']:+.2%})")
+    return cerradas
+
+def etapa_correlacion(velas, intervalo=None):
+    """Acumula para la matriz de correlación los retornos de las velas cerradas de `velas` ({activo: DataFrame})."""
+    if not CONFIG.get("correlacion", {}).get("activo", True) or (intervalo or CONFIG["intervalo"]) != CONFIG["intervalo"]:
+        return
+    limite = inicio_vela(datetime.utcnow(), CONFIG["intervalo"])
+    try:
+        with obtener_metricas().medir("correlacion"):
+            obtener_matriz_correlacion().actualizar(velas, limite)
+    except Exception as e:
+        logger.error(f"❌ Error al actualizar la matriz de correlación: {e}")
 
-# ======= Registrar señales ===========
-def registrar_senal(activo, fecha, precio_actual, senal, modelo_path):
+def etapa_correlacion_compartida(propios):
+    """
+    Con varios workers, cada uno descarga solo sus activos: los retornos del resto se
+    leen de la cache de barras que escriben los demás, para que la matriz conozca los
+    pares entre shards. Si otro worker guarda una vela después de `aplicar`, sus
+    retornos llegan tarde y se pierden (la matriz solo avanza).
+    """
+    if obtener_coordinador() is None or not CONFIG.get("correlacion", {}).get("activo", True):
+        return
+    ajenos = {nombre: ticker for nombre, ticker in CONFIG["activos"].items() if nombre not in propios}
+    if not ajenos:
+        return
+    intervalo = CONFIG["intervalo"]
+    base = CONFIG.get("temporalidades", {}).get("base") or intervalo
+    paso = intervalo_a_timedelta(intervalo)
+    ultimas = (2 * obtener_matriz_correlacion().ventana + 1) * max(int(paso / intervalo_a_timedelta(base)), 1)
     try:
-        with open(RESULTADOS_PATH, "a") as f:
-            f.write(f"{activo},{fecha},{precio_actual},{senal},{modelo_path}\n")
+        cacheadas = velas_cacheadas(list(ajenos.values()), base, ultimas)
     except Exception as e:
-        logger.error(f"❌ Error al registrar señal: {e}")
-
-# ======= Sistema de límite de API ===========
-class APIRateLimiter:
-    def __init__(self, max_requests=8, period=60):
-        self.max_requests = max_requests
-        self.period = period
-        self.request_count = 0
-        self.last_reset = time.time()
-
-    def check_limit(self):
-        current_time = time.time()
-
-        if current_time - self.last_reset > self.period:
-            self.request_count = 0
-            self.last_reset = current_time
-
-        if self.request_count >= self.max_requests:
-            sleep_time = self.period - (current_time - self.last_reset) + 1
-            logger.warning(f"⏳ Límite API alcanzado. Esperando {sleep_time:.1f}s...")
-            time.sleep(sleep_time)
-            self.request_count = 0
-            self.last_reset = time.time()
+        logger.error(f"❌ Error al leer de la cache las velas de otros workers: {e}")
+        return
+    velas = {}
+    for nombre, ticker in ajenos.items():
+        df = cacheadas.get(ticker)
+        if df is not None and base != intervalo:
+            # Cierre de cada vela del intervalo a partir de la base (la vela en curso la descarta `actualizar`)
+            df = df[["close"]].resample(paso, origin="epoch").last().dropna()
+        velas[nombre] = df
+    etapa_correlacion(velas)
+
+def _filtrar_entre_workers(coordinador, matriz, señales, umbral, abiertas):
+    """
+    Filtra contra las posiciones abiertas propias y las publicadas por los demás
+    workers, y publica las propias más las señales aceptadas. Un lease exclusivo
+    ordena a los workers: entre ellos gana la primera señal filtrada, no la de
+    mayor confianza.
+    """
+    ttl = intervalo_a_timedelta(CONFIG["intervalo"]).total_seconds() + coordinador.ttl
+    with coordinador.exclusivo("cartera") as exclusivo:
+        if not exclusivo:
+            logger.warning("⚠️ Sin lease del filtro de cartera, se filtra sin esperar a los demás workers")
+        ajenas = coordinador.exposiciones_ajenas()
+        aceptadas, suprimidas = matriz.filtrar(señales, umbral, list(abiertas) + ajenas)
+        propias = set(abiertas) | {(s["activo"], 1 if s["tipo"] == "BUY" else -1) for s in aceptadas}
+        coordinador.publicar_exposiciones(sorted(propias), ttl)
+    return aceptadas, suprimidas
+
+def etapa_cartera(señales, completas=True):
+    """
+    Filtro de cartera: incorpora a la matriz las velas acumuladas y, de las señales
+    que repiten la misma apuesta en activos correlacionados (entre sí o con una
+    posición abierta), deja solo la de mayor confianza. Con `completas` se aplican
+    todas las velas cerradas; si no (streaming, un activo por vez) la última cerrada
+    espera a los demás activos hasta el siguiente cierre.
+    Con un coordinador, las exposiciones se comparten entre workers por su almacén.
+    """
+    conf = CONFIG.get("correlacion", {})
+    if not conf.get("activo", True):
+        return señales
+    metricas = obtener_metricas()
+    matriz = obtener_matriz_correlacion()
+    limite = inicio_vela(datetime.utcnow(), CONFIG["intervalo"])
+    if not completas:
+        limite -= intervalo_a_timedelta(CONFIG["intervalo"])
+    try:
+        with metricas.medir("correlacion"):
+            matriz.aplicar(limite)
+            coordinador = obtener_coordinador() if completas else None
+            if not señales and coordinador is None:
+                return señales
+            abiertas = ()
+            if conf.get("contra_abiertas", True) and CONFIG.get("seguimiento", {}).get("activo", True):
+                abiertas = obtener_seguimiento().exposiciones()
+            if coordinador is not None:
+                # Se publica aunque no haya señales: las exposiciones vencen si no se renuevan
+                aceptadas, suprimidas = _filtrar_entre_workers(coordinador, matriz, señales, conf.get("umbral", 0.8),
+                                                               abiertas)
+            else:
+                aceptadas, suprimidas = matriz.filtrar(señales, conf.get("umbral", 0.8), abiertas)
+    except Exception as e:
+        logger.error(f"❌ Error en el filtro de correlación: {e}")
+        return señales
+
+    for s in suprimidas:
+        logger.info(f"🧩 Señal {s['tipo']} de {s['activo']} omitida: repite la apuesta de "
+                    f"{s['correlacionada_con']} (correlación {s['correlacion']:+.2f})")
+    if suprimidas:
+        metricas.contar("senales_correlacionadas", len(suprimidas))
+    return aceptadas
+
+def etapa_inferencia(candidatos):
+    """
+    Puntúa en un único predict_proba (multi-core) a todos los candidatos del ciclo
+    y evalúa sobre ellos todas las estrategias del motor en una sola pasada.
+    """
+    if not candidatos:
+        return []
+    metricas = obtener_metricas()
+    motor = obtener_motor()
+    confianzas = {}
+    if motor.requiere("confianza"):
+        try:
+            with metricas.medir("inferencia"):
+                confianzas = confianza_lote(modelo, {c["activo"]: c["features"] for c in candidatos})
+        except Exception as e:
+            logger.error(f"❌ Error en modelo ML para el lote {[c['activo'] for c in candidatos]}: {str(e)}")
+
+    with metricas.medir("estrategias"):
+        señales = senales_candidatos(candidatos, confianzas, motor)
+    metricas.contar("candidatos", len(candidatos))
+    return señales
+
+def emitir_senales(señales):
+    """Registra las señales del ciclo en el diario (una transacción) y encola solo las nuevas."""
+    if not señales:
+        return
+    metricas = obtener_metricas()
+    try:
+        with metricas.medir("registro"):
+            nuevas = obtener_diario().registrar(señales, getattr(modelo, "version", None))
+    except Exception as e:
+        logger.error(f"❌ Error al registrar señales: {e}")
+        nuevas = señales
+
+    if len(nuevas) < len(señales):
+        logger.info(f"🔁 {len(señales) - len(nuevas)} señales ya registradas para su vela, no se reenvían")
+
+    for señal in nuevas:
+        metricas.contar("senales", tipo=señal["tipo"])
+    if CONFIG.get("seguimiento", {}).get("activo", True):
+        obtener_seguimiento().abrir(nuevas)
+
+    # El envío ocurre en el hilo del despachador: el ciclo no espera a Twilio
+    obtener_despachador().publicar_ciclo(nuevas)
+
+async def evaluar_lote(activos, pool_red, pool_cpu):
+    """
+    Descarga un lote de activos con una sola petición en `pool_red` y procesa cada
+    uno en `pool_cpu`, de modo que las descargas de unos lotes se solapan con el
+    cálculo de otros. Los reintentos esperan con backoff exponencial sin bloquear
+    al resto del ciclo y solo repiten los activos que fallaron.
+    Devuelve los candidatos que pasaron el filtro de rompimiento.
+    """
+    loop = asyncio.get_running_loop()
+    max_intentos = CONFIG.get("max_intentos", 3)
+    espera_base = CONFIG.get("espera_reintento", 5)
+    pendientes = dict(activos)
+    candidatos = []
+    metricas = obtener_metricas()
+
+    for intento in range(1, max_intentos + 1):
+        fallidos = {}
+        try:
+            logger.info(f"🔍 Evaluando {', '.join(pendientes)} [Intento {intento}]")
+            datos, superiores = await loop.run_in_executor(pool_red, descargar_lote, list(pendientes.values()))
+            velas = {nombre: datos.get(ticker) for nombre, ticker in pendientes.items()}
+            await loop.run_in_executor(pool_cpu, etapa_seguimiento, velas)
+            await loop.run_in_executor(pool_cpu, etapa_correlacion, velas)
+            datos = await loop.run_in_executor(pool_cpu, etapa_indicadores, datos)
+            for nombre, ticker in pendientes.items():
+                try:
+                    candidato = await loop.run_in_executor(
+                        pool_cpu, procesar_activo, nombre, datos.get(ticker), superiores.get(ticker)
+                    )
+                    if candidato is not None:
+                        candidatos.append(candidato)
+                except Exception as e:
+                    fallidos[nombre] = (ticker, e)
+        except Exception as e:
+            fallidos = {nombre: (ticker, e) for nombre, ticker in pendientes.items()}
+
+        if not fallidos:
+            return candidatos
+
+        if intento < max_intentos:
+            espera = espera_base * 2 ** (intento - 1)
+            metricas.contar("reintentos", len(fallidos), origen="descarga")
+            logger.warning(f"🔄 Reintentando {', '.join(fallidos)} en {espera} segundos...")
+            pendientes = {nombre: ticker for nombre, (ticker, _) in fallidos.items()}
+            await asyncio.sleep(espera)
+        else:
+            metricas.contar("fallos", len(fallidos), origen="descarga")
+            for nombre, (_, e) in fallidos.items():
+                logger.error(f"❌ Fallo definitivo para {nombre}: {str(e)}")
+    return candidatos
 
 # ======= Loop principal ===========
-def monitorear():
-    rate_limiter = APIRateLimiter(max_requests=8, period=60)
+async def ejecutar_ciclo(activos=None):
+    """
+    Evalúa los activos ({nombre: ticker}, por defecto todos) de forma concurrente
+    dentro del presupuesto de la API; los lotes se lanzan en el orden recibido.
+    Los candidatos de todos los lotes se puntúan juntos en la etapa de inferencia y
+    sus señales pasan juntas por el filtro de correlación.
+    """
+    with ThreadPoolExecutor(max_workers=CONFIG.get("workers_red", 4), thread_name_prefix="red") as pool_red, \
+         ThreadPoolExecutor(max_workers=1, thread_name_prefix="cpu") as pool_cpu:
+        activos = list((activos or CONFIG["activos"]).items())
+        tamano = max(CONFIG.get("tamano_lote", 8), 1)
+        lotes = [activos[i:i + tamano] for i in range(0, len(activos), tamano)]
+        resultados = await asyncio.gather(
+            *(evaluar_lote(lote, pool_red, pool_cpu) for lote in lotes), return_exceptions=True
+        )
+
+        candidatos = []
+        for lote, resultado in zip(lotes, resultados):
+            if isinstance(resultado, Exception):
+                nombres = ", ".join(nombre for nombre, _ in lote)
+                logger.error(f"❌ Error en ciclo principal para {nombres}: {str(resultado)}")
+            else:
+                candidatos.extend(resultado)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(pool_cpu, etapa_correlacion_compartida, dict(activos))
+        señales = await loop.run_in_executor(pool_cpu, etapa_inferencia, candidatos)
+        señales = await loop.run_in_executor(pool_cpu, etapa_cartera, señales)
+        await loop.run_in_executor(pool_cpu, emitir_senales, señales)
+
+def ciclo_monitoreo(activos):
+    limitador = obtener_limitador()
+    metricas = obtener_metricas()
+    logger.info(f"\n🚀 Iniciando nuevo ciclo de monitoreo ({len(activos)} activos)")
+    inicio = time.monotonic()
+    llamadas = limitador.request_count
+    espera = limitador.espera_total
+
+    metricas.iniciar_ciclo()
+    with metricas.medir("ciclo"):
+        asyncio.run(ejecutar_ciclo(activos))
+
+    creditos = limitador.request_count - llamadas
+    logger.info(f"📈 Ciclo completado en {time.monotonic() - inicio:.1f}s ({creditos} créditos de API)")
+    metricas.resumen_ciclo(modo="sondeo", activos=len(activos), creditos=creditos,
+                           espera_limite=round(limitador.espera_total - espera, 3))
 
-    while True:
-        logger.info("\n🚀 Iniciando nuevo ciclo de monitoreo")
+def al_cerrar_vela(nombre, intervalo, df):
+    """Modo streaming: evalúa la estrategia sobre la historia en cuanto cierra una vela."""
+    if intervalo != CONFIG["intervalo"]:
+        nombre = f"{nombre} ({intervalo})"
+    metricas = obtener_metricas()
+    metricas.iniciar_ciclo()
+    with metricas.medir("ciclo"):
+        etapa_seguimiento({nombre: df}, intervalo)
+        etapa_correlacion({nombre: df}, intervalo)
+        candidato = procesar_activo(nombre, df)
+        señales = etapa_inferencia([candidato]) if candidato is not None else []
+        emitir_senales(etapa_cartera(señales, completas=False))
+    metricas.resumen_ciclo(modo="streaming", activo=nombre)
 
-        for nombre, ticker in CONFIG["activos"].items():
-            try:
-                rate_limiter.check_limit()
-                evaluar_activo(nombre, ticker)
-                rate_limiter.request_count += 1
-                time.sleep(1)
-            except Exception as e:
-                logger.error(f"❌ Error en ciclo principal para {nombre}: {str(e)}")
+def monitorear_streaming(motor=None):
+    """Alternativa a `monitorear` que reacciona a cada cierre de vela del WebSocket de precios."""
+    conf = CONFIG.get("streaming", {})
+    motor = motor or MotorStreaming(
+        CONFIG["activos"], conf.get("intervalos", [CONFIG["intervalo"]]), al_cerrar_vela,
+        gracia=conf.get("gracia_segundos", 2), grabar=conf.get("grabar_ticks"),
+    )
+    asyncio.run(motor.ejecutar())
 
-        logger.info(f"⏸️ Ciclo finalizado. Esperando {CONFIG['pausa_horas']}h...")
-        time.sleep(CONFIG["pausa_horas"] * 3600)
+def monitorear(planificador=None):
+    """
+    Ejecuta un ciclo en cada cierre de vela, solo con los activos de mercados abiertos.
+    Con coordinación configurada, cada worker evalúa solo su parte de los activos.
+    """
+    planificador = planificador or Planificador(
+        CONFIG["activos"], CONFIG["intervalo"], CONFIG.get("mercados"), CONFIG.get("asentamiento_segundos", 30),
+        coordinador=obtener_coordinador(), reintento=CONFIG.get("reintento_ciclo_segundos", 60),
+    )
+    planificador.ejecutar(ciclo_monitoreo)
 
 if __name__ == "__main__":
-    monitorear()
+    parser = argparse.ArgumentParser(description="Bot de señales de trading")
+    parser.add_argument("--streaming", action="store_true", help="Usar el WebSocket de precios en lugar del sondeo REST")
+    parser.add_argument("--metricas", type=int, metavar="PUERTO", help="Activar métricas y servirlas en este puerto")
+    args = parser.parse_args()
+    if args.metricas:
+        CONFIG["metricas"] = {**CONFIG.get("metricas", {}), "activo": True, "puerto": args.metricas}
+    obtener_metricas()
+    if args.streaming:
+        monitorear_streaming()
+    else:
+        validar_temporalidades()
+        monitorear()
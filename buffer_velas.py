@@ -0,0 +1,139 @@
+# buffer_velas.py
+
+import numpy as np
+import pandas as pd
+
+from cache_barras import COLUMNAS
+
+_PRECIOS = COLUMNAS[:4]
+
+def parsear_valores(valores):
+    """
+    Decodifica `values` de /time_series (dicts de texto, la vela más reciente primero)
+    en una sola pasada a columnas tipadas: (fechas int64 en ns ascendentes, bloque
+    float64 de 5 x n con open/high/low/close/volume, si trae volumen). Las velas con
+    algún valor no numérico se descartan. Lanza KeyError o ValueError si la respuesta
+    no tiene el formato esperado.
+    """
+    n = len(valores)
+    volumen = "volume" in valores[0]
+    campos = COLUMNAS if volumen else _PRECIOS
+    # Una pasada por las velas: el texto se convierte a float64 en C, sin objetos intermedios
+    plano = [v[campo] for v in valores for campo in campos]
+    numeros = np.array(plano, dtype=np.float64).reshape(n, len(campos))[::-1]
+    fechas = np.array([v["datetime"] for v in valores[::-1]], dtype="datetime64[ns]").view(np.int64)
+
+    bloque = np.full((len(COLUMNAS), n), np.nan)
+    bloque[:len(campos)] = numeros.T
+    validas = ~np.isnan(bloque[:len(campos)]).any(axis=0)
+    if not validas.all():
+        fechas, bloque = fechas[validas], bloque[:, validas]
+    if len(fechas) > 1 and (np.diff(fechas) < 0).any():
+        orden = np.argsort(fechas, kind="stable")
+        fechas, bloque = fechas[orden], bloque[:, orden]
+    return fechas, bloque, volumen
+
+class BufferVelas:
+    """
+    Historia residente de un activo con capacidad fija: fechas (int64, ns) y un bloque
+    float64 de 5 x (capacidad + holgura) (open/high/low/close/volume) contiguos. Las
+    velas nuevas se escriben a continuación y, al llegar al final, la ventana se compacta
+    al inicio (una copia cada `holgura` velas), así la ventana vigente siempre es un slice contiguo que se lee
+    sin copiar. Las vistas entregadas valen hasta el siguiente `agregar`.
+    """
+    __slots__ = ("capacidad", "ts", "valores", "inicio", "fin", "volumen")
+
+    def __init__(self, capacidad, ts=None, valores=None):
+        self.capacidad = capacidad
+        espacio = capacidad + max(capacidad // 4, 16)
+        self.ts = np.empty(espacio, dtype=np.int64) if ts is None else ts
+        self.valores = np.empty((len(COLUMNAS), espacio)) if valores is None else valores
+        self.inicio = 0
+        self.fin = 0 if ts is None else len(ts)
+        self.volumen = False
+
+    @classmethod
+    def desde_arrays(cls, fechas, bloque, volumen=False):
+        """Adopta (sin copiar) columnas ya tipadas como un buffer lleno de su mismo tamaño."""
+        buffer = cls(max(len(fechas), 1), fechas, bloque)
+        buffer.volumen = volumen
+        return buffer
+
+    @classmethod
+    def desde_df(cls, df, capacidad=None):
+        df = df.rename(columns=str.lower)
+        bloque = np.full((len(COLUMNAS), len(df)), np.nan)
+        for i, col in enumerate(COLUMNAS):
+            if col in df.columns:
+                bloque[i] = df[col].to_numpy(dtype=np.float64)
+        buffer = cls(capacidad or max(len(df), 1))
+        buffer.agregar(df.index.values.astype("datetime64[ns]").view(np.int64), bloque,
+                       "volume" in df.columns and not df["volume"].isna().all())
+        return buffer
+
+    def __len__(self):
+        return self.fin - self.inicio
+
+    def fechas(self):
+        return self.ts[self.inicio:self.fin]
+
+    def bloque(self):
+        return self.valores[:, self.inicio:self.fin]
+
+    def ultima_fecha(self):
+        return pd.Timestamp(self.ts[self.fin - 1]) if len(self) else None
+
+    def agregar(self, fechas, bloque, volumen=False):
+        """
+        Incorpora velas ascendentes. Las guardadas desde la primera fecha de `fechas`
+        (p. ej. la última vela, revisada) se reemplazan; si se supera la capacidad se
+        descartan las más antiguas.
+        """
+        n = len(fechas)
+        if not n:
+            return self
+        if n > self.capacidad:
+            fechas, bloque, n = fechas[-self.capacidad:], bloque[:, -self.capacidad:], self.capacidad
+
+        self.fin = self.inicio + int(np.searchsorted(self.fechas(), fechas[0]))
+        if self.fin + n > len(self.ts):
+            # Compactación: las últimas velas que siguen en la ventana pasan al inicio
+            conservar = min(len(self), self.capacidad - n)
+            desde = self.fin - conservar
+            self.ts[:conservar] = self.ts[desde:self.fin]
+            self.valores[:, :conservar] = self.valores[:, desde:self.fin]
+            self.inicio, self.fin = 0, conservar
+
+        self.ts[self.fin:self.fin + n] = fechas
+        self.valores[:, self.fin:self.fin + n] = bloque
+        self.fin += n
+        self.inicio = max(self.inicio, self.fin - self.capacidad)
+        self.volumen = self.volumen or volumen
+        return self
+
+    def _posicion(self, desde):
+        if desde is None:
+            return self.inicio
+        limite = np.datetime64(pd.Timestamp(desde), "ns").view(np.int64)
+        return self.inicio + int(np.searchsorted(self.fechas(), limite))
+
+    def ventana(self, desde=None):
+        """Vistas (fechas, bloque) de las velas desde `desde` (todas si es None)."""
+        posicion = self._posicion(desde)
+        return self.ts[posicion:self.fin], self.valores[:, posicion:self.fin]
+
+    def vaciar(self):
+        self.inicio = self.fin = 0
+        self.volumen = False
+        return self
+
+    def a_dataframe(self, desde=None):
+        """
+        DataFrame OHLC(V) indexado por fecha de las velas desde `desde`, sin copiar
+        las columnas: cada una es una fila contigua del bloque.
+        """
+        posicion = self._posicion(desde)
+        columnas = COLUMNAS if self.volumen else _PRECIOS
+        indice = pd.DatetimeIndex(self.ts[posicion:self.fin].view("datetime64[ns]"), name="datetime")
+        return pd.DataFrame(self.valores[:len(columnas), posicion:self.fin].T, index=indice,
+                            columns=columnas, copy=False)
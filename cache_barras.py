@@ -0,0 +1,132 @@
+# cache_barras.py
+
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS = ["open", "high", "low", "close", "volume"]
+DTYPE_BARRA = np.dtype([("ts", "<i8")] + [(col, "<f8") for col in COLUMNAS])
+
+_UNIDADES = {"min": "minutes", "h": "hours", "day": "days", "week": "weeks"}
+
+
+def intervalo_a_timedelta(intervalo):
+    """Convierte un intervalo de Twelve Data ('15min', '4h', '1day', ...) a timedelta."""
+    for sufijo in sorted(_UNIDADES, key=len, reverse=True):
+        if intervalo.endswith(sufijo):
+            cantidad = int(intervalo[:-len(sufijo)] or 1)
+            return timedelta(**{_UNIDADES[sufijo]: cantidad})
+    if intervalo.endswith("month"):
+        return timedelta(days=30 * int(intervalo[:-5] or 1))
+    raise ValueError(f"Intervalo no soportado: {intervalo}")
+
+
+def inicio_vela(fecha, intervalo):
+    """Devuelve el inicio (UTC, naive) de la vela de `intervalo` que contiene `fecha`."""
+    paso = intervalo_a_timedelta(intervalo)
+    segundos = int(paso.total_seconds())
+    epoch = int(pd.Timestamp(fecha).timestamp())
+    return datetime.utcfromtimestamp(epoch - epoch % segundos)
+
+
+class AlmacenBarras:
+    """
+    Almacén en disco de velas OHLCV, un archivo por ticker e intervalo.
+
+    Cada serie se guarda como un array NumPy estructurado (.npy) que se lee con
+    memory-mapping, junto a un pequeño .json con la cobertura y la hora de la
+    última descarga.
+    """
+
+    def __init__(self, directorio="cache_barras"):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+
+    def _base(self, ticker, intervalo):
+        nombre = f"{ticker.replace('/', '_')}_{intervalo}"
+        return os.path.join(self.directorio, nombre)
+
+    def _leer_meta(self, ticker, intervalo):
+        try:
+            with open(self._base(ticker, intervalo) + ".json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def leer_barras(self, ticker, intervalo):
+        """Array estructurado (DTYPE_BARRA, memory-mapped) de la serie cacheada o None."""
+        ruta = self._base(ticker, intervalo) + ".npy"
+        if not os.path.exists(ruta):
+            return None
+        try:
+            return np.load(ruta, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Cache corrupta para {ticker} ({e}), se descarta")
+            return None
+
+    def cubierto_desde(self, ticker, intervalo):
+        """Fecha más antigua para la que la cache tiene la historia completa."""
+        meta = self._leer_meta(ticker, intervalo)
+        return datetime.fromisoformat(meta["desde"]) if "desde" in meta else None
+
+    def actualizado(self, ticker, intervalo):
+        """Momento (UTC) de la última descarga que tocó esta serie."""
+        meta = self._leer_meta(ticker, intervalo)
+        return datetime.fromisoformat(meta["actualizado"]) if "actualizado" in meta else None
+
+    def vigente(self, ticker, intervalo, ahora):
+        """True si no ha cerrado ninguna vela desde la última descarga."""
+        actualizado = self.actualizado(ticker, intervalo)
+        return actualizado is not None and actualizado >= inicio_vela(ahora, intervalo)
+
+    def guardar_barras(self, ticker, intervalo, ts, bloque, desde, ahora):
+        """
+        Escribe la serie completa de forma atómica junto con su metadata, a partir de
+        las fechas (int64, ns) y un bloque 5 x n en el orden de COLUMNAS.
+        """
+        barras = np.empty(len(ts), dtype=DTYPE_BARRA)
+        barras["ts"] = ts
+        for i, col in enumerate(COLUMNAS):
+            barras[col] = bloque[i]
+
+        base = self._base(ticker, intervalo)
+        with open(base + ".npy.tmp", "wb") as f:
+            np.save(f, barras)
+        os.replace(base + ".npy.tmp", base + ".npy")
+
+        with open(base + ".json.tmp", "w") as f:
+            json.dump({"desde": desde.isoformat(), "actualizado": ahora.isoformat()}, f)
+        os.replace(base + ".json.tmp", base + ".json")
+
+    def leer_indicadores(self, ticker, intervalo):
+        """(estado incremental, array estructurado con 'ts' y una columna por indicador) guardados o None."""
+        base = self._base(ticker, intervalo)
+        try:
+            with open(base + ".indicadores.json") as f:
+                estado = json.load(f)
+            return estado, np.load(base + ".indicadores.npy")
+        except (OSError, ValueError) as e:
+            if os.path.exists(base + ".indicadores.json"):
+                logger.warning(f"⚠️ Indicadores guardados corruptos para {ticker} ({e}), se recalculan")
+            return None
+
+    def guardar_indicadores(self, ticker, intervalo, estado, ts, columnas):
+        """Guarda de forma atómica el estado incremental (JSON) y los indicadores por vela ({nombre: array})."""
+        barras = np.empty(len(ts), dtype=[("ts", "<i8")] + [(col, "<f8") for col in columnas])
+        barras["ts"] = ts
+        for col, valores in columnas.items():
+            barras[col] = valores
+
+        base = self._base(ticker, intervalo)
+        with open(base + ".indicadores.npy.tmp", "wb") as f:
+            np.save(f, barras)
+        with open(base + ".indicadores.json.tmp", "w") as f:
+            json.dump(estado, f)
+        os.replace(base + ".indicadores.npy.tmp", base + ".indicadores.npy")
+        os.replace(base + ".indicadores.json.tmp", base + ".indicadores.json")
@@ -15,7 +15,101 @@ CONFIG = {
     "intervalo": "4h",
     "periodo": "60d",
     "modelo_path": "modelo_trained_rf_pro.pkl",
+    # Si existe, se usa el bosque exportado (NumPy puro, sin cargar scikit-learn)
+    "modelo_compacto_path": "modelo_trained_rf_pro_compacto",
+    "n_jobs_inferencia": -1,
     "umbral_confianza": 0.55,
-    "pausa_horas": 4
+    # Estrategias del motor (motor_estrategias): nombres registrados, "modulo:Clase" o
+    # {"nombre": ..., parámetros}; todas se evalúan sobre las mismas features en una pasada
+    "estrategias": ["rompimiento_ml"],
+    # Segundos tras el cierre de cada vela antes de pedirla (el proveedor tarda en publicarla)
+    "asentamiento_segundos": 30,
+    # Segundos hasta reintentar un ciclo fallido (antes del próximo cierre, que ya no incluiría su vela)
+    "reintento_ciclo_segundos": 60,
+    "cache_dir": "cache_barras",
+    # Diario de señales (SQLite en modo WAL)
+    "diario_path": "senales.db",
+    # Dataset de entrenamiento: columnas .npy por activo y año (ver dataset_particionado)
+    "dataset_dir": "datasets/particionado",
+    "particion_dataset": "Y",
+
+    # Horario semanal de cada mercado (hora local de `zona`); los activos no listados son forex.
+    # `desfase_velas` (minutos) corre el inicio de las velas si el proveedor no las alinea a UTC.
+    "mercados": {
+        "forex": {"apertura": "dom 17:00", "cierre": "vie 17:00", "zona": "America/New_York"},
+        "cripto": {"siempre_abierto": True, "activos": ["BTC", "ETH", "SOLANA"]},
+    },
+
+    # Sesiones para los rangos de rompimiento (inicio/fin inclusive, hora local de `zona`)
+    "sesiones": {
+        "Asiático": {"inicio": "00:00", "fin": "06:00", "zona": "UTC"},
+        "Londres": {"inicio": "06:00", "fin": "12:00", "zona": "UTC"},
+        "EE.UU.": {"inicio": "13:00", "fin": "20:00", "zona": "UTC"},
+    },
+    # Ventanas de N días (la sesión en curso y las N - 1 anteriores) cuyo rango se mantiene desde el
+    # inicio para consultarlo en O(1) (IndiceSesiones.rango(sesion, dias=N)); otras N se crean al pedirlas
+    "dias_rango": [],
+
+    # Presupuesto de la API (token bucket compartido por todas las llamadas HTTP)
+    "limite_api": {"max_requests": 8, "periodo": 60, "rafaga": 1, "creditos_por_simbolo": 1},
+
+    # Proveedores de velas en orden de preferencia; se omiten los que no tienen credenciales en .env
+    # (TWELVE_DATA_API_KEY, APCA_API_KEY_ID/APCA_API_SECRET_KEY). Si el primero tarda más que el
+    # `percentil_cobertura` de sus latencias recientes (`espera_cobertura` segundos mientras tenga menos
+    # de `muestras_cobertura`), se pide lo mismo al siguiente y gana la primera respuesta. Los errores
+    # pasan los activos al siguiente proveedor y una cuota agotada lo suspende `enfriamiento_segundos`.
+    # Twelve Data usa el `limite_api` de arriba; cada proveedor adicional, el suyo con el mismo formato.
+    "proveedores": {
+        "orden": ["twelve_data", "alpaca"],
+        "cobertura": True, "percentil_cobertura": 95, "muestras_cobertura": 20, "espera_cobertura": 10,
+        "enfriamiento_segundos": 60,
+        "alpaca": {"limite_api": {"max_requests": 200, "periodo": 60}, "limite_pagina": 10000,
+                   "rutas": {"forex": "/v1beta1/forex/bars", "cripto": "/v1beta3/crypto/us/bars"}},
+    },
+    "tamano_lote": 8,
+    "workers_red": 4,
+    "max_intentos": 3,
+    "espera_reintento": 5,
+
+    # Varios workers con la misma API key: `almacen` "sqlite:///coordinacion.db" (procesos de una
+    # máquina) o "redis://host:6379/0" (varios nodos, requiere el paquete redis); None = un solo
+    # worker. También se toma de COORDINACION_URL, y el id del worker de WORKER_ID (o host-pid).
+    # Un worker sin latido durante `ttl_segundos` se da por caído y sus activos se reparten.
+    "coordinacion": {"almacen": None, "latido_segundos": 10, "ttl_segundos": 30},
+
+    # Temporalidades derivadas de una sola descarga: a la API solo se pide `base` (None = `intervalo`)
+    # y `intervalo` y `confirmacion` se agregan localmente a partir de ella. `confirmacion` son
+    # temporalidades mayores (p. ej. ["1day"]) cuya tendencia (EMA 25 vs 50 de velas cerradas) debe
+    # acompañar a la señal. Las velas de 1day/1week/1month empiezan a la `hora` local de `zona`, que
+    # debe caer en un múltiplo UTC de `base` (se comprueba al iniciar): con 00:00 UTC anidan velas de
+    # 4h; para el cierre de forex (17:00 de America/New_York, 21:00 o 22:00 UTC) use "base": "1h".
+    "temporalidades": {"base": None, "confirmacion": [],
+                       "alineacion": {"zona": "UTC", "hora": "00:00"}},
+
+    # Seguimiento de las señales emitidas como posiciones de papel: en cada vela cerrada se resuelve
+    # el primer toque de SL o TP (o la expiración tras `horizonte` velas) y se guarda en el diario
+    # con las features de la entrada (DiarioSenales.resultados, para reentrenar)
+    "seguimiento": {"activo": True, "horizonte": 30},
+
+    # Filtro de cartera: correlación exponencial (span de `ventana` velas) de los retornos entre activos,
+    # actualizada con cada vela cerrada. De las señales de un ciclo que repiten la misma apuesta
+    # (|correlación| > `umbral` en la dirección equivalente) solo se emite la de mayor confianza; con
+    # `contra_abiertas` también se omiten las que repiten una posición ya abierta en otro activo.
+    # Con varios workers (ver "coordinacion") los retornos de los activos ajenos se leen de la cache de
+    # barras y las posiciones abiertas y señales aceptadas se comparten por el almacén; entre workers
+    # el filtro es secuencial: gana la primera señal filtrada, no la de mayor confianza.
+    "correlacion": {"activo": True, "ventana": 100, "umbral": 0.8, "min_observaciones": 30,
+                    "contra_abiertas": True},
+
+    # Modo streaming (bot_trading_pro.py --streaming): intervalos agregados desde los ticks,
+    # segundos de espera por ticks tardíos y CSV opcional donde grabar los ticks recibidos
+    "streaming": {"intervalos": ["4h"], "gracia_segundos": 2, "grabar_ticks": None},
+
+    # Instrumentación: histogramas por etapa en http://host:puerto/metrics (Prometheus) y un
+    # resumen JSON por ciclo en el log y, si se indica, en `resumenes` (una línea por ciclo)
+    "metricas": {"activo": False, "host": "127.0.0.1", "puerto": 9108, "resumenes": None},
+
+    # Cola de WhatsApp: reintentos, resumen por ciclo y supresión de repetidas (segundos)
+    "notificaciones": {"max_intentos": 3, "espera_reintento": 2, "agrupar": False, "ventana_duplicados": 4 * 3600}
 }
 
@@ -0,0 +1,451 @@
+# coordinacion.py
+
+import os
+import json
+import time
+import atexit
+import bisect
+import socket
+import hashlib
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from config_activos import CONFIG
+
+logger = logging.getLogger(__name__)
+
+# ============== Almacenes de coordinación ==============
+# Ambos exponen la misma interfaz; `ahora` es la hora Unix del llamador, de modo que
+# los workers deben tener los relojes sincronizados (NTP) si corren en nodos distintos.
+
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, expira REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (
+    clave TEXT PRIMARY KEY,
+    worker TEXT NOT NULL,
+    expira REAL NOT NULL,
+    hecho INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS exposiciones (worker TEXT PRIMARY KEY, pares TEXT NOT NULL, expira REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS cubetas (
+    nombre TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    ultimo REAL NOT NULL,
+    consumidos INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+class AlmacenSQLite:
+    """
+    Coordinación entre procesos de una misma máquina con un archivo SQLite: cada
+    operación es una transacción BEGIN IMMEDIATE, que toma el lock de escritura
+    del archivo y serializa a los workers.
+    """
+
+    def __init__(self, ruta="coordinacion.db"):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.executescript(ESQUEMA_SQLITE)
+
+    def _transaccion(self, funcion):
+        with self._lock:
+            self._conexion.execute("BEGIN IMMEDIATE")
+            try:
+                resultado = funcion(self._conexion)
+            except BaseException:
+                self._conexion.execute("ROLLBACK")
+                raise
+            self._conexion.execute("COMMIT")
+            return resultado
+
+    def latido(self, worker, ttl, ahora):
+        self._transaccion(lambda c: c.execute(
+            "INSERT INTO workers (id, expira) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET expira = excluded.expira",
+            (worker, ahora + ttl),
+        ))
+
+    def retirar(self, worker):
+        self._transaccion(lambda c: c.execute("DELETE FROM workers WHERE id = ?", (worker,)))
+
+    def workers_vivos(self, ahora):
+        def operacion(c):
+            c.execute("DELETE FROM workers WHERE expira <= ?", (ahora,))
+            c.execute("DELETE FROM leases WHERE expira <= ?", (ahora,))
+            return sorted(fila[0] for fila in c.execute("SELECT id FROM workers"))
+        return self._transaccion(operacion)
+
+    def tomar_lease(self, clave, worker, ttl, ahora):
+        """Toma (o renueva) la clave si está libre, vencida o ya es de `worker` y no se completó."""
+        def operacion(c):
+            fila = c.execute("SELECT worker, expira, hecho FROM leases WHERE clave = ?", (clave,)).fetchone()
+            if fila is not None and (fila[2] or (fila[0] != worker and fila[1] > ahora)):
+                return False
+            c.execute("INSERT OR REPLACE INTO leases (clave, worker, expira, hecho) VALUES (?, ?, ?, 0)",
+                      (clave, worker, ahora + ttl))
+            return True
+        return self._transaccion(operacion)
+
+    def renovar_leases(self, claves, worker, ttl, ahora):
+        self._transaccion(lambda c: c.executemany(
+            "UPDATE leases SET expira = ? WHERE clave = ? AND worker = ? AND hecho = 0",
+            [(ahora + ttl, clave, worker) for clave in claves],
+        ))
+
+    def completar_lease(self, clave, worker, retencion, ahora):
+        """Marca la clave como hecha durante `retencion` segundos (nadie más puede tomarla)."""
+        return self._transaccion(lambda c: c.execute(
+            "UPDATE leases SET hecho = 1, expira = ? WHERE clave = ? AND worker = ?",
+            (ahora + retencion, clave, worker),
+        ).rowcount > 0)
+
+    def liberar_lease(self, clave, worker):
+        self._transaccion(lambda c: c.execute(
+            "DELETE FROM leases WHERE clave = ? AND worker = ? AND hecho = 0", (clave, worker)
+        ))
+
+    def publicar_exposiciones(self, worker, pares, ttl, ahora):
+        """Reemplaza las exposiciones ([activo, dirección]) de `worker`, vigentes `ttl` segundos."""
+        self._transaccion(lambda c: c.execute(
+            "INSERT OR REPLACE INTO exposiciones (worker, pares, expira) VALUES (?, ?, ?)",
+            (worker, json.dumps(pares), ahora + ttl),
+        ))
+
+    def exposiciones(self, ahora):
+        """{worker: [[activo, dirección], ...]} con las exposiciones vigentes de cada worker."""
+        def operacion(c):
+            c.execute("DELETE FROM exposiciones WHERE expira <= ?", (ahora,))
+            return {worker: json.loads(pares) for worker, pares in c.execute("SELECT worker, pares FROM exposiciones")}
+        return self._transaccion(operacion)
+
+    def consumir_tokens(self, nombre, n, capacidad, tasa, ahora):
+        """Token bucket compartido (misma regla que APIRateLimiter.intentar). Devuelve 0 o la espera."""
+        def operacion(c):
+            fila = c.execute("SELECT tokens, ultimo FROM cubetas WHERE nombre = ?", (nombre,)).fetchone()
+            tokens, ultimo = fila if fila else (capacidad, ahora)
+            tokens = min(capacidad, tokens + max(ahora - ultimo, 0) * tasa)
+            necesario = min(n, capacidad)
+            concedido = tokens >= necesario
+            if concedido:
+                tokens -= n
+            c.execute(
+                "INSERT INTO cubetas (nombre, tokens, ultimo, consumidos) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(nombre) DO UPDATE SET tokens = excluded.tokens, ultimo = excluded.ultimo, "
+                "consumidos = consumidos + excluded.consumidos",
+                (nombre, tokens, max(ahora, ultimo), n if concedido else 0),
+            )
+            return 0.0 if concedido else (necesario - tokens) / tasa
+        return self._transaccion(operacion)
+
+_LUA_TOMAR = """
+local actual = redis.call('GET', KEYS[1])
+if actual == false or actual == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+_LUA_RENOVAR = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_LUA_COMPLETAR = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[3], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+_LUA_LIBERAR = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_LUA_CUBETA = """
+local capacidad = tonumber(ARGV[2])
+local tasa = tonumber(ARGV[3])
+local ahora = tonumber(ARGV[4])
+local n = tonumber(ARGV[1])
+local estado = redis.call('HMGET', KEYS[1], 'tokens', 'ultimo')
+local tokens = tonumber(estado[1]) or capacidad
+local ultimo = tonumber(estado[2]) or ahora
+tokens = math.min(capacidad, tokens + math.max(ahora - ultimo, 0) * tasa)
+local necesario = math.min(n, capacidad)
+local espera = 0
+if tokens >= necesario then
+    tokens = tokens - n
+    redis.call('HINCRBY', KEYS[1], 'consumidos', n)
+else
+    espera = (necesario - tokens) / tasa
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ultimo', tostring(math.max(ahora, ultimo)))
+return tostring(espera)
+"""
+
+class AlmacenRedis:
+    """Coordinación entre nodos con Redis; cada operación es un script Lua atómico."""
+
+    HECHO = "__hecho__"
+
+    def __init__(self, url="redis://localhost:6379/0", prefijo="bot:"):
+        # Importación diferida: redis solo hace falta con varios nodos
+        import redis
+
+        self.cliente = redis.Redis.from_url(url)
+        self.prefijo = prefijo
+        self._tomar = self.cliente.register_script(_LUA_TOMAR)
+        self._renovar = self.cliente.register_script(_LUA_RENOVAR)
+        self._completar = self.cliente.register_script(_LUA_COMPLETAR)
+        self._liberar = self.cliente.register_script(_LUA_LIBERAR)
+        self._cubeta = self.cliente.register_script(_LUA_CUBETA)
+
+    def _clave(self, clave):
+        return f"{self.prefijo}lease:{clave}"
+
+    def latido(self, worker, ttl, ahora):
+        self.cliente.zadd(f"{self.prefijo}workers", {worker: ahora + ttl})
+
+    def retirar(self, worker):
+        self.cliente.zrem(f"{self.prefijo}workers", worker)
+
+    def workers_vivos(self, ahora):
+        clave = f"{self.prefijo}workers"
+        self.cliente.zremrangebyscore(clave, "-inf", ahora)
+        return sorted(w.decode() for w in self.cliente.zrange(clave, 0, -1))
+
+    def tomar_lease(self, clave, worker, ttl, ahora):
+        return bool(self._tomar(keys=[self._clave(clave)], args=[worker, int(ttl * 1000)]))
+
+    def renovar_leases(self, claves, worker, ttl, ahora):
+        for clave in claves:
+            self._renovar(keys=[self._clave(clave)], args=[worker, int(ttl * 1000)])
+
+    def completar_lease(self, clave, worker, retencion, ahora):
+        return bool(self._completar(keys=[self._clave(clave)], args=[worker, int(retencion * 1000), self.HECHO]))
+
+    def liberar_lease(self, clave, worker):
+        self._liberar(keys=[self._clave(clave)], args=[worker])
+
+    def publicar_exposiciones(self, worker, pares, ttl, ahora):
+        self.cliente.hset(f"{self.prefijo}exposiciones", worker, json.dumps({"expira": ahora + ttl, "pares": pares}))
+
+    def exposiciones(self, ahora):
+        clave = f"{self.prefijo}exposiciones"
+        vigentes, vencidas = {}, []
+        for worker, valor in self.cliente.hgetall(clave).items():
+            valor = json.loads(valor)
+            if valor["expira"] > ahora:
+                vigentes[worker.decode()] = valor["pares"]
+            else:
+                vencidas.append(worker)
+        if vencidas:
+            self.cliente.hdel(clave, *vencidas)
+        return vigentes
+
+    def consumir_tokens(self, nombre, n, capacidad, tasa, ahora):
+        return float(self._cubeta(keys=[f"{self.prefijo}cubeta:{nombre}"], args=[n, capacidad, tasa, ahora]))
+
+def crear_almacen(url):
+    """Crea el almacén de una URL 'sqlite:///ruta.db' o 'redis://host:puerto/db'."""
+    if url.startswith("sqlite:///"):
+        # sqlite:///relativa.db o sqlite:////ruta/absoluta.db
+        return AlmacenSQLite(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return AlmacenRedis(url)
+    raise ValueError(f"Almacén de coordinación no soportado: {url}")
+
+# ============== Reparto de activos ==============
+
+def _hash(texto):
+    return int.from_bytes(hashlib.blake2b(texto.encode(), digest_size=8).digest(), "big")
+
+class AnilloConsistente:
+    """
+    Hashing consistente con `replicas` nodos virtuales por worker: al entrar o
+    salir un worker solo se reasignan los activos de su tramo del anillo.
+    """
+
+    def __init__(self, workers, replicas=64):
+        self.workers = sorted(workers)
+        self._anillo = sorted((_hash(f"{w}#{i}"), w) for w in self.workers for i in range(replicas))
+        self._posiciones = [p for p, _ in self._anillo]
+
+    def asignar(self, clave):
+        if not self._anillo:
+            return None
+        i = bisect.bisect(self._posiciones, _hash(clave)) % len(self._anillo)
+        return self._anillo[i][1]
+
+class Coordinador:
+    """
+    Un worker de un despliegue con varios: publica latidos, reparte los activos
+    entre los workers vivos con hashing consistente y toma un lease por activo y
+    vela antes de evaluarlo, de modo que cada vela se evalúa una sola vez aunque
+    cambie el conjunto de workers. Un hilo propio mantiene vivos el latido y los
+    leases durante ciclos largos; si el worker muere, sus activos pasan a otros
+    al vencer su latido (`ttl` segundos).
+    """
+
+    def __init__(self, almacen, worker=None, intervalo_latido=10, ttl=30, retencion=24 * 3600,
+                 reloj=time.time, hilo=True):
+        self.almacen = almacen
+        self.worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+        self.intervalo_latido = intervalo_latido
+        self.ttl = ttl
+        self.retencion = retencion
+        self.reloj = reloj
+        self.anillo = AnilloConsistente([])
+        self._leases = set()
+        self._lock = threading.Lock()
+        self._detenido = threading.Event()
+        self._hilo = None
+        self.latir()
+        if hilo:
+            self._hilo = threading.Thread(target=self._latir_periodicamente, name="coordinacion", daemon=True)
+            self._hilo.start()
+
+    def latir(self):
+        """Renueva el latido y los leases en curso y actualiza el anillo con los workers vivos."""
+        ahora = self.reloj()
+        self.almacen.latido(self.worker, self.ttl, ahora)
+        with self._lock:
+            claves = list(self._leases)
+        if claves:
+            self.almacen.renovar_leases(claves, self.worker, self.ttl, ahora)
+        vivos = self.almacen.workers_vivos(ahora)
+        if vivos != self.anillo.workers:
+            logger.info(f"🧩 Workers activos ({len(vivos)}): {', '.join(vivos)}")
+            self.anillo = AnilloConsistente(vivos)
+        return vivos
+
+    def _latir_periodicamente(self):
+        while not self._detenido.wait(self.intervalo_latido):
+            try:
+                self.latir()
+            except Exception as e:
+                logger.error(f"❌ Error renovando el latido de {self.worker}: {e}")
+
+    def asignados(self, activos):
+        """Los activos ({nombre: ...}) que el anillo asigna a este worker."""
+        return {nombre: valor for nombre, valor in activos.items() if self.anillo.asignar(nombre) == self.worker}
+
+    @staticmethod
+    def _clave(nombre, cierre):
+        return f"{nombre}@{cierre:%Y-%m-%dT%H:%M}"
+
+    def reclamar(self, pendientes):
+        """
+        De {nombre: (ticker, cierre)} devuelve los asignados a este worker cuyo
+        lease se pudo tomar (los ya evaluados por otro worker quedan fuera).
+        """
+        ahora = self.reloj()
+        reclamados = {}
+        for nombre, (ticker, cierre) in self.asignados(pendientes).items():
+            clave = self._clave(nombre, cierre)
+            if self.almacen.tomar_lease(clave, self.worker, self.ttl, ahora):
+                with self._lock:
+                    self._leases.add(clave)
+                reclamados[nombre] = (ticker, cierre)
+        return reclamados
+
+    def completar(self, reclamados):
+        """Marca como evaluadas las velas reclamadas para que ningún worker las repita."""
+        ahora = self.reloj()
+        for nombre, (_, cierre) in reclamados.items():
+            clave = self._clave(nombre, cierre)
+            self.almacen.completar_lease(clave, self.worker, self.retencion, ahora)
+            with self._lock:
+                self._leases.discard(clave)
+
+    def liberar(self, reclamados):
+        """Suelta los leases de velas reclamadas sin completar (p. ej. si el ciclo falló) para reintentarlas."""
+        for nombre, (_, cierre) in reclamados.items():
+            clave = self._clave(nombre, cierre)
+            with self._lock:
+                if clave not in self._leases:
+                    continue
+                self._leases.discard(clave)
+            self.almacen.liberar_lease(clave, self.worker)
+
+    @contextmanager
+    def exclusivo(self, nombre, espera=None, pausa=0.05):
+        """
+        Sección que ejecuta un solo worker a la vez (un lease sin vela). Espera hasta
+        `espera` segundos (por defecto `ttl`) y entrega True si lo obtuvo; si no,
+        False, y el llamador decide si seguir sin exclusión.
+        """
+        clave = f"exclusivo:{nombre}"
+        limite = time.monotonic() + (self.ttl if espera is None else espera)
+        tomado = self.almacen.tomar_lease(clave, self.worker, self.ttl, self.reloj())
+        while not tomado and time.monotonic() < limite:
+            time.sleep(pausa)
+            tomado = self.almacen.tomar_lease(clave, self.worker, self.ttl, self.reloj())
+        try:
+            yield tomado
+        finally:
+            if tomado:
+                self.almacen.liberar_lease(clave, self.worker)
+
+    def publicar_exposiciones(self, pares, ttl):
+        """Publica las exposiciones ((activo, dirección 1/-1)) de este worker para los demás."""
+        self.almacen.publicar_exposiciones(self.worker, [[a, int(d)] for a, d in pares], ttl, self.reloj())
+
+    def exposiciones_ajenas(self):
+        """Pares (activo, dirección) publicados por los demás workers, sin repetir."""
+        publicadas = self.almacen.exposiciones(self.reloj())
+        return sorted({(a, int(d)) for worker, pares in publicadas.items() if worker != self.worker for a, d in pares})
+
+    def detener(self):
+        """Libera los leases sin completar y se retira para que los demás tomen sus activos ya."""
+        self._detenido.set()
+        if self._hilo is not None:
+            self._hilo.join(self.intervalo_latido)
+        with self._lock:
+            claves, self._leases = list(self._leases), set()
+        for clave in claves:
+            self.almacen.liberar_lease(clave, self.worker)
+        self.almacen.retirar(self.worker)
+
+_almacen = None
+_coordinador = None
+_lock_global = threading.Lock()
+
+def url_coordinacion():
+    """COORDINACION_URL o CONFIG['coordinacion']['almacen']; None con un solo worker."""
+    return os.getenv("COORDINACION_URL") or CONFIG.get("coordinacion", {}).get("almacen")
+
+def obtener_almacen_coordinacion():
+    """Almacén compartido por el proceso, o None si no hay coordinación configurada."""
+    global _almacen
+    with _lock_global:
+        url = url_coordinacion()
+        if _almacen is None and url:
+            _almacen = crear_almacen(url)
+        return _almacen
+
+def obtener_coordinador():
+    """Coordinador de este worker, o None si no hay coordinación configurada."""
+    global _coordinador
+    almacen = obtener_almacen_coordinacion()
+    with _lock_global:
+        if _coordinador is None and almacen is not None:
+            conf = CONFIG.get("coordinacion", {})
+            _coordinador = Coordinador(
+                almacen,
+                worker=os.getenv("WORKER_ID") or conf.get("worker"),
+                intervalo_latido=conf.get("latido_segundos", 10),
+                ttl=conf.get("ttl_segundos", 30),
+            )
+            atexit.register(_coordinador.detener)
+            logger.info(f"🧩 Worker {_coordinador.worker} coordinado vía {url_coordinacion()}")
+        return _coordinador
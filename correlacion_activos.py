@@ -0,0 +1,237 @@
+# correlacion_activos.py
+
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from config_activos import CONFIG
+
+logger = logging.getLogger(__name__)
+
+_SIN_VELA = np.iinfo(np.int64).min
+
+def _ns(fechas):
+    return pd.DatetimeIndex(fechas).values.astype("datetime64[ns]").view(np.int64)
+
+class MatrizCorrelacion:
+    """
+    Covarianza y correlación entre activos de los retornos logarítmicos del cierre,
+    con media móvil exponencial de `ventana` velas de span, actualizada vela a vela:
+    cada vela nueva cuesta O(k²) para los k activos que la tienen, sin volver a leer
+    la historia. Cada par solo se actualiza en las velas que comparten (forex no
+    cotiza los fines de semana y cripto sí) y su correlación no se usa hasta que
+    ambos activos suman `min_observaciones` velas.
+
+    Las velas se acumulan con `actualizar` (por lotes o por activo) y se incorporan
+    a la matriz en orden de fecha con `aplicar`, cuando ya llegaron todos los activos
+    de esas velas; las que llegan después de aplicada su fecha se descartan.
+    """
+
+    def __init__(self, ventana=100, min_observaciones=30):
+        self.ventana = ventana
+        self.alfa = 2 / (ventana + 1)
+        self.min_observaciones = min_observaciones
+        self.activos = []
+        self._codigos = {}
+        self.media = np.zeros(0)
+        self.cov = np.zeros((0, 0))
+        self.observaciones = np.zeros(0, dtype=np.int64)   # velas incorporadas por activo
+        self.ultima = np.zeros(0, dtype=np.int64)          # última vela acumulada por activo
+        self.aplicado = _SIN_VELA                          # última vela incorporada a la matriz
+        self._pendientes = []                              # (código, fechas, retornos) por aplicar
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.activos)
+
+    def _codigo(self, activo):
+        if activo not in self._codigos:
+            self._codigos[activo] = len(self.activos)
+            self.activos.append(activo)
+        return self._codigos[activo]
+
+    def _reservar(self, nuevos):
+        """Agranda los vectores por activo si no caben `nuevos` activos más."""
+        n = len(self.activos)
+        if n + nuevos <= len(self.media):
+            return
+        capacidad = max(2 * len(self.media), n + nuevos)
+        media, observaciones, ultima = self.media, self.observaciones, self.ultima
+        self.media = np.zeros(capacidad)
+        self.observaciones = np.zeros(capacidad, dtype=np.int64)
+        self.ultima = np.full(capacidad, _SIN_VELA, dtype=np.int64)
+        self.media[:n], self.observaciones[:n], self.ultima[:n] = media[:n], observaciones[:n], ultima[:n]
+
+    def _ampliar_cov(self):
+        """La covarianza (n x n) se agranda al usarla, ya con todos los activos del ciclo."""
+        n = len(self.activos)
+        if len(self.cov) < n:
+            cov = np.zeros((n, n))
+            cov[:len(self.cov), :len(self.cov)] = self.cov
+            self.cov = cov
+
+    def actualizar(self, velas, hasta=None):
+        """
+        Acumula los retornos de las velas de `velas` ({activo: DataFrame con 'close'})
+        que empiezan antes de `hasta` (las cerradas) y aún no se acumularon. De un
+        activo nuevo solo se toman las últimas 2 x `ventana` velas: lo anterior
+        pesa menos del 2% en la media exponencial.
+        """
+        limite = None if hasta is None else _ns([hasta])[0]
+        with self._lock:
+            self._reservar(sum(activo not in self._codigos for activo in velas))
+            for activo, df in velas.items():
+                if df is None or len(df) < 2:
+                    continue
+                codigo = self._codigo(activo)
+                fechas = _ns(df.index)
+                cierre = df["close"].to_numpy(dtype=np.float64)
+                j = len(fechas) if limite is None else int(np.searchsorted(fechas, limite, side="left"))
+                desde = max(self.ultima[codigo], self.aplicado)
+                i = max(int(np.searchsorted(fechas, desde, side="right")), 1)
+                if self.ultima[codigo] == _SIN_VELA:
+                    i = max(i, j - 2 * self.ventana)
+                if j <= i:
+                    continue
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    retornos = np.log(cierre[i:j] / cierre[i - 1:j - 1])
+                validos = np.isfinite(retornos)
+                # En float32: el retorno solo se guarda hasta `aplicar` y no necesita más precisión
+                self._pendientes.append((codigo, fechas[i:j][validos], retornos[validos].astype(np.float32)))
+                self.ultima[codigo] = fechas[j - 1]
+
+    def aplicar(self, hasta=None):
+        """Incorpora a la matriz, en orden, las velas acumuladas anteriores a `hasta`. Devuelve cuántas."""
+        with self._lock:
+            if not self._pendientes:
+                return 0
+            partes, self._pendientes = self._pendientes, []
+            limite = np.iinfo(np.int64).max if hasta is None else _ns([hasta])[0]
+            listas = []
+            for codigo, fechas, retornos in partes:
+                corte = int(np.searchsorted(fechas, limite, side="left"))
+                if corte < len(fechas):
+                    self._pendientes.append((codigo, fechas[corte:], retornos[corte:]))
+                if corte:
+                    listas.append((codigo, fechas[:corte], retornos[:corte]))
+            del partes
+            if not listas:
+                return 0
+
+            # Panel velas x activos (NaN donde el activo no tiene la vela), en orden de fecha
+            unicas = np.unique(np.concatenate([f for _, f, _ in listas]))
+            panel = np.full((len(unicas), len(self.activos)), np.nan)
+            for codigo, fechas, retornos in listas:
+                panel[np.searchsorted(unicas, fechas), codigo] = retornos
+            del listas
+            self._ampliar_cov()
+            for fila in panel:
+                idx = np.flatnonzero(~np.isnan(fila))
+                self._actualizar_vela(idx, fila[idx])
+            self.aplicado = max(self.aplicado, int(unicas[-1]))
+            return len(unicas)
+
+    def _actualizar_vela(self, idx, retornos):
+        """Actualización exponencial de la media y de la covarianza de los activos `idx` en una vela."""
+        alfa = self.alfa
+        n = len(self.activos)
+        if 2 * len(idx) < n:
+            # Pocos activos en la vela (p. ej. solo cripto el fin de semana): solo su submatriz
+            desvio = retornos - self.media[idx]
+            self.media[idx] += alfa * desvio
+            bloque = np.ix_(idx, idx)
+            self.cov[bloque] = (1 - alfa) * (self.cov[bloque] + alfa * np.outer(desvio, desvio))
+            self.observaciones[idx] += 1
+            return
+
+        # Matriz completa en memoria contigua, con los ausentes enmascarados
+        desvio = np.zeros(n)
+        desvio[idx] = retornos - self.media[idx]
+        self.media[:n] += alfa * desvio
+        nueva = np.outer(desvio, desvio)
+        nueva *= alfa
+        nueva += self.cov[:n, :n]
+        nueva *= 1 - alfa
+        self.observaciones[idx] += 1
+        if len(idx) == n:
+            self.cov[:n, :n] = nueva
+        else:
+            presentes = np.zeros(n, dtype=bool)
+            presentes[idx] = True
+            np.copyto(self.cov[:n, :n], nueva, where=presentes[:, None] & presentes[None, :])
+
+    def _correlacion(self, codigos):
+        self._ampliar_cov()
+        cov = self.cov[np.ix_(codigos, codigos)]
+        desvio = np.sqrt(np.diag(cov))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rho = np.clip(cov / np.outer(desvio, desvio), -1, 1)
+        pocas = self.observaciones[codigos] < self.min_observaciones
+        rho[pocas[:, None] | pocas[None, :]] = np.nan
+        return rho
+
+    def correlacion(self, activos=None):
+        """Matriz de correlación (DataFrame) de `activos` (todos por defecto); NaN sin velas suficientes en común."""
+        with self._lock:
+            activos = [a for a in (activos or self.activos) if a in self._codigos]
+            rho = self._correlacion(np.array([self._codigos[a] for a in activos], dtype=np.int64))
+        return pd.DataFrame(rho, index=activos, columns=activos)
+
+    def filtrar(self, señales, umbral=0.8, abiertas=()):
+        """
+        Ordena las señales por confianza y descarta las que repiten la apuesta de una
+        anterior o de una posición de `abiertas` ((activo, dirección 1/-1)) en otro
+        activo: correlación mayor que `umbral` en la misma dirección o menor que
+        -`umbral` en la contraria. Devuelve (aceptadas en su orden original,
+        suprimidas con "correlacionada_con" y "correlacion" de quien las cubre).
+        """
+        if not señales:
+            return [], []
+        abiertas = list(set(abiertas))
+        with self._lock:
+            conocidos = list(dict.fromkeys(a for a in [s["activo"] for s in señales] + [a for a, _ in abiertas]
+                                           if a in self._codigos))
+            rho = self._correlacion(np.array([self._codigos[a] for a in conocidos], dtype=np.int64))
+        posicion = {activo: i for i, activo in enumerate(conocidos)}
+        # Exposición ya tomada en cada activo conocido: comprada y/o vendida
+        largo = np.zeros(len(conocidos), dtype=bool)
+        corto = np.zeros(len(conocidos), dtype=bool)
+        for activo, direccion in abiertas:
+            if activo in posicion:
+                (largo if direccion == 1 else corto)[posicion[activo]] = True
+
+        def confianza(i):
+            valor = señales[i].get("confianza")
+            return -np.inf if valor is None or pd.isna(valor) else valor
+
+        aceptadas, suprimidas = set(), []
+        for i in sorted(range(len(señales)), key=confianza, reverse=True):
+            señal = señales[i]
+            p = posicion.get(señal["activo"])
+            direccion = 1 if señal["tipo"] == "BUY" else -1
+            if p is not None:
+                # Misma apuesta: correlación > umbral con una compra (o < -umbral con una venta) en la dirección de la señal
+                misma = direccion * rho[p]
+                repite = (largo & (misma > umbral)) | (corto & (-misma > umbral))
+                repite[p] = False
+                if repite.any():
+                    otro = int(np.flatnonzero(repite)[np.argmax(np.abs(rho[p][repite]))])
+                    suprimidas.append({**señal, "correlacionada_con": conocidos[otro], "correlacion": float(rho[p, otro])})
+                    continue
+                (largo if direccion == 1 else corto)[p] = True
+            aceptadas.add(i)
+        return [s for i, s in enumerate(señales) if i in aceptadas], suprimidas
+
+_matriz = None
+_lock_global = threading.Lock()
+
+def obtener_matriz_correlacion():
+    """Matriz compartida por el proceso, configurada desde CONFIG['correlacion']."""
+    global _matriz
+    with _lock_global:
+        if _matriz is None:
+            conf = CONFIG.get("correlacion", {})
+            _matriz = MatrizCorrelacion(conf.get("ventana", 100), conf.get("min_observaciones", 30))
+        return _matriz
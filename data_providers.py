@@ -1,79 +1,283 @@
 # data_providers.py
 
-import os
-import requests
-import pandas as pd
+import threading
+import numpy as np
 import logging
-from dotenv import load_dotenv
 from datetime import datetime, timedelta
-
-load_dotenv()
-API_KEY = os.getenv("TWELVE_DATA_API_KEY")
+from buffer_velas import BufferVelas
+from cache_barras import COLUMNAS, AlmacenBarras, intervalo_a_timedelta
+from indicadores_tecnicos import (COLUMNAS_INDICADORES, HistoriaIndicadores, IndicadoresIncrementales,
+                                  actualizar_indicadores_lote)
+from metricas import obtener_metricas
+from proveedores_datos import obtener_cadena
+from temporalidades import SerieMultiTemporal
+from config_activos import CONFIG
 
 logger = logging.getLogger(__name__)
 
-def obtener_datos(ticker, intervalo="4h", periodo="60d"):
-    """Obtiene datos históricos de Twelve Data para el símbolo dado."""
-    if not API_KEY:
-        logger.error("❌ TWELVE_DATA_API_KEY no configurada en .env")
-        return None
+_almacen = None
+# Serie base y temporalidades derivadas de cada ticker, mantenidas entre ciclos
+_series = {}
+_lock_series = threading.Lock()
+# Velas residentes de cada (ticker, intervalo): (BufferVelas, `actualizado` de la cache que reflejan)
+_buffers = {}
+_lock_buffers = threading.Lock()
+# Indicadores de cada (ticker, intervalo) con su estado incremental, persistidos junto a la cache
+_indicadores = {}
+_lock_indicadores = threading.Lock()
 
+def obtener_almacen():
+    """Devuelve el almacén de velas compartido por el bot y el generador de datasets."""
+    global _almacen
+    if _almacen is None:
+        _almacen = AlmacenBarras(CONFIG.get("cache_dir", "cache_barras"))
+    return _almacen
+
+def _ventana(periodo):
     hoy = datetime.utcnow()
     dias = int(periodo.replace("d", ""))
-    fecha_inicio = hoy - timedelta(days=dias)
-
-    url = "https://api.twelvedata.com/time_series"
-    params = {
-        "symbol": ticker,
-        "interval": intervalo,
-        "start_date": fecha_inicio.strftime("%Y-%m-%d"),
-        "end_date": hoy.strftime("%Y-%m-%d"),
-        "apikey": API_KEY,
-        "format": "JSON",
-        "outputsize": 5000
-    }
+    return hoy, hoy - timedelta(days=dias)
 
-    try:
-        response = requests.get(url, params=params)
-        data = response.json()
+def _capacidad(intervalo, periodo):
+    """Velas que caben en la ventana de `periodo` (más un margen por la vela en curso)."""
+    paso = intervalo_a_timedelta(intervalo)
+    return int(timedelta(days=int(periodo.replace("d", ""))) / paso) + 2
 
-        if "status" in data and data["status"] == "error":
-            logger.error(f"❌ Error al obtener datos de {ticker}: {data.get('message')}")
-            return None
+def _buffer_residente(almacen, ticker, intervalo, capacidad):
+    """
+    Buffer en memoria de la serie cacheada. Se carga del disco la primera vez, si la
+    ventana creció o si otro proceso actualizó la cache desde la última lectura.
+    """
+    actualizado = almacen.actualizado(ticker, intervalo)
+    with _lock_buffers:
+        residente = _buffers.get((ticker, intervalo))
+    if residente is not None and residente[1] == actualizado and residente[0].capacidad >= capacidad:
+        return residente[0]
+
+    buffer = BufferVelas(capacidad)
+    barras = almacen.leer_barras(ticker, intervalo)
+    if barras is not None and len(barras):
+        volumen = np.asarray(barras["volume"])
+        buffer.agregar(np.asarray(barras["ts"]), np.stack([np.asarray(barras[col]) for col in COLUMNAS]),
+                       not np.isnan(volumen).all())
+    with _lock_buffers:
+        _buffers[(ticker, intervalo)] = (buffer, actualizado)
+    return buffer
+
+def _estado_cache(almacen, ticker, intervalo, fecha_inicio, hoy, capacidad):
+    """
+    Decide cómo completar un ticker a partir de la cache.
+    Devuelve (estado, buffer) con estado 'vigente', 'delta' o 'completa'.
+    """
+    buffer = _buffer_residente(almacen, ticker, intervalo, capacidad)
+    cubierto = almacen.cubierto_desde(ticker, intervalo)
+    completo = (len(buffer) > 0
+                and cubierto is not None and cubierto <= fecha_inicio
+                and buffer.ultima_fecha() >= fecha_inicio)
 
-        valores = data.get("values", [])
-        if not valores:
-            logger.warning(f"⚠️ Sin datos para {ticker}")
+    if completo and almacen.vigente(ticker, intervalo, hoy):
+        return "vigente", buffer
+    if completo:
+        return "delta", buffer
+    return "completa", buffer
+
+def _actualizar_cache(almacen, ticker, intervalo, estado, buffer, nuevo, fecha_inicio, hoy):
+    """
+    Incorpora la descarga al buffer residente, persiste la ventana y la devuelve como
+    DataFrame (vistas del buffer, válidas hasta su próxima actualización).
+    """
+    if estado == "vigente":
+        logger.info(f"💾 Datos en cache para {ticker}, sin velas nuevas desde la última descarga")
+        return buffer.a_dataframe(fecha_inicio)
+
+    if estado == "delta":
+        if nuevo is None:
+            logger.warning(f"⚠️ Actualización fallida para {ticker}, se usan datos en cache")
+            return buffer.a_dataframe(fecha_inicio)
+        buffer.agregar(nuevo.fechas(), nuevo.bloque(), nuevo.volumen)
+    else:
+        if nuevo is None:
             return None
+        buffer.vaciar().agregar(nuevo.fechas(), nuevo.bloque(), nuevo.volumen)
+
+    ts, bloque = buffer.ventana(fecha_inicio)
+    try:
+        almacen.guardar_barras(ticker, intervalo, ts, bloque, fecha_inicio, hoy)
+        with _lock_buffers:
+            _buffers[(ticker, intervalo)] = (buffer, hoy)
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudo actualizar la cache de {ticker}: {e}")
+
+    return buffer.a_dataframe(fecha_inicio)
+
+def obtener_datos(ticker, intervalo="4h", periodo="60d", usar_cache=True):
+    """
+    Obtiene datos históricos del símbolo dado de la cadena de proveedores.
+    Con `usar_cache` se parte de las velas guardadas en disco y solo se piden
+    las velas posteriores a la última cacheada (incluida, por si fue revisada).
+    """
+    if not obtener_cadena().proveedores:
+        logger.error("❌ Ningún proveedor de datos configurado en .env")
+        return None
+
+    hoy, fecha_inicio = _ventana(periodo)
 
-        df = pd.DataFrame(valores)
-        df.columns = [col.lower() for col in df.columns]
+    if not usar_cache:
+        nuevo = _descargar(ticker, intervalo, fecha_inicio, hoy)
+        return None if nuevo is None else nuevo.a_dataframe()
 
-        logger.info(f"📊 Columnas recibidas para {ticker}: {df.columns.tolist()}")
+    almacen = obtener_almacen()
+    estado, buffer = _estado_cache(almacen, ticker, intervalo, fecha_inicio, hoy, _capacidad(intervalo, periodo))
 
-        if "close" not in df.columns:
-            logger.warning(f"⚠️ 'close' no disponible. Estimando como promedio OHLC")
-            if all(col in df.columns for col in ["open", "high", "low"]):
-                df["close"] = df[["open", "high", "low"]].astype(float).mean(axis=1)
+    nuevo = None
+    if estado == "delta":
+        nuevo = _descargar(ticker, intervalo, buffer.ultima_fecha().to_pydatetime(), hoy)
+    elif estado == "completa":
+        nuevo = _descargar(ticker, intervalo, fecha_inicio, hoy)
+
+    return _actualizar_cache(almacen, ticker, intervalo, estado, buffer, nuevo, fecha_inicio, hoy)
+
+def obtener_datos_lote(tickers, intervalo="4h", periodo="60d", usar_cache=True):
+    """
+    Variante por lotes de `obtener_datos`: pide varios símbolos en una sola petición
+    al proveedor y devuelve {ticker: DataFrame | None}.
+    Los tickers con cache completa se piden juntos desde la vela cacheada más antigua
+    entre sus últimas velas; el resto se descarga con la ventana completa.
+    """
+    tickers = list(tickers)
+    if not obtener_cadena().proveedores:
+        logger.error("❌ Ningún proveedor de datos configurado en .env")
+        return {ticker: None for ticker in tickers}
+
+    hoy, fecha_inicio = _ventana(periodo)
+    tamano = max(CONFIG.get("tamano_lote", 8), 1)
+
+    if not usar_cache:
+        resultado = {}
+        for i in range(0, len(tickers), tamano):
+            resultado.update(_descargar_lote(tickers[i:i + tamano], intervalo, fecha_inicio, hoy))
+        return {t: None if nuevo is None else nuevo.a_dataframe() for t, nuevo in resultado.items()}
+
+    almacen = obtener_almacen()
+    capacidad = _capacidad(intervalo, periodo)
+    estados = {t: _estado_cache(almacen, t, intervalo, fecha_inicio, hoy, capacidad) for t in tickers}
+    nuevos = {}
+
+    delta = [t for t in tickers if estados[t][0] == "delta"]
+    completa = [t for t in tickers if estados[t][0] == "completa"]
+
+    for grupo in (delta, completa):
+        for i in range(0, len(grupo), tamano):
+            lote = grupo[i:i + tamano]
+            if grupo is delta:
+                desde = min(estados[t][1].ultima_fecha() for t in lote).to_pydatetime()
             else:
-                logger.error(f"❌ Faltan columnas para generar 'close' en {ticker}")
-                return None
+                desde = fecha_inicio
+            nuevos.update(_descargar_lote(lote, intervalo, desde, hoy))
 
-        df["datetime"] = pd.to_datetime(df["datetime"])
-        df.set_index("datetime", inplace=True)
-        df = df.sort_index()
+    return {
+        t: _actualizar_cache(almacen, t, intervalo, estados[t][0], estados[t][1],
+                             nuevos.get(t), fecha_inicio, hoy)
+        for t in tickers
+    }
 
-        for col in ["open", "high", "low", "close", "volume"]:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+def obtener_temporalidades_lote(tickers, intervalos, periodo="60d", usar_cache=True, intervalo_base=None,
+                                incluir_parcial=True):
+    """
+    Descarga una sola temporalidad por ticker, la más fina (`intervalo_base` o la menor
+    de `intervalos`), con `obtener_datos_lote` y su cache, y deriva el resto localmente
+    alineando las velas diarias y mayores según CONFIG['temporalidades']['alineacion'].
+    Las derivadas se mantienen entre llamadas: solo se reagregan las velas nuevas, y
+    sin `incluir_parcial` se omite su vela en curso (la base se devuelve tal cual).
+    Devuelve {ticker: {intervalo: DataFrame | None}}.
+    """
+    intervalos = list(dict.fromkeys(intervalos))
+    base = intervalo_base or min(intervalos, key=intervalo_a_timedelta)
+    alineacion = CONFIG.get("temporalidades", {}).get("alineacion")
+    datos = obtener_datos_lote(tickers, base, periodo, usar_cache)
 
-        df.dropna(inplace=True)
-        logger.info(f"✅ Datos obtenidos para {ticker} ({len(df)} registros)")
+    resultado = {}
+    for ticker, df in datos.items():
+        if df is None:
+            resultado[ticker] = dict.fromkeys(intervalos)
+            continue
+        with _lock_series:
+            serie = _series.get((ticker, base))
+            if serie is None:
+                serie = _series[(ticker, base)] = SerieMultiTemporal(base, intervalos, alineacion)
+        with obtener_metricas().medir("remuestreo"):
+            serie.actualizar(df, reemplazar=True)
+            resultado[ticker] = serie.obtener_varias(intervalos, incluir_parcial)
+    return resultado
 
-        return df
+def _historia_indicadores(almacen, ticker, intervalo):
+    """Historia de indicadores residente del ticker; la primera vez se retoma la guardada en disco."""
+    with _lock_indicadores:
+        historia = _indicadores.get((ticker, intervalo))
+    if historia is not None:
+        return historia
 
-    except Exception as e:
-        logger.exception(f"❌ Excepción al obtener datos de {ticker}: {e}")
-        return None
+    historia = HistoriaIndicadores()
+    guardada = almacen.leer_indicadores(ticker, intervalo) if almacen is not None else None
+    if guardada is not None:
+        estado, barras = guardada
+        try:
+            historia = HistoriaIndicadores(IndicadoresIncrementales.desde_dict(estado), np.asarray(barras["ts"]),
+                                           np.stack([np.asarray(barras[col]) for col in COLUMNAS_INDICADORES]))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"⚠️ Estado de indicadores inválido para {ticker} ({e}), se recalcula")
+    with _lock_indicadores:
+        return _indicadores.setdefault((ticker, intervalo), historia)
+
+def obtener_indicadores_lote(datos, intervalo="4h", usar_cache=True):
+    """
+    Agrega EMA rápida/lenta, RSI y ATR a las velas de `datos` ({ticker: DataFrame | None})
+    a partir del estado incremental de cada ticker: solo se calculan las velas nuevas
+    desde el ciclo anterior. Con `usar_cache` el estado se guarda junto a la cache de
+    velas (solo si cambió) y sobrevive a los reinicios del bot.
+    """
+    almacen = obtener_almacen() if usar_cache else None
+    historias = {ticker: _historia_indicadores(almacen, ticker, intervalo)
+                 for ticker, df in datos.items() if df is not None and len(df)}
+    resultado, cambiados = actualizar_indicadores_lote(datos, historias)
+
+    for ticker in cambiados if usar_cache else ():
+        historia = historias[ticker]
+        try:
+            almacen.guardar_indicadores(ticker, intervalo, historia.estado.a_dict(), historia.ts,
+                                        dict(zip(COLUMNAS_INDICADORES, historia.valores)))
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar el estado de indicadores de {ticker}: {e}")
+    return resultado
 
+def velas_cacheadas(tickers, intervalo="4h", ultimas=None):
+    """
+    Últimas `ultimas` velas guardadas en la cache de cada ticker, sin descargar nada
+    ({ticker: DataFrame | None}). Con varios workers, las que escribieron los demás.
+    """
+    almacen = obtener_almacen()
+    resultado = {}
+    for ticker in tickers:
+        barras = almacen.leer_barras(ticker, intervalo)
+        if barras is None or not len(barras):
+            resultado[ticker] = None
+            continue
+        barras = barras[-ultimas:] if ultimas else barras
+        bloque = np.stack([np.asarray(barras[col]) for col in COLUMNAS])
+        resultado[ticker] = BufferVelas.desde_arrays(np.array(barras["ts"]), bloque).a_dataframe()
+    return resultado
 
+def _descargar(ticker, intervalo, fecha_inicio, fecha_fin):
+    """Descarga las velas de un ticker entre dos fechas (UTC) de la cadena de proveedores."""
+    return _descargar_lote([ticker], intervalo, fecha_inicio, fecha_fin)[ticker]
+
+def _descargar_lote(tickers, intervalo, fecha_inicio, fecha_fin):
+    """
+    Descarga un lote de símbolos de la cadena de proveedores (con cobertura y
+    conmutación) y devuelve {ticker: BufferVelas | None}.
+    """
+    try:
+        return obtener_cadena().descargar(tickers, intervalo, fecha_inicio, fecha_fin)
+    except Exception as e:
+        logger.exception(f"❌ Excepción al obtener el lote {tickers}: {e}")
+        return {ticker: None for ticker in tickers}
@@ -0,0 +1,201 @@
+# dataset_particionado.py
+
+import os
+import json
+import shutil
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+class DatasetParticionado:
+    """
+    Dataset de entrenamiento particionado por activo y periodo en disco:
+
+        directorio/activo=EURUSD/fecha=2025/{ts,open,high,low,close,...}.npy
+
+    Cada columna es un .npy tipado (precios y features en float32, fechas en
+    int64 ns) que se lee con memory-mapping, así solo se tocan las columnas y
+    particiones pedidas: una sola partición se devuelve sin copiar (columnas de
+    solo lectura sobre el mapeo) y varias se copian una vez al DataFrame de salida.
+    El activo vive en la ruta y se devuelve como categoría.
+    Un `esquema.json` en la raíz fija columnas, tipos y frecuencia de partición.
+    """
+
+    def __init__(self, directorio, frecuencia="Y"):
+        self.directorio = directorio
+        self.frecuencia_pedida = frecuencia
+        # Un dataset existente conserva la frecuencia con la que fue escrito
+        esquema = self.esquema()
+        self.frecuencia = esquema.get("frecuencia", frecuencia) if esquema else frecuencia
+
+    # ---------- Rutas y esquema ----------
+
+    def _ruta(self, activo, periodo=None):
+        ruta = os.path.join(self.directorio, f"activo={activo}")
+        return ruta if periodo is None else os.path.join(ruta, f"fecha={periodo}")
+
+    def esquema(self):
+        try:
+            with open(os.path.join(self.directorio, "esquema.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _fijar_esquema(self, tipos):
+        esquema = self.esquema()
+        if esquema is not None:
+            if esquema["columnas"] != tipos:
+                raise ValueError(f"Columnas {tipos} no coinciden con el esquema del dataset {esquema['columnas']}")
+            return
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = os.path.join(self.directorio, "esquema.json")
+        with open(ruta + ".tmp", "w") as f:
+            json.dump({"columnas": tipos, "frecuencia": self.frecuencia}, f, indent=2)
+        os.replace(ruta + ".tmp", ruta)
+
+    def activos(self):
+        if not os.path.isdir(self.directorio):
+            return []
+        return sorted(d.split("=", 1)[1] for d in os.listdir(self.directorio) if d.startswith("activo="))
+
+    def particiones(self, activo):
+        ruta = self._ruta(activo)
+        if not os.path.isdir(ruta):
+            return []
+        # Escritura interrumpida entre los dos renombrados: se restaura la partición previa
+        for d in os.listdir(ruta):
+            if d.endswith(".old") and not os.path.exists(os.path.join(ruta, d[:-4])):
+                os.rename(os.path.join(ruta, d), os.path.join(ruta, d[:-4]))
+        # Los directorios temporales (.tmp/.old) no cuentan
+        return sorted(d.split("=", 1)[1] for d in os.listdir(ruta) if d.startswith("fecha=") and "." not in d)
+
+    # ---------- Lectura ----------
+
+    def _leer_particion(self, activo, periodo, columnas, mmap=True):
+        ruta = self._ruta(activo, periodo)
+        modo = "r" if mmap else None
+        return {col: np.load(os.path.join(ruta, f"{col}.npy"), mmap_mode=modo) for col in ["ts"] + columnas}
+
+    def ultima_fecha(self, activo):
+        """Fecha de la última vela guardada del activo, o None."""
+        particiones = self.particiones(activo)
+        if not particiones:
+            return None
+        ts = self._leer_particion(activo, particiones[-1], [])["ts"]
+        return pd.Timestamp(int(ts[-1]), unit="ns") if len(ts) else None
+
+    def leer(self, columnas=None, activos=None, desde=None, hasta=None):
+        """
+        Carga las columnas pedidas (por defecto todas) de los activos y el rango de
+        fechas indicados. Devuelve un DataFrame indexado por 'Datetime' con la
+        columna categórica 'Activo'. Si se selecciona una sola partición, sus
+        columnas son vistas de solo lectura del memory-mapping (sin copia).
+        """
+        esquema = self.esquema()
+        if esquema is None:
+            raise FileNotFoundError(f"{self.directorio} no contiene un dataset particionado")
+        columnas = list(esquema["columnas"]) if columnas is None else list(columnas)
+        desconocidas = [c for c in columnas if c not in esquema["columnas"]]
+        if desconocidas:
+            raise KeyError(f"Columnas no presentes en el dataset: {desconocidas}")
+
+        activos = self.activos() if activos is None else list(activos)
+        desde = pd.Timestamp(desde).to_period(self.frecuencia) if desde is not None else None
+        hasta = pd.Timestamp(hasta).to_period(self.frecuencia) if hasta is not None else None
+
+        seleccion = []
+        for codigo, activo in enumerate(activos):
+            for periodo in self.particiones(activo):
+                p = pd.Period(periodo, self.frecuencia)
+                if (desde is None or p >= desde) and (hasta is None or p <= hasta):
+                    ts = self._leer_particion(activo, periodo, [], mmap=False)["ts"]
+                    seleccion.append((codigo, activo, periodo, ts))
+
+        if len(seleccion) == 1:
+            # Una partición: las columnas quedan sobre el mapeo, sin copia
+            codigo, activo, periodo, ts = seleccion[0]
+            datos = self._leer_particion(activo, periodo, columnas)
+            del datos["ts"]
+            codigos = np.full(len(ts), codigo, dtype=np.int32)
+        else:
+            # Arrays de salida reservados una vez; cada partición se copia desde su
+            # mapeo y se suelta enseguida (no se acumulan descriptores abiertos)
+            total = sum(len(ts) for *_, ts in seleccion)
+            datos = {col: np.empty(total, dtype=esquema["columnas"][col]) for col in columnas}
+            codigos = np.empty(total, dtype=np.int32)
+            pos = 0
+            for codigo, activo, periodo, ts in seleccion:
+                filas = len(ts)
+                for col in columnas:
+                    datos[col][pos:pos + filas] = np.load(os.path.join(self._ruta(activo, periodo), f"{col}.npy"),
+                                                          mmap_mode="r")
+                codigos[pos:pos + filas] = codigo
+                pos += filas
+            ts = np.concatenate([ts for *_, ts in seleccion]) if seleccion else np.empty(0, dtype="<i8")
+
+        df = pd.DataFrame(datos, index=pd.DatetimeIndex(ts.view("datetime64[ns]"), name="Datetime"), copy=False)
+        df["Activo"] = pd.Categorical.from_codes(codigos, categories=activos)
+
+        if desde is not None or hasta is not None:
+            dentro = np.ones(len(df), dtype=bool)
+            if desde is not None:
+                dentro &= df.index >= desde.start_time
+            if hasta is not None:
+                dentro &= df.index <= hasta.end_time
+            if not dentro.all():
+                df = df[dentro]
+        return df
+
+    # ---------- Escritura ----------
+
+    def escribir(self, activo, df, tipos):
+        """
+        Agrega las velas de `df` (índice de fechas) a las particiones del activo.
+        Las velas ya guardadas con la misma fecha se reemplazan (p. ej. la última
+        vela revisada). Cada partición se reescribe de forma atómica.
+        """
+        self._fijar_esquema(tipos)
+        df = df[~df.index.duplicated(keep="last")].sort_index()
+        if df.empty:
+            return 0
+
+        periodos = df.index.to_period(self.frecuencia)
+        existentes = set(self.particiones(activo))
+        for periodo in periodos.unique():
+            nuevo = df[periodos == periodo]
+            bloque = {"ts": nuevo.index.values.astype("datetime64[ns]").astype("<i8")}
+            for col, tipo in tipos.items():
+                bloque[col] = nuevo[col].to_numpy(dtype=tipo)
+
+            if str(periodo) in existentes:
+                previo = self._leer_particion(activo, str(periodo), list(tipos), mmap=False)
+                conservar = ~np.isin(previo["ts"], bloque["ts"])
+                orden = np.argsort(np.concatenate([previo["ts"][conservar], bloque["ts"]]), kind="stable")
+                bloque = {col: np.concatenate([previo[col][conservar], bloque[col]])[orden] for col in bloque}
+
+            self._reemplazar_particion(activo, str(periodo), bloque)
+        return len(df)
+
+    def _reemplazar_particion(self, activo, periodo, bloque):
+        ruta = self._ruta(activo, periodo)
+        temporal, anterior = ruta + ".tmp", ruta + ".old"
+        for resto in (temporal, anterior):
+            shutil.rmtree(resto, ignore_errors=True)
+
+        os.makedirs(temporal)
+        for col, valores in bloque.items():
+            np.save(os.path.join(temporal, f"{col}.npy"), np.ascontiguousarray(valores))
+
+        if os.path.exists(ruta):
+            os.rename(ruta, anterior)
+        os.rename(temporal, ruta)
+        shutil.rmtree(anterior, ignore_errors=True)
+
+    def eliminar(self, activo=None):
+        """Borra un activo (o todo el dataset) para reconstruirlo desde cero."""
+        ruta = self.directorio if activo is None else self._ruta(activo)
+        shutil.rmtree(ruta, ignore_errors=True)
+        if activo is None:
+            self.frecuencia = self.frecuencia_pedida
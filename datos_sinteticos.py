@@ -0,0 +1,262 @@
+# datos_sinteticos.py
+
+import json
+import time
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from cache_barras import intervalo_a_timedelta
+
+# Parámetros de cada régimen: volatilidad por vela (4h), colas (grados de libertad de
+# la t de Student), velas por tramo de volatilidad constante y decimales de cotización
+REGIMENES = {
+    "forex": {"volatilidad": 0.0015, "colas": 6, "tramo": 60, "dispersion_vol": 0.35,
+              "precio": (0.6, 1.9), "decimales": 5, "fin_de_semana": True, "volumen": False},
+    "cripto": {"volatilidad": 0.012, "colas": 3, "tramo": 30, "dispersion_vol": 0.6,
+               "precio": (5.0, 60000.0), "decimales": 2, "fin_de_semana": False, "volumen": True},
+}
+
+def _rng(semilla, indice):
+    return np.random.default_rng([semilla, indice])
+
+def _fechas(velas, intervalo, fin, fin_de_semana):
+    """Las `velas` fechas de inicio de vela que terminan en `fin` (sin sábados ni fin de semana forex)."""
+    paso = pd.Timedelta(intervalo_a_timedelta(intervalo))
+    fin = pd.Timestamp(fin).floor(paso)
+    margen = int(velas * 7 / 5) + 64 if fin_de_semana else velas
+    fechas = pd.date_range(end=fin, periods=margen, freq=paso)
+    if fin_de_semana:
+        # Forex cierra del viernes 21:00 al domingo 21:00 UTC
+        dia, hora = fechas.dayofweek, fechas.hour
+        cerrado = (dia == 5) | ((dia == 4) & (hora >= 21)) | ((dia == 6) & (hora < 21))
+        fechas = fechas[~cerrado]
+    return fechas[-velas:]
+
+def trayectoria(velas, regimen="forex", semilla=0, indice=0):
+    """
+    OHLC(V) sintético determinista de un activo: paseo geométrico con colas pesadas
+    y volatilidad por tramos. El mismo (semilla, indice) produce siempre la misma serie.
+    """
+    conf = REGIMENES[regimen]
+    rng = _rng(semilla, indice)
+    bajo, alto = conf["precio"]
+    inicial = np.exp(rng.uniform(np.log(bajo), np.log(alto)))
+
+    tramos = -(-velas // conf["tramo"])
+    vol = conf["volatilidad"] * np.repeat(np.exp(rng.normal(0, conf["dispersion_vol"], tramos)), conf["tramo"])[:velas]
+    colas = conf["colas"]
+    choques = rng.standard_t(colas, velas) / np.sqrt(colas / (colas - 2))
+    retornos = vol * choques
+
+    close = inicial * np.exp(np.cumsum(retornos))
+    open_ = np.empty(velas)
+    open_[0] = inicial
+    open_[1:] = close[:-1]
+    mechas = np.abs(rng.normal(0, 0.5, (2, velas))) * vol
+    high = np.maximum(open_, close) * np.exp(mechas[0])
+    low = np.minimum(open_, close) * np.exp(-mechas[1])
+
+    datos = {"open": open_, "high": high, "low": low, "close": close}
+    if conf["volumen"]:
+        datos["volume"] = np.round(rng.lognormal(8, 1, velas) * (1 + np.abs(choques)))
+    return datos
+
+def generar_ohlcv(velas, regimen="forex", semilla=0, indice=0, intervalo="4h", fin=None):
+    """DataFrame OHLC(V) indexado por fecha de inicio de vela, como lo devuelve data_providers."""
+    fechas = _fechas(velas, intervalo, fin or datetime.utcnow(), REGIMENES[regimen]["fin_de_semana"])
+    df = pd.DataFrame(trayectoria(len(fechas), regimen, semilla, indice), index=fechas)
+    df.index.name = "datetime"
+    return df
+
+def nombres_universo(activos, proporcion_cripto=1 / 6):
+    """{nombre: (ticker, régimen)} con la mezcla forex/cripto del universo real (15 + 3)."""
+    cripto = int(round(activos * proporcion_cripto))
+    universo = {}
+    for i in range(activos):
+        regimen = "cripto" if i >= activos - cripto else "forex"
+        nombre = f"{'CR' if regimen == 'cripto' else 'FX'}{i:04d}"
+        universo[nombre] = (f"{nombre[:2]}{i:04d}/{'USD' if regimen == 'cripto' else 'EUR'}", regimen)
+    return universo
+
+def generar_universo(activos, velas, semilla=0, intervalo="4h", fin=None, proporcion_cripto=1 / 6):
+    """{nombre: DataFrame} de `activos` series sintéticas."""
+    fin = fin or datetime.utcnow()
+    return {
+        nombre: generar_ohlcv(velas, regimen, semilla, i, intervalo, fin)
+        for i, (nombre, (_, regimen)) in enumerate(nombres_universo(activos, proporcion_cripto).items())
+    }
+
+def generar_panel(activos, velas, regimen="forex", semilla=0, desde=0):
+    """Arrays (activos x velas) de high, low y close para el kernel de indicadores por panel."""
+    panel = {col: np.empty((activos, velas)) for col in ("high", "low", "close")}
+    for fila in range(activos):
+        datos = trayectoria(velas, regimen, semilla, desde + fila)
+        for col in panel:
+            panel[col][fila] = datos[col]
+    return panel
+
+def _filas_json(df, decimales=5):
+    """Cada vela de `df` (en orden) como objeto JSON de la respuesta de Twelve Data."""
+    columnas = [c for c in ("open", "high", "low", "close", "volume") if c in df.columns]
+    fechas = df.index.strftime("%Y-%m-%d %H:%M:%S")
+    valores = np.round(df[columnas].to_numpy(), decimales).astype(str).tolist()
+    return [
+        json.dumps({"datetime": fecha, **dict(zip(columnas, fila))})
+        for fecha, fila in zip(fechas, valores)
+    ]
+
+def _cuerpo(ticker, intervalo, filas):
+    meta = json.dumps({"symbol": ticker, "interval": intervalo, "type": "Synthetic"})
+    return f'{{"meta": {meta}, "values": [{", ".join(reversed(filas))}], "status": "ok"}}'
+
+def respuesta_twelve_data(df, ticker, intervalo="4h", decimales=5):
+    """Cuerpo JSON (texto) de /time_series de Twelve Data para un símbolo (velas más recientes primero)."""
+    return _cuerpo(ticker, intervalo, _filas_json(df, decimales))
+
+class _Respuesta:
+    def __init__(self, cuerpo, status_code=200):
+        self.content = cuerpo
+        self.status_code = status_code
+
+    def json(self):
+        return json.loads(self.content)
+
+class ProveedorSimulado:
+    """
+    Sustituto de la sesión HTTP de proveedores_datos: responde /time_series desde un
+    universo sintético ({ticker: DataFrame}), respetando el lote de símbolos y las
+    fechas pedidas, con una latencia fija opcional por petición. Las velas se
+    codifican al construirlo para que el costo medido sea el del cliente.
+    """
+
+    def __init__(self, series, latencia=0.0, decimales=None):
+        decimales = decimales or {}
+        self.latencia = latencia
+        self.fechas = {ticker: df.index.to_numpy() for ticker, df in series.items()}
+        self.filas = {ticker: _filas_json(df, decimales.get(ticker, 5)) for ticker, df in series.items()}
+        self.peticiones = 0
+        self.bytes = 0
+
+    def _simbolo(self, simbolo, params):
+        fechas = self.fechas.get(simbolo)
+        if fechas is None:
+            return json.dumps({"status": "error", "code": 404, "message": f"symbol {simbolo} not found"})
+        desde = np.searchsorted(fechas, np.datetime64(pd.Timestamp(params["start_date"])), "left")
+        hasta = np.searchsorted(fechas, np.datetime64(pd.Timestamp(params["end_date"])), "right")
+        desde = max(desde, hasta - params.get("outputsize", 5000))
+        return _cuerpo(simbolo, params.get("interval", "4h"), self.filas[simbolo][desde:hasta])
+
+    def get(self, url, params=None, timeout=None):
+        if self.latencia:
+            time.sleep(self.latencia)
+        simbolos = params["symbol"].split(",")
+        if len(simbolos) == 1:
+            cuerpo = self._simbolo(simbolos[0], params)
+        else:
+            cuerpo = "{" + ", ".join(f"{json.dumps(s)}: {self._simbolo(s, params)}" for s in simbolos) + "}"
+        cuerpo = cuerpo.encode()
+        self.peticiones += 1
+        self.bytes += len(cuerpo)
+        return _Respuesta(cuerpo)
+
+class ServidorProveedores:
+    """
+    Servidor HTTP local que imita /time_series de Twelve Data y las barras de Alpaca
+    (forex en /v1beta1/forex/bars y cripto en /v1beta3/crypto/us/bars, paginadas con
+    `next_page_token`) desde un universo sintético ({ticker: DataFrame}). `url` sirve
+    de base para ambos proveedores. Para probar cobertura y conmutación, `latencia` y
+    `estado` ({"twelve_data" | "alpaca": segundos | código HTTP}) retrasan o hacen
+    fallar las respuestas de un proveedor y `malformado` (conjunto de proveedores)
+    le quita a cada vela la fecha (Twelve Data) o el open (Alpaca).
+    Usar con `with` o `.cerrar()`.
+    """
+
+    def __init__(self, series, host="127.0.0.1", puerto=0, decimales=None):
+        self.series = series
+        self.simulado = ProveedorSimulado(series, decimales=decimales)
+        self.latencia = {}
+        self.estado = {}
+        self.malformado = set()
+        self.peticiones = {"twelve_data": 0, "alpaca": 0}
+        self._lock = threading.Lock()
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                ruta = urlparse(self.path)
+                codigo, cuerpo = servidor._responder(ruta.path, {k: v[-1] for k, v in parse_qs(ruta.query).items()})
+                self.send_response(codigo)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass
+
+        self._http = ThreadingHTTPServer((host, puerto), Manejador)
+        self._http.daemon_threads = True
+        self.url = f"http://{host}:{self._http.server_address[1]}"
+        self._hilo = threading.Thread(target=self._http.serve_forever, name="servidor-proveedores", daemon=True)
+        self._hilo.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.cerrar()
+
+    def cerrar(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def _responder(self, ruta, params):
+        proveedor = "twelve_data" if ruta == "/time_series" else "alpaca" if ruta.endswith("/bars") else None
+        if proveedor is None:
+            return 404, json.dumps({"message": f"{ruta} no existe"}).encode()
+        with self._lock:
+            self.peticiones[proveedor] += 1
+        if self.latencia.get(proveedor):
+            time.sleep(self.latencia[proveedor])
+        if self.estado.get(proveedor, 200) != 200:
+            return self.estado[proveedor], json.dumps({"message": f"error simulado de {proveedor}"}).encode()
+
+        if proveedor == "twelve_data":
+            params["outputsize"] = int(params.get("outputsize", 5000))
+            cuerpo = self.simulado.get(ruta, params).content
+            if proveedor in self.malformado:
+                cuerpo = cuerpo.replace(b'"datetime"', b'"fecha"')
+            return 200, cuerpo
+        return 200, json.dumps(self._barras_alpaca(ruta, params, proveedor in self.malformado)).encode()
+
+    def _barras_alpaca(self, ruta, params, malformado=False):
+        """Una página de barras de todos los símbolos pedidos, en orden de símbolo y fecha."""
+        cripto = "/crypto/" in ruta
+        desde = pd.Timestamp(params["start"]).tz_convert(None)
+        hasta = pd.Timestamp(params["end"]).tz_convert(None)
+        filas = []
+        for simbolo in params["symbols"].split(","):
+            df = self.series.get(simbolo if cripto else f"{simbolo[:3]}/{simbolo[3:]}")
+            if df is None:
+                continue
+            df = df[(df.index >= desde) & (df.index <= hasta)]
+            columnas = [c for c in ("open", "high", "low", "close", "volume") if c in df.columns]
+            claves = [c[0] for c in columnas]
+            for fecha, fila in zip(df.index.strftime("%Y-%m-%dT%H:%M:%SZ"), df[columnas].to_numpy().tolist()):
+                barra = {"t": fecha, **dict(zip(claves, fila))}
+                if malformado:
+                    del barra["o"]
+                filas.append((simbolo, barra))
+
+        inicio = int(params.get("page_token") or 0)
+        limite = int(params.get("limit", 10000))
+        barras = {}
+        for simbolo, barra in filas[inicio:inicio + limite]:
+            barras.setdefault(simbolo, []).append(barra)
+        siguiente = str(inicio + limite) if inicio + limite < len(filas) else None
+        return {"bars": barras, "next_page_token": siguiente}
@@ -0,0 +1,210 @@
+# diario_senales.py
+
+import os
+import csv
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from config_activos import CONFIG
+
+logger = logging.getLogger(__name__)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS senales (
+    id INTEGER PRIMARY KEY,
+    activo TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    fecha_vela TEXT,
+    tipo TEXT NOT NULL,
+    precio REAL NOT NULL,
+    sl REAL,
+    tp REAL,
+    confianza REAL,
+    rangos TEXT,
+    modelo_version TEXT,
+    estado TEXT NOT NULL DEFAULT 'ABIERTA',
+    fecha_cierre TEXT,
+    precio_cierre REAL,
+    features TEXT,
+    retorno REAL,
+    velas INTEGER,
+    estrategia TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_senales_activo_fecha ON senales (activo, fecha, tipo);
+CREATE INDEX IF NOT EXISTS idx_senales_fecha ON senales (fecha);
+CREATE INDEX IF NOT EXISTS idx_senales_abiertas ON senales (activo) WHERE estado = 'ABIERTA';
+-- Una señal por activo, vela y dirección: un reinicio dentro de la misma vela no la repite
+CREATE UNIQUE INDEX IF NOT EXISTS idx_senales_vela ON senales (activo, fecha_vela, tipo);
+"""
+
+COLUMNAS = ["activo", "fecha", "fecha_vela", "tipo", "precio", "sl", "tp", "confianza", "rangos", "modelo_version",
+            "features", "estrategia"]
+# Columnas agregadas después de la primera versión del esquema (se crean en diarios existentes)
+COLUMNAS_AGREGADAS = {"features": "TEXT", "retorno": "REAL", "velas": "INTEGER", "estrategia": "TEXT"}
+
+def _texto_fecha(fecha):
+    return None if fecha is None else pd.Timestamp(fecha).isoformat(sep=" ")
+
+def _texto_features(features):
+    """Vector de features de la entrada (Series o dict) como JSON, para reentrenar."""
+    if features is None:
+        return None
+    return json.dumps({str(k): None if pd.isna(v) else float(v) for k, v in dict(features).items()})
+
+class DiarioSenales:
+    """
+    Registro de señales en SQLite (modo WAL): cada ciclo escribe sus señales en
+    una sola transacción y las consultas de últimas señales por activo o de
+    señales abiertas usan índices en lugar de recorrer un CSV.
+    """
+
+    def __init__(self, ruta="senales.db"):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.executescript(ESQUEMA)
+        existentes = {fila[1] for fila in self._conexion.execute("PRAGMA table_info(senales)")}
+        for columna, tipo in COLUMNAS_AGREGADAS.items():
+            if columna not in existentes:
+                self._conexion.execute(f"ALTER TABLE senales ADD COLUMN {columna} {tipo}")
+
+    def cerrar_conexion(self):
+        with self._lock:
+            self._conexion.close()
+
+    def _consultar(self, sql, parametros=()):
+        with self._lock:
+            cursor = self._conexion.execute(sql, parametros)
+            filas = cursor.fetchall()
+        return pd.DataFrame(filas, columns=[d[0] for d in cursor.description])
+
+    def registrar(self, señales, modelo_version=None):
+        """
+        Guarda las señales del ciclo en una transacción. Devuelve las señales que
+        eran nuevas (las ya registradas para la misma vela y dirección se omiten).
+        """
+        nuevas = []
+        with self._lock, self._conexion:
+            for señal in señales:
+                rangos = señal.get("rangos")
+                cursor = self._conexion.execute(
+                    f"INSERT OR IGNORE INTO senales ({', '.join(COLUMNAS)}) VALUES ({', '.join('?' * len(COLUMNAS))})",
+                    (
+                        señal["activo"],
+                        _texto_fecha(señal.get("fecha") or datetime.now()),
+                        _texto_fecha(señal.get("fecha_vela")),
+                        señal["tipo"],
+                        float(señal["precio"]),
+                        None if señal.get("sl") is None else float(señal["sl"]),
+                        None if señal.get("tp") is None else float(señal["tp"]),
+                        None if señal.get("confianza") is None else float(señal["confianza"]),
+                        ", ".join(rangos) if isinstance(rangos, (list, tuple)) else rangos,
+                        señal.get("modelo_version", modelo_version),
+                        _texto_features(señal.get("features")),
+                        señal.get("estrategia"),
+                    ),
+                )
+                if cursor.rowcount:
+                    nuevas.append({**señal, "id": cursor.lastrowid})
+        return nuevas
+
+    def cerrar(self, id_senal, estado, precio_cierre=None, fecha_cierre=None):
+        """Marca una señal como cerrada ('TP', 'SL', 'EXPIRA', ...)."""
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                "UPDATE senales SET estado = ?, precio_cierre = ?, fecha_cierre = ? WHERE id = ?",
+                (estado, precio_cierre, _texto_fecha(fecha_cierre or datetime.now()), id_senal),
+            )
+
+    def cerrar_lote(self, resultados):
+        """
+        Cierra en una transacción las posiciones resueltas por el seguimiento
+        (dicts con id, estado, precio_cierre, fecha_cierre, retorno y velas).
+        Las que ya estaban cerradas no se tocan. Devuelve cuántas se cerraron.
+        """
+        with self._lock, self._conexion:
+            cursor = self._conexion.executemany(
+                "UPDATE senales SET estado = ?, precio_cierre = ?, fecha_cierre = ?, retorno = ?, velas = ? "
+                "WHERE id = ? AND estado = 'ABIERTA'",
+                [(r["estado"], float(r["precio_cierre"]), _texto_fecha(r["fecha_cierre"]), float(r["retorno"]),
+                  int(r["velas"]), int(r["id"])) for r in resultados],
+            )
+            return cursor.rowcount
+
+    def ultimas(self, activo=None, n=10):
+        """Últimas `n` señales de un activo, o de cada activo si no se indica."""
+        if activo is not None:
+            return self._consultar(
+                "SELECT * FROM senales WHERE activo = ? ORDER BY fecha DESC, id DESC LIMIT ?", (activo, n)
+            )
+        # Una consulta indexada por activo en lugar de ordenar toda la tabla
+        with self._lock:
+            activos = [fila[0] for fila in self._conexion.execute("SELECT DISTINCT activo FROM senales ORDER BY activo")]
+        if not activos:
+            return self.ultimas("", n)
+        return pd.concat([self.ultimas(a, n) for a in activos], ignore_index=True)
+
+    def abiertas(self, activo=None):
+        """Señales sin cerrar, opcionalmente de un solo activo."""
+        if activo is not None:
+            return self._consultar(
+                "SELECT * FROM senales WHERE estado = 'ABIERTA' AND activo = ? ORDER BY fecha", (activo,)
+            )
+        return self._consultar("SELECT * FROM senales WHERE estado = 'ABIERTA' ORDER BY fecha")
+
+    def entre(self, desde=None, hasta=None):
+        """Señales emitidas en un rango de fechas (para reportes y reentrenamiento)."""
+        return self._consultar(
+            "SELECT * FROM senales WHERE fecha >= ? AND fecha <= ? ORDER BY fecha",
+            (_texto_fecha(desde) or "", _texto_fecha(hasta) or "9999"),
+        )
+
+    def resultados(self, desde=None, hasta=None):
+        """
+        Señales resueltas (TP, SL o EXPIRA) emitidas en un rango de fechas, con sus
+        features de entrada expandidas en columnas, para reentrenar el modelo.
+        """
+        df = self._consultar(
+            "SELECT * FROM senales WHERE estado IN ('TP', 'SL', 'EXPIRA') AND fecha >= ? AND fecha <= ? ORDER BY fecha",
+            (_texto_fecha(desde) or "", _texto_fecha(hasta) or "9999"),
+        )
+        features = pd.DataFrame([json.loads(f) if f else {} for f in df.pop("features")], index=df.index)
+        return df.join(features.drop(columns=[c for c in features.columns if c in df.columns]))
+
+    def importar_csv(self, ruta):
+        """Migra el antiguo resultados_estrategia.csv (activo,fecha,precio,señal,modelo)."""
+        señales = []
+        with open(ruta, newline="") as f:
+            for fila in csv.reader(f):
+                if len(fila) < 4:
+                    continue
+                activo, fecha, precio, tipo = fila[:4]
+                señales.append({"activo": activo, "fecha": fecha, "fecha_vela": fecha, "tipo": tipo,
+                                "precio": precio, "modelo_version": fila[4] if len(fila) > 4 else None})
+        nuevas = self.registrar(señales)
+        # Sin SL/TP no se puede seguir su resultado: no cuentan como abiertas
+        with self._lock, self._conexion:
+            self._conexion.executemany("UPDATE senales SET estado = 'IMPORTADA' WHERE id = ?",
+                                       [(s["id"],) for s in nuevas])
+        return len(nuevas)
+
+_diario = None
+_lock_global = threading.Lock()
+
+def obtener_diario():
+    """Diario compartido por todo el proceso, en CONFIG['diario_path']."""
+    global _diario
+    with _lock_global:
+        if _diario is None:
+            _diario = DiarioSenales(CONFIG.get("diario_path", "senales.db"))
+            legado = "resultados_estrategia.csv"
+            if os.path.exists(legado) and not len(_diario.ultimas(n=1)):
+                logger.info(f"📥 Migradas {_diario.importar_csv(legado)} señales desde {legado}")
+        return _diario
@@ -1,68 +1,292 @@
 # entrenar_modelo_pro.py
 
+import os
+import argparse
+import itertools
 import pandas as pd
 import numpy as np
-import joblib
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
+from sklearn.metrics import classification_report, f1_score, balanced_accuracy_score
+from modelo_ml import FEATURES_MODELO, guardar_modelo, exportar_compacto
+from indicadores_tecnicos import calcular_atr
+from backtest_estrategia import resolver_salidas
+from estrategia_trading import MULT_SL, MULT_TP
+from dataset_particionado import DatasetParticionado
+from config_activos import CONFIG
 
 # ============================== CONFIGURACIÓN ==============================
 RUTA_SALIDA_MODELO = "modelo_trained_rf_pro.pkl"
+RUTA_SALIDA_COMPACTO = "modelo_trained_rf_pro_compacto"
+RUTA_RESULTADOS_BUSQUEDA = "resultados_busqueda.csv"
 UMBRAL_RETORNO = 0.0025  # 0.25%
 VENTANA_RETARDO = 6  # 6 velas = 24h en intervalo 4h
+RUTA_CSV = "datasets/dataset_entrenamiento_pro.csv"
+COLUMNAS_ENTRENAMIENTO = ["high", "low", "close"] + FEATURES_MODELO
+# Salidas de las operaciones simuladas en la búsqueda (como backtest_estrategia)
+HORIZONTE_OPERACION = 30
+PERIODO_ATR = 14
+
+PARAMETROS_MODELO = {"n_estimators": 200, "max_depth": 6, "min_samples_leaf": 1}
+
+# Grilla por defecto de la búsqueda walk-forward
+GRILLA_MODELO = {
+    "n_estimators": [100, 200],
+    "max_depth": [4, 6, 8],
+    "min_samples_leaf": [1, 5],
+}
+GRILLA_ETIQUETAS = {
+    "umbral": [0.0015, 0.0025, 0.004],
+    "ventana": [3, 6, 12],
+}
+# Métrica de trading con la que se elige el etiquetado (retorno_total o profit_factor)
+METRICA_ETIQUETADO = "profit_factor"
 
 # ============================== FUNCIONES ==============================
 
-def calcular_etiquetas(df):
+def retorno_futuro(df, ventana=VENTANA_RETARDO):
+    """
+    Retorno a `ventana` velas y fecha de la vela que lo decide, calculados dentro
+    de cada activo para no mezclar series. Arrays alineados con `df` (NaN al final).
+    """
+    grupos = df["ACTIVO"].to_numpy() if "ACTIVO" in df.columns else np.zeros(len(df))
+    retorno = df["CLOSE"].groupby(grupos).shift(-ventana) / df["CLOSE"] - 1
+    fin = df.index.to_series().groupby(grupos).shift(-ventana)
+    return retorno.to_numpy(), fin.to_numpy()
+
+def retorno_operaciones(df, horizonte=HORIZONTE_OPERACION):
+    """
+    Retorno de una compra y de una venta abiertas en cada vela, con las salidas de
+    backtest_estrategia: SL a MULT_SL y TP a MULT_TP veces el ATR, primer toque o
+    expiración a `horizonte` velas. No dependen del etiquetado, así todos se comparan
+    sobre las mismas operaciones. Arrays alineados con `df` (NaN si queda abierta).
+    """
+    grupos = df["ACTIVO"].to_numpy() if "ACTIVO" in df.columns else np.zeros(len(df))
+    compra, venta = np.full(len(df), np.nan), np.full(len(df), np.nan)
+    for grupo in pd.unique(grupos):
+        filas = np.flatnonzero(grupos == grupo)
+        velas = pd.DataFrame({col: df[col.upper()].to_numpy(dtype=float)[filas] for col in ("high", "low", "close")})
+        high, low, close = (velas[col].to_numpy() for col in ("high", "low", "close"))
+        atr = calcular_atr(velas, PERIODO_ATR).to_numpy()
+        entradas = np.arange(len(filas))
+        for d, destino in ((1, compra), (-1, venta)):
+            direccion = np.full(len(filas), d)
+            resultado, _, salida = resolver_salidas(high, low, close, entradas, direccion,
+                                                    close - d * MULT_SL * atr, close + d * MULT_TP * atr, horizonte)
+            destino[filas] = np.where(resultado == "ABIERTA", np.nan, d * (salida - close) / close)
+    return compra, venta
+
+def calcular_etiquetas(df, umbral=UMBRAL_RETORNO, ventana=VENTANA_RETARDO):
     """Crea la columna de etiquetas (BUY, SELL, HOLD) según variación futura del precio"""
     df = df.copy()
-    df["future_return"] = df["CLOSE"].shift(-VENTANA_RETARDO) / df["CLOSE"] - 1
+    # FIN_ETIQUETA: fecha de la vela que decide la etiqueta (para purgar la validación)
+    df["future_return"], df["FIN_ETIQUETA"] = retorno_futuro(df, ventana)
     condiciones = [
-        df["future_return"] > UMBRAL_RETORNO,
-        df["future_return"] < -UMBRAL_RETORNO
+        df["future_return"] > umbral,
+        df["future_return"] < -umbral
     ]
     elecciones = ["BUY", "SELL"]
     df["Label"] = np.select(condiciones, elecciones, default="HOLD")
     return df.dropna()
 
-def cargar_dataset(csv_path):
-    df = pd.read_csv(csv_path, parse_dates=["Datetime"])
+def cargar_dataset(ruta, columnas=None):
+    """
+    Carga el dataset desde el directorio particionado (solo las `columnas` pedidas,
+    con memory-mapping) o desde el CSV del formato anterior.
+    """
+    if os.path.isdir(ruta):
+        dataset = DatasetParticionado(ruta, CONFIG.get("particion_dataset", "Y"))
+        df = dataset.leer(columnas)
+    else:
+        buscadas = None if columnas is None else {c.lower() for c in columnas} | {"activo", "datetime"}
+        df = pd.read_csv(ruta, parse_dates=["Datetime"],
+                         usecols=None if buscadas is None else lambda col: col.lower() in buscadas)
+        df = df.set_index("Datetime")
     df.columns = [col.upper() for col in df.columns]
-    df.set_index("DATETIME", inplace=True)
+    df.index.name = "DATETIME"
     df.dropna(inplace=True)
-    return df
+    return df.sort_index(kind="stable")
+
+def pliegues_walk_forward(tiempos, fin_etiqueta, n_pliegues=5, min_entrenamiento=0.3):
+    """
+    Pliegues walk-forward sobre el eje temporal: cada pliegue entrena con todo lo
+    anterior a su bloque de prueba. Se purgan las filas cuya etiqueta depende de
+    velas (`fin_etiqueta`) que ya caen dentro de la prueba.
+    Devuelve una lista de (indices_entrenamiento, indices_prueba).
+    """
+    fechas = np.unique(tiempos)
+    inicio = int(len(fechas) * min_entrenamiento)
+    bordes = np.linspace(inicio, len(fechas), n_pliegues + 1).astype(int)
+    posicion = np.searchsorted(fechas, tiempos)
+
+    pliegues = []
+    for ini, fin in zip(bordes[:-1], bordes[1:]):
+        entrenamiento = np.flatnonzero((posicion < ini) & (fin_etiqueta < fechas[ini]))
+        prueba = np.flatnonzero((posicion >= ini) & (posicion < fin))
+        if len(entrenamiento) and len(prueba):
+            pliegues.append((entrenamiento, prueba))
+    return pliegues
 
-def entrenar_modelo(df):
-    """Entrena el modelo RandomForest con los datos disponibles"""
-    df = calcular_etiquetas(df)
+def entrenar_modelo(df, umbral=UMBRAL_RETORNO, ventana=VENTANA_RETARDO, n_jobs=-1, **parametros):
+    """
+    Valida el RandomForest sobre el último tramo temporal (con purga) y devuelve
+    el modelo reentrenado con todos los datos usando todos los núcleos.
+    """
+    df = calcular_etiquetas(df, umbral, ventana)
+    parametros = {**PARAMETROS_MODELO, **parametros}
 
-    # Usar las columnas disponibles en tu CSV como features
-    columnas_features = ["H-L", "O-C", "MA10", "MA50", "STDDEV"]
+    # Mismas features que calcula el bot en vivo (modelo_ml.CONSTRUCTORES_FEATURES)
+    columnas_features = FEATURES_MODELO
 
     X = df[columnas_features]
     y = df["Label"]
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, stratify=y, test_size=0.2, random_state=42)
+    entrenamiento, prueba = pliegues_walk_forward(
+        df.index.values, df["FIN_ETIQUETA"].values, n_pliegues=1, min_entrenamiento=0.8
+    )[0]
 
-    modelo = RandomForestClassifier(n_estimators=200, max_depth=6, class_weight="balanced", random_state=42)
-    modelo.fit(X_train, y_train)
+    modelo = RandomForestClassifier(class_weight="balanced", random_state=42, n_jobs=n_jobs, **parametros)
+    modelo.fit(X.iloc[entrenamiento], y.iloc[entrenamiento])
 
-    y_pred = modelo.predict(X_test)
-    print("\n====== CLASIFICACIÓN ======")
-    print(classification_report(y_test, y_pred))
+    y_pred = modelo.predict(X.iloc[prueba])
+    print("\n====== CLASIFICACIÓN (último 20% temporal) ======")
+    print(classification_report(y.iloc[prueba], y_pred))
 
+    modelo.fit(X, y)
     return modelo
 
+# ============================== BÚSQUEDA WALK-FORWARD ==============================
+
+# Matrices compartidas por los procesos del pool (se envían una vez por proceso)
+_X = None
+_ETIQUETAS = None
+_PLIEGUES = None
+_OPERACIONES = None
+
+def _inicializar_proceso(X, etiquetas, pliegues, operaciones):
+    global _X, _ETIQUETAS, _PLIEGUES, _OPERACIONES
+    _X, _ETIQUETAS, _PLIEGUES, _OPERACIONES = X, etiquetas, pliegues, operaciones
+
+def _evaluar_combinacion(combinacion):
+    """
+    Entrena y puntúa una combinación en todos sus pliegues (dentro de un proceso del
+    pool): clasificación y resultado de operar las predicciones BUY/SELL de la prueba.
+    """
+    clave = (combinacion["umbral"], combinacion["ventana"])
+    y = _ETIQUETAS[clave]
+    parametros = {k: v for k, v in combinacion.items() if k not in ("umbral", "ventana")}
+
+    compra, venta = _OPERACIONES
+    f1s, balanceadas, retornos = [], [], []
+    for entrenamiento, prueba in _PLIEGUES[combinacion["ventana"]]:
+        if len(np.unique(y[entrenamiento])) < 2 or not len(prueba):
+            continue
+        modelo = RandomForestClassifier(class_weight="balanced", random_state=42, n_jobs=1, **parametros)
+        modelo.fit(_X[entrenamiento], y[entrenamiento])
+        prediccion = modelo.predict(_X[prueba])
+        f1s.append(f1_score(y[prueba], prediccion, average="macro"))
+        balanceadas.append(balanced_accuracy_score(y[prueba], prediccion))
+        retorno = np.select([prediccion == "BUY", prediccion == "SELL"], [compra[prueba], venta[prueba]], np.nan)
+        retornos.append(retorno[~np.isnan(retorno)])
+
+    retornos = np.concatenate(retornos) if retornos else np.zeros(0)
+    ganancias, perdidas = retornos[retornos > 0].sum(), -retornos[retornos < 0].sum()
+    return {
+        **combinacion,
+        "pliegues": len(f1s),
+        "f1_macro": np.mean(f1s) if f1s else np.nan,
+        "f1_std": np.std(f1s) if f1s else np.nan,
+        "balanced_accuracy": np.mean(balanceadas) if balanceadas else np.nan,
+        "operaciones": len(retornos),
+        "retorno_total": retornos.sum() if len(retornos) else np.nan,
+        "profit_factor": (ganancias / perdidas if perdidas else np.inf) if len(retornos) else np.nan,
+    }
+
+def busqueda_walk_forward(df, grilla_modelo=GRILLA_MODELO, grilla_etiquetas=GRILLA_ETIQUETAS,
+                          n_pliegues=5, procesos=None, metrica=METRICA_ETIQUETADO):
+    """
+    Evalúa en paralelo (un proceso por combinación) la grilla de hiperparámetros del
+    bosque y de etiquetado con validación walk-forward purgada. Las features y las
+    etiquetas de cada (umbral, ventana) se calculan una sola vez y se comparten con
+    todos los pliegues.
+
+    El F1 solo compara bosques con las mismas etiquetas: dentro de cada etiquetado
+    se ordenan por F1 macro (`ranking_f1`) y los etiquetados, por la `metrica` de
+    trading de su mejor bosque en las pruebas (`ranking_etiquetado`). Devuelve la
+    tabla en ese orden; la primera fila es la configuración elegida.
+    """
+    futuros = {ventana: retorno_futuro(df, ventana) for ventana in grilla_etiquetas["ventana"]}
+    # Solo filas con etiqueta en todas las ventanas, para comparar sobre la misma muestra
+    validas = np.logical_and.reduce([~np.isnan(retorno) for retorno, _ in futuros.values()])
+    X = df[FEATURES_MODELO].to_numpy(dtype=np.float32)[validas]
+    operaciones = tuple(retorno[validas] for retorno in retorno_operaciones(df))
+    tiempos = df.index.values[validas]
+
+    etiquetas, pliegues = {}, {}
+    for ventana, (retorno, fin) in futuros.items():
+        retorno = retorno[validas]
+        pliegues[ventana] = pliegues_walk_forward(tiempos, fin[validas], n_pliegues)
+        for umbral in grilla_etiquetas["umbral"]:
+            etiquetas[(umbral, ventana)] = np.select([retorno > umbral, retorno < -umbral], ["BUY", "SELL"], default="HOLD")
+
+    claves = list(grilla_modelo) + ["umbral", "ventana"]
+    valores = list(grilla_modelo.values()) + [grilla_etiquetas["umbral"], grilla_etiquetas["ventana"]]
+    combinaciones = [dict(zip(claves, combo)) for combo in itertools.product(*valores)]
+
+    procesos = procesos or os.cpu_count()
+    print(f"🔎 Evaluando {len(combinaciones)} combinaciones x {n_pliegues} pliegues en {procesos} procesos...")
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso,
+                             initargs=(X, etiquetas, pliegues, operaciones)) as pool:
+        resultados = list(pool.map(_evaluar_combinacion, combinaciones, chunksize=1))
+
+    tabla = pd.DataFrame(resultados)
+    etiquetado = ["umbral", "ventana"]
+    tabla["ranking_f1"] = (tabla.groupby(etiquetado)["f1_macro"]
+                           .rank(ascending=False, method="first", na_option="bottom").astype(int))
+    orden = (tabla[tabla["ranking_f1"] == 1].sort_values(metrica, ascending=False, na_position="last")[etiquetado]
+             .assign(ranking_etiquetado=lambda t: np.arange(1, len(t) + 1)))
+    tabla = tabla.merge(orden, on=etiquetado).sort_values(["ranking_etiquetado", "ranking_f1"], ignore_index=True)
+    tabla.index = tabla.index + 1
+    tabla.index.name = "ranking"
+    return tabla
+
 # ============================== FLUJO PRINCIPAL ==============================
 
+def guardar(modelo, umbral=UMBRAL_RETORNO, ventana=VENTANA_RETARDO):
+    version = guardar_modelo(modelo, FEATURES_MODELO, RUTA_SALIDA_MODELO)
+    print(f"\n✅ Modelo guardado en: {RUTA_SALIDA_MODELO} (versión {version}, umbral={umbral}, ventana={ventana})")
+    exportar_compacto(modelo, FEATURES_MODELO, RUTA_SALIDA_COMPACTO, version)
+    print(f"✅ Modelo compacto exportado en: {RUTA_SALIDA_COMPACTO}/")
+
 def main():
-    csv_path = "datasets/dataset_entrenamiento_pro.csv"  # Asegúrate de que exista
-    df = cargar_dataset(csv_path)
-    modelo = entrenar_modelo(df)
-    joblib.dump(modelo, RUTA_SALIDA_MODELO)
-    print(f"\n✅ Modelo guardado en: {RUTA_SALIDA_MODELO}")
+    parser = argparse.ArgumentParser(description="Entrenamiento del modelo RandomForest")
+    parser.add_argument("--dataset", default=None, help="Directorio particionado o CSV (por defecto el particionado si existe)")
+    parser.add_argument("--buscar", action="store_true", help="Búsqueda walk-forward de hiperparámetros")
+    parser.add_argument("--pliegues", type=int, default=5)
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--metrica", choices=["profit_factor", "retorno_total"], default=METRICA_ETIQUETADO,
+                        help="Métrica de trading con la que se elige el etiquetado")
+    args = parser.parse_args()
+
+    ruta = args.dataset or (CONFIG.get("dataset_dir") if os.path.isdir(CONFIG.get("dataset_dir", "")) else RUTA_CSV)
+    df = cargar_dataset(ruta, COLUMNAS_ENTRENAMIENTO)
+
+    if not args.buscar:
+        guardar(entrenar_modelo(df))
+        return
+
+    tabla = busqueda_walk_forward(df, n_pliegues=args.pliegues, procesos=args.procesos, metrica=args.metrica)
+    tabla.to_csv(RUTA_RESULTADOS_BUSQUEDA)
+    print("\n====== RANKING WALK-FORWARD ======")
+    print(tabla.head(15).to_string())
+    print(f"\n✅ Resultados completos en: {RUTA_RESULTADOS_BUSQUEDA}")
+
+    mejor = tabla.iloc[0]
+    parametros = {k: int(mejor[k]) for k in GRILLA_MODELO}
+    umbral, ventana = float(mejor["umbral"]), int(mejor["ventana"])
+    print(f"🏆 Etiquetado umbral={umbral}, ventana={ventana} ({args.metrica}={mejor[args.metrica]:.3f}), "
+          f"bosque de mayor F1: {parametros}")
+    guardar(entrenar_modelo(df, umbral, ventana, **parametros), umbral, ventana)
 
 if __name__ == "__main__":
     main()
-
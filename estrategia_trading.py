@@ -1,118 +1,224 @@
 from datetime import datetime
-import pandas as pd
-import numpy as np
 import logging
+import threading
+import numpy as np
+from rangos_sesion import IndiceSesiones
+from modelo_ml import ModeloML, FEATURES_MODELO, calcular_features, confianza_lote
+from indicadores_tecnicos import calcular_ema
+from motor_estrategias import Estrategia, MotorEstrategias, registrar_estrategia
+from config_activos import CONFIG
 
 logger = logging.getLogger(__name__)
 
-def evaluar_estrategia(nombre, df, modelo, umbral_confianza):
+# Bandas de RSI por dirección y múltiplos de ATR para stop loss / take profit
+RSI_COMPRA = (40, 70)
+RSI_VENTA = (30, 60)
+MULT_SL = 1.5
+MULT_TP = 2
+
+@registrar_estrategia
+class RompimientoML(Estrategia):
+    """
+    Estrategia original: rompimiento del rango de alguna sesión, confianza del modelo
+    sobre el umbral y EMA rápida/lenta más banda de RSI en la dirección de la entrada,
+    confirmada por las temporalidades mayores si las hay.
+    """
+    nombre = "rompimiento_ml"
+    requiere = ("precio", "atr", "ema_rapida", "ema_lenta", "rsi", "rompe", "confianza",
+                "confirma_compra", "confirma_venta")
+
+    def __init__(self, umbral_confianza=None, rsi_compra=RSI_COMPRA, rsi_venta=RSI_VENTA,
+                 mult_sl=MULT_SL, mult_tp=MULT_TP):
+        self.umbral_confianza = CONFIG["umbral_confianza"] if umbral_confianza is None else umbral_confianza
+        self.rsi_compra, self.rsi_venta = tuple(rsi_compra), tuple(rsi_venta)
+        self.mult_sl, self.mult_tp = mult_sl, mult_tp
+
+    def _entradas(self, f):
+        ema_r, ema_l, rsi = f["ema_rapida"], f["ema_lenta"], f["rsi"]
+        compra = f["rompe"] & (ema_r > ema_l) & (self.rsi_compra[0] < rsi) & (rsi < self.rsi_compra[1])
+        venta = f["rompe"] & (ema_r < ema_l) & (self.rsi_venta[0] < rsi) & (rsi < self.rsi_venta[1])
+        return compra, venta
+
+    def candidatas(self, f):
+        compra, venta = self._entradas(f)
+        return compra | venta
+
+    def reglas(self, f):
+        compra, venta = self._entradas(f)
+        confiable = f["confianza"] >= self.umbral_confianza
+        return compra & confiable & f["confirma_compra"], venta & confiable & f["confirma_venta"]
+
+_motor = None
+_lock_motor = threading.Lock()
+
+def obtener_motor():
+    """Motor con las estrategias de CONFIG['estrategias'], compartido por el proceso."""
+    global _motor
+    with _lock_motor:
+        if _motor is None:
+            _motor = MotorEstrategias(CONFIG.get("estrategias", ["rompimiento_ml"]))
+            logger.info(f"🧩 Estrategias activas: {', '.join(e.nombre for e in _motor.estrategias)}")
+        return _motor
+
+def tendencias_superiores(temporalidades):
+    """
+    Dirección de cada temporalidad de confirmación ({intervalo: DataFrame de velas
+    cerradas}): 1 si la EMA rápida está sobre la lenta en la última vela, -1 si está
+    debajo y 0 si no hay velas suficientes.
+    """
+    tendencias = {}
+    for intervalo, df in temporalidades.items():
+        if df is None or len(df) < 50:
+            tendencias[intervalo] = 0
+            continue
+        rapida = calcular_ema(df["close"], 25).iloc[-1]
+        lenta = calcular_ema(df["close"], 50).iloc[-1]
+        tendencias[intervalo] = 1 if rapida > lenta else -1 if rapida < lenta else 0
+    return tendencias
+
+def preseleccionar(nombre, df, indice_sesiones=None, features=FEATURES_MODELO, temporalidades=None,
+                   exigir_rompimiento=True):
+    """
+    Primera fase de la evaluación de la última vela de `df`: filtro de rompimiento
+    de rango. Devuelve el candidato (con su vector de features para el modelo) o
+    None. `indice_sesiones` es el índice de rangos por sesión del activo, mantenido
+    por el llamador entre ciclos; si no se pasa, se construye a partir de `df`.
+    `temporalidades` ({intervalo: DataFrame}) son las temporalidades mayores cuya
+    tendencia debe confirmar la señal. Sin `exigir_rompimiento` (alguna estrategia
+    no lo usa) el candidato pasa aunque no rompa rango.
+    """
     if df is None or len(df) < 50:
-        return []
+        return None
 
-    df = df.copy()
     ultima = df.iloc[-1]
-
     precio = ultima['close']
-    atr = ultima['atr']
-    ema_rapida = ultima['ema_rapida']
-    ema_lenta = ultima['ema_lenta']
-    rsi = ultima['rsi']
-
-    rompimientos = []
-    df['hora'] = df.index.hour
-
-    asiatico = df.between_time('00:00', '06:00')
-    if not asiatico.empty and (precio > asiatico['high'].max() or precio < asiatico['low'].min()):
-        rompimientos.append("Asiático")
 
-    londres = df.between_time('06:00', '12:00')
-    if not londres.empty and (precio > londres['high'].max() or precio < londres['low'].min()):
-        rompimientos.append("Londres")
+    if indice_sesiones is None:
+        indice_sesiones = IndiceSesiones.desde_df(df)
+    rompimientos = indice_sesiones.rompimientos(precio)
 
-    nyse = df.between_time('13:00', '20:00')
-    if not nyse.empty and (precio > nyse['high'].max() or precio < nyse['low'].min()):
-        rompimientos.append("EE.UU.")
-
-    if not rompimientos:
+    if not rompimientos and exigir_rompimiento:
         logger.info(f"⛔ No hubo rompimiento de rango en {nombre}, se descarta evaluación.")
+        return None
+
+    return {
+        "activo": nombre,
+        "fecha_vela": df.index[-1],
+        "precio": precio,
+        "atr": ultima['atr'],
+        "ema_rapida": ultima['ema_rapida'],
+        "ema_lenta": ultima['ema_lenta'],
+        "rsi": ultima['rsi'],
+        "rompimientos": rompimientos,
+        "tendencias": tendencias_superiores(temporalidades) if temporalidades else {},
+        # 60 velas alcanzan para las ventanas móviles más largas (MA50)
+        "features": calcular_features(df.iloc[-60:], features).iloc[-1],
+    }
+
+def evaluar_estrategia(nombre, df, modelo, umbral_confianza=None, indice_sesiones=None, motor=None):
+    """
+    Evalúa un activo de punta a punta (preselección, modelo y señales) con `motor`
+    o, por defecto, con las estrategias de CONFIG; un `umbral_confianza` explícito
+    evalúa solo la estrategia de rompimiento + ML con ese umbral.
+    """
+    if motor is None:
+        motor = obtener_motor() if umbral_confianza is None else MotorEstrategias([RompimientoML(umbral_confianza)])
+    features = modelo.features if isinstance(modelo, ModeloML) else FEATURES_MODELO
+    candidato = preseleccionar(nombre, df, indice_sesiones, features,
+                               exigir_rompimiento=motor.todas_requieren("rompe"))
+    if candidato is None:
         return []
 
     confianza = 0.0
-    if modelo:
-        entrada_ml = pd.DataFrame([{
-            "ATR": atr,
-            "EMA_Rapida": ema_rapida,
-            "EMA_Lenta": ema_lenta,
-            "RSI": rsi
-        }])
-
+    if modelo and motor.requiere("confianza"):
         try:
-            proba = modelo.predict_proba(entrada_ml)[0]
-            if "GANANCIA" in modelo.classes_:
-                clase_idx = list(modelo.classes_).index("GANANCIA")
-                confianza = proba[clase_idx]
-            else:
-                confianza = np.max(proba)
+            confianza = confianza_lote(modelo, {nombre: candidato["features"]})[nombre]
         except Exception as e:
             logger.error(f"❌ Error en modelo ML para {nombre}: {str(e)}")
             confianza = 0.0
 
-    logger.info(f"📊 Evaluación ML para {nombre}: Precio={precio:.5f}, ATR={atr:.5f}, RSI={rsi:.2f}, "
-                f"EMA_Rápida={ema_rapida:.5f}, EMA_Lenta={ema_lenta:.5f}, "
-                f"Rangos rotos={rompimientos}, Confianza={confianza:.2%}")
-
-    if confianza < umbral_confianza:
-        logger.info(f"❌ Confianza insuficiente para {nombre}: {confianza:.2%} < {umbral_confianza:.2%}")
+    return senales_candidatos([candidato], {nombre: confianza}, motor)
+
+def _confirma(tendencias, esperada):
+    """True si todas las temporalidades de confirmación acompañan a la dirección `esperada`."""
+    return all(tendencia == esperada for tendencia in tendencias.values())
+
+def features_candidatos(candidatos, confianzas):
+    """Features del motor en la última vela de cada candidato (una fila por candidato)."""
+    f = {
+        col: np.array([c[col] for c in candidatos], dtype=float)
+        for col in ("precio", "atr", "ema_rapida", "ema_lenta", "rsi")
+    }
+    f["rompe"] = np.array([bool(c["rompimientos"]) for c in candidatos])
+    f["confianza"] = np.array([confianzas.get(c["activo"], 0.0) for c in candidatos], dtype=float)
+    f["confirma_compra"] = np.array([_confirma(c.get("tendencias") or {}, 1) for c in candidatos])
+    f["confirma_venta"] = np.array([_confirma(c.get("tendencias") or {}, -1) for c in candidatos])
+    return f
+
+def senales_candidatos(candidatos, confianzas, motor=None):
+    """
+    Última fase: evalúa todas las estrategias del motor de una vez sobre los
+    candidatos ya puntuados ({activo: confianza}). Si varias estrategias coinciden
+    en activo y dirección se emite una sola señal, la de la primera estrategia.
+    """
+    if not candidatos:
         return []
+    motor = motor or obtener_motor()
+    f = features_candidatos(candidatos, confianzas)
+    varias = len(motor.estrategias) > 1
+
+    por_candidato = [[] for _ in candidatos]
+    for estrategia, direccion, filas, stops, targets in motor.evaluar(f):
+        tipo = "BUY" if direccion == 1 else "SELL"
+        for fila, sl, tp in zip(filas, stops, targets):
+            if any(s["tipo"] == tipo for s in por_candidato[fila]):
+                continue
+            candidato = candidatos[fila]
+            confianza = f["confianza"][fila]
+            tendencias = candidato.get("tendencias") or {}
+            mensaje = formatear_mensaje(
+                candidato["activo"], tipo, candidato["precio"], sl, tp,
+                candidato["atr"], candidato["ema_rapida"], candidato["ema_lenta"], candidato["rsi"],
+                confianza, candidato["rompimientos"], tendencias, estrategia.nombre if varias else None
+            )
+            por_candidato[fila].append({
+                "activo": candidato["activo"],
+                "tipo": tipo,
+                "precio": candidato["precio"],
+                "sl": sl,
+                "tp": tp,
+                "confianza": confianza,
+                "rangos": candidato["rompimientos"],
+                "estrategia": estrategia.nombre,
+                "fecha_vela": candidato.get("fecha_vela"),
+                "features": candidato.get("features"),
+                "mensaje": mensaje,
+                "fecha": datetime.now()
+            })
 
     señales = []
-
-    if ema_rapida > ema_lenta and 40 < rsi < 70:
-        sl = precio - atr * 1.5
-        tp = precio + atr * 2
-        mensaje = formatear_mensaje(
-            nombre, "BUY", precio, sl, tp,
-            atr, ema_rapida, ema_lenta, rsi, confianza, rompimientos
-        )
-        señales.append({
-            "activo": nombre,
-            "tipo": "BUY",
-            "precio": precio,
-            "sl": sl,
-            "tp": tp,
-            "mensaje": mensaje,
-            "fecha": datetime.now()
-        })
-
-    if ema_rapida < ema_lenta and 30 < rsi < 60:
-        sl = precio + atr * 1.5
-        tp = precio - atr * 2
-        mensaje = formatear_mensaje(
-            nombre, "SELL", precio, sl, tp,
-            atr, ema_rapida, ema_lenta, rsi, confianza, rompimientos
-        )
-        señales.append({
-            "activo": nombre,
-            "tipo": "SELL",
-            "precio": precio,
-            "sl": sl,
-            "tp": tp,
-            "mensaje": mensaje,
-            "fecha": datetime.now()
-        })
-
-    if señales:
-        logger.info(f"✅ Señales generadas para {nombre}: {[s['tipo'] for s in señales]}")
-    else:
-        logger.info(f"ℹ️ No se generaron señales para {nombre} a pesar de romper rango y superar confianza")
-
-    # Guardar CSV de depuración
-    # pd.DataFrame([entrada_ml.assign(confianza=confianza)]).to_csv(f"debug_resultado_{nombre}.csv", index=False)
-
+    for candidato, propias in zip(candidatos, por_candidato):
+        nombre = candidato["activo"]
+        logger.info(f"📊 Evaluación ML para {nombre}: Precio={candidato['precio']:.5f}, ATR={candidato['atr']:.5f}, "
+                    f"RSI={candidato['rsi']:.2f}, EMA_Rápida={candidato['ema_rapida']:.5f}, "
+                    f"EMA_Lenta={candidato['ema_lenta']:.5f}, Rangos rotos={candidato['rompimientos']}, "
+                    f"Confianza={confianzas.get(nombre, 0.0):.2%}")
+        if propias:
+            logger.info(f"✅ Señales generadas para {nombre}: {[(s['tipo'], s['estrategia']) for s in propias]}")
+        else:
+            logger.info(f"ℹ️ Ninguna estrategia generó señales para {nombre}")
+        señales.extend(propias)
     return señales
 
+def generar_senales(candidato, confianza, umbral_confianza):
+    """Última fase para un solo candidato con la estrategia de rompimiento + ML y `umbral_confianza`."""
+    motor = MotorEstrategias([RompimientoML(umbral_confianza)])
+    return senales_candidatos([candidato], {candidato["activo"]: confianza}, motor)
+
 def formatear_mensaje(activo, direccion, precio, stop, target,
-                      atr, ema_r, ema_l, rsi, confianza, rangos):
+                      atr, ema_r, ema_l, rsi, confianza, rangos, tendencias=None, estrategia=None):
+    confirmacion = f"• Confirmada en: {', '.join(tendencias)}\n" if tendencias else ""
+    confirmacion += f"• Estrategia: {estrategia}\n" if estrategia else ""
     return f"""
 🔔 *SEÑAL DE TRADING ({direccion})* - {datetime.now().strftime('%Y-%m-%d %H:%M')}
 • Activo: {activo}
@@ -125,4 +231,4 @@ def formatear_mensaje(activo, direccion, precio, stop, target,
 • RSI: {rsi:.2f}
 • Confianza ML: {confianza:.2%}
 • Rango roto: {', '.join(rangos)}
-"""
+{confirmacion}"""
@@ -1,36 +1,112 @@
+# generar_dataset_pro.py
 
-# generar_dataset_pro.py con Alpaca
-
-import os
-import pandas as pd
-from indicadores_tecnicos import calcular_indicadores
-from data_providers import obtener_datos
+import time
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from indicadores_tecnicos import calcular_indicadores_lote, COLUMNAS_INDICADORES
+from data_providers import obtener_datos_lote
+from dataset_particionado import DatasetParticionado
+from modelo_ml import FEATURES_MODELO, calcular_features
 from config_activos import CONFIG
 
-os.makedirs("datasets", exist_ok=True)
-dataset_final = []
-
-for nombre, ticker in CONFIG["activos"].items():
-    print(f"📥 Descargando {nombre} ({ticker})...")
-    df = obtener_datos(ticker, CONFIG["intervalo"], CONFIG["periodo"])
-
-    if df is None or len(df) < 100:
-        print(f"⚠️ Datos insuficientes para {nombre}")
-        continue
-
-    df = calcular_indicadores(df)
-    df.dropna(inplace=True)
-    if df.empty:
-        continue
-
-    df['Activo'] = nombre
-    df['Datetime'] = df.index
-    dataset_final.append(df)
-
-# Concatenar y guardar
-if dataset_final:
-    dataset = pd.concat(dataset_final)
-    dataset.to_csv("datasets/dataset_entrenamiento_pro.csv", index=False)
-    print(f"✅ Dataset guardado: datasets/dataset_entrenamiento_pro.csv (filas: {len(dataset)})")
-else:
-    print("❌ No se pudo generar el dataset. Verifica tus claves o tickers.")
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
+
+MIN_VELAS = 100
+
+# Precios y features en float32: los árboles de scikit-learn evalúan en float32
+TIPOS_COLUMNAS = {
+    **{col: "float32" for col in ["open", "high", "low", "close"]},
+    **{col: "float32" for col in COLUMNAS_INDICADORES},
+    **{col: "float32" for col in FEATURES_MODELO},
+}
+
+def preparar_lote(descargados):
+    """Indicadores (kernel multi-activo) y features del modelo de un lote de activos."""
+    validos = {}
+    for nombre, df in descargados.items():
+        if df is None or len(df) < MIN_VELAS:
+            logger.warning(f"⚠️ Datos insuficientes para {nombre}")
+            continue
+        validos[nombre] = df
+
+    preparados = {}
+    for nombre, df in calcular_indicadores_lote(validos).items():
+        df = df.join(calcular_features(df, FEATURES_MODELO))
+        df = df[list(TIPOS_COLUMNAS)].dropna()
+        if not df.empty:
+            preparados[nombre] = df
+    return preparados
+
+def construir_dataset(dataset, activos, intervalo, periodo, reconstruir=False, workers=None):
+    """
+    Descarga los activos por lotes en paralelo (el limitador de la API reparte el
+    presupuesto entre hilos) y escribe cada lote en cuanto llega. Sin `reconstruir`
+    solo se agregan las velas desde la última guardada de cada activo (inclusive,
+    por si fue revisada). Devuelve {activo: velas escritas}.
+    """
+    if reconstruir:
+        dataset.eliminar()
+
+    tamano = max(CONFIG.get("tamano_lote", 8), 1)
+    workers = workers or CONFIG.get("workers_red", 4)
+    items = list(activos.items())
+    lotes = [dict(items[i:i + tamano]) for i in range(0, len(items), tamano)]
+    escritas = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futuros = {
+            pool.submit(obtener_datos_lote, list(lote.values()), intervalo, periodo): lote
+            for lote in lotes
+        }
+        for futuro in as_completed(futuros):
+            lote = futuros[futuro]
+            try:
+                datos = futuro.result()
+            except Exception as e:
+                logger.error(f"❌ Error descargando {', '.join(lote)}: {e}")
+                continue
+
+            for nombre, df in preparar_lote({n: datos.get(t) for n, t in lote.items()}).items():
+                ultima = dataset.ultima_fecha(nombre)
+                if ultima is not None:
+                    df = df[df.index >= ultima]
+                escritas[nombre] = dataset.escribir(nombre, df, TIPOS_COLUMNAS)
+                logger.info(f"💾 {nombre}: {escritas[nombre]} velas escritas")
+    return escritas
+
+def exportar_csv(dataset, ruta):
+    """Exporta el dataset al CSV monolítico del formato anterior."""
+    df = dataset.leer()
+    df = df.rename(columns={c: c.upper() for c in ["open", "high", "low", "close"]})
+    df["Datetime"] = df.index
+    df.to_csv(ruta, index=False)
+    return len(df)
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera el dataset de entrenamiento particionado")
+    parser.add_argument("--salida", default=CONFIG.get("dataset_dir", "datasets/particionado"))
+    parser.add_argument("--reconstruir", action="store_true", help="Descartar lo guardado y descargar todo")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--csv", default=None, help="Exportar también a CSV (formato anterior)")
+    args = parser.parse_args()
+
+    dataset = DatasetParticionado(args.salida, CONFIG.get("particion_dataset", "Y"))
+    inicio = time.perf_counter()
+    escritas = construir_dataset(
+        dataset, CONFIG["activos"], CONFIG["intervalo"], CONFIG["periodo"], args.reconstruir, args.workers
+    )
+    duracion = time.perf_counter() - inicio
+
+    if not escritas:
+        print("❌ No se pudo generar el dataset. Verifica tus claves o tickers.")
+        return
+
+    print(f"✅ Dataset actualizado en {args.salida}/ ({sum(escritas.values())} velas, "
+          f"{len(escritas)} activos, {duracion:.1f}s)")
+    if args.csv:
+        print(f"✅ CSV exportado: {args.csv} (filas: {exportar_csv(dataset, args.csv)})")
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 def calcular_ema(series, periodo):
@@ -38,3 +39,456 @@ def calcular_indicadores(df):
     df['atr'] = calcular_atr(df, 14)
     
     return df
+
+
+# ============== Motor incremental ==============
+
+def _alpha(span=None, alpha=None):
+    # Misma conversión que pandas para que los resultados coincidan bit a bit
+    com = (span - 1) / 2.0 if span is not None else 1.0 / alpha - 1.0
+    return 1.0 / (1.0 + com)
+
+class _EMA:
+    """Réplica en O(1) de `Series.ewm(adjust=False).mean()`."""
+    __slots__ = ("alpha", "valor", "peso")
+
+    def __init__(self, alpha, valor=None, peso=1.0):
+        self.alpha = alpha
+        self.valor = valor
+        self.peso = peso
+
+    def actualizar(self, x):
+        if self.valor is None or self.valor != self.valor:
+            if x == x:
+                self.valor = x
+                self.peso = 1.0
+            return self.valor
+        self.peso *= 1.0 - self.alpha
+        if x == x:
+            if self.valor != x:
+                self.valor = (self.peso * self.valor + self.alpha * x) / (self.peso + self.alpha)
+            self.peso = 1.0
+        return self.valor
+
+class IndicadoresIncrementales:
+    """
+    Estado de EMA rápida/lenta, RSI y ATR de un activo que se actualiza en O(1)
+    por vela y produce los mismos valores que `calcular_indicadores`.
+    La última vela puede reemplazarse (vela en curso revisada por el proveedor).
+    """
+
+    def __init__(self, periodo_rapida=25, periodo_lenta=50, periodo_rsi=14, periodo_atr=14):
+        self.periodos = (periodo_rapida, periodo_lenta, periodo_rsi, periodo_atr)
+        self.ema_rapida = _EMA(_alpha(span=periodo_rapida))
+        self.ema_lenta = _EMA(_alpha(span=periodo_lenta))
+        self.ganancia = _EMA(_alpha(alpha=1 / periodo_rsi))
+        self.perdida = _EMA(_alpha(alpha=1 / periodo_rsi))
+        self.atr = _EMA(_alpha(span=periodo_atr))
+        self.cierre_previo = None
+        self.ultima_fecha = None
+        self.valores = {}
+        self._previo = None
+
+    def _estado(self):
+        emas = [self.ema_rapida, self.ema_lenta, self.ganancia, self.perdida, self.atr]
+        return [[e.valor, e.peso] for e in emas], self.cierre_previo, self.ultima_fecha, dict(self.valores)
+
+    def _restaurar(self, estado):
+        emas, self.cierre_previo, self.ultima_fecha, self.valores = estado
+        for e, (valor, peso) in zip([self.ema_rapida, self.ema_lenta, self.ganancia, self.perdida, self.atr], emas):
+            e.valor, e.peso = valor, peso
+
+    def actualizar(self, fecha, high, low, close):
+        """Incorpora una vela. Si `fecha` es la de la última vela, la reemplaza."""
+        fecha = pd.Timestamp(fecha)
+        if self.ultima_fecha is not None and fecha == self.ultima_fecha and self._previo is not None:
+            self._restaurar(self._previo)
+        elif self.ultima_fecha is not None and fecha < self.ultima_fecha:
+            raise ValueError(f"Vela anterior a la última procesada: {fecha} < {self.ultima_fecha}")
+        self._previo = self._estado()
+
+        previo = self.cierre_previo
+        if previo is None:
+            delta = float("nan")
+            tr = high - low
+        else:
+            delta = close - previo
+            tr = max(high - low, abs(high - previo), abs(low - previo))
+
+        self.ema_rapida.actualizar(close)
+        self.ema_lenta.actualizar(close)
+        ganancia = self.ganancia.actualizar(delta if delta > 0 else 0.0)
+        perdida = self.perdida.actualizar(-(delta if delta < 0 else 0.0))
+        self.atr.actualizar(tr)
+
+        if perdida == 0:
+            rsi = float("nan") if ganancia == 0 else 100.0
+        else:
+            rsi = 100 - (100 / (1 + ganancia / perdida))
+
+        self.cierre_previo = close
+        self.ultima_fecha = fecha
+        self.valores = {
+            "ema_rapida": self.ema_rapida.valor,
+            "ema_lenta": self.ema_lenta.valor,
+            "rsi": rsi,
+            "atr": self.atr.valor,
+        }
+        return self.valores
+
+    def actualizar_df(self, df):
+        """Procesa solo las velas de `df` desde la última fecha conocida (inclusive)."""
+        df = df.rename(columns=str.lower)
+        if self.ultima_fecha is not None:
+            df = df[df.index >= self.ultima_fecha]
+        for fecha, high, low, close in zip(df.index, df["high"].to_numpy(float),
+                                           df["low"].to_numpy(float), df["close"].to_numpy(float)):
+            self.actualizar(fecha, high, low, close)
+        return self.valores
+
+    @classmethod
+    def desde_historia(cls, df, **periodos):
+        estado = cls(**periodos)
+        estado.actualizar_df(df)
+        return estado
+
+    def a_dict(self):
+        """Estado serializable en JSON para sobrevivir reinicios."""
+        emas, cierre, fecha, valores = self._estado()
+        return {
+            "periodos": list(self.periodos),
+            "emas": emas,
+            "cierre_previo": cierre,
+            "ultima_fecha": fecha.isoformat() if fecha is not None else None,
+            "valores": valores,
+            "previo": None if self._previo is None else [
+                self._previo[0], self._previo[1],
+                self._previo[2].isoformat() if self._previo[2] is not None else None,
+                self._previo[3],
+            ],
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        estado = cls(*datos["periodos"])
+        fecha = pd.Timestamp(datos["ultima_fecha"]) if datos["ultima_fecha"] else None
+        estado._restaurar((datos["emas"], datos["cierre_previo"], fecha, datos["valores"]))
+        if datos.get("previo"):
+            emas, cierre, fecha_previa, valores = datos["previo"]
+            estado._previo = (emas, cierre, pd.Timestamp(fecha_previa) if fecha_previa else None, valores)
+        return estado
+
+    @classmethod
+    def desde_columnas(cls, fechas, close, columnas):
+        """
+        Estado tras la última vela a partir de los indicadores ya calculados de toda la
+        historia (`calcular_indicadores_panel` con `medias`), sin volver a recorrerla.
+        Requiere dos velas o más, sin NaN en las dos últimas.
+        """
+        estado = cls()
+        emas = ("ema_rapida", "ema_lenta", "ganancia_media", "perdida_media", "atr")
+
+        def en(j):
+            return ([[float(columnas[col][j]), 1.0] for col in emas], float(close[j]), pd.Timestamp(fechas[j]),
+                    {col: float(columnas[col][j]) for col in ("ema_rapida", "ema_lenta", "rsi", "atr")})
+
+        estado._restaurar(en(-1))
+        estado._previo = en(-2)
+        return estado
+
+
+# ============== Kernel vectorizado multi-activo ==============
+
+COLUMNAS_INDICADORES = ["ema_rapida", "ema_lenta", "rsi", "atr"]
+
+def construir_panel(dfs, columnas=("open", "high", "low", "close")):
+    """
+    Alinea varios DataFrames en arrays (activos x velas). Cada activo conserva su
+    propia secuencia de velas alineada a la derecha y se rellena con NaN al inicio,
+    de modo que el resultado por activo es idéntico al de `calcular_indicadores`.
+    """
+    nombres = list(dfs)
+    largo = max((len(df) for df in dfs.values()), default=0)
+    panel = {col: np.full((len(nombres), largo), np.nan) for col in columnas}
+    for i, nombre in enumerate(nombres):
+        df = dfs[nombre]
+        for col in columnas:
+            serie = df[col] if col in df.columns else df[col.upper()]
+            panel[col][i, largo - len(df):] = serie.to_numpy(dtype=float)
+    return nombres, panel
+
+def _ema_filas(x, alphas, out):
+    """
+    EMA (adjust=False) sobre cada fila de `x` (filas x tiempo) con su propio alpha,
+    avanzando en el tiempo y vectorizando sobre las filas con buffers reutilizados.
+    """
+    filas, largo = x.shape
+    factores = 1.0 - alphas
+    valor = np.full(filas, np.nan)
+    peso = np.ones(filas)
+    tmp = np.empty(filas)
+    tmp2 = np.empty(filas)
+    iniciado = np.empty(filas, dtype=bool)
+    observado = np.empty(filas, dtype=bool)
+    cambia = np.empty(filas, dtype=bool)
+
+    for t in range(largo):
+        xt = x[:, t]
+        np.equal(valor, valor, out=iniciado)
+        np.equal(xt, xt, out=observado)
+        np.multiply(peso, factores, out=peso, where=iniciado)
+        np.multiply(peso, valor, out=tmp)
+        np.multiply(alphas, xt, out=tmp2)
+        tmp += tmp2
+        np.add(peso, alphas, out=tmp2)
+        tmp /= tmp2
+        np.not_equal(valor, xt, out=cambia)
+        cambia &= iniciado
+        cambia &= observado
+        np.copyto(valor, tmp, where=cambia)
+        np.invert(iniciado, out=iniciado)
+        iniciado &= observado
+        np.copyto(valor, xt, where=iniciado)
+        np.copyto(peso, 1.0, where=observado)
+        out[:, t] = valor
+    return out
+
+def calcular_indicadores_panel(high, low, close, periodo_rapida=25, periodo_lenta=50,
+                               periodo_rsi=14, periodo_atr=14, bloque=256, medias=False):
+    """
+    Calcula EMA rápida/lenta, RSI, ATR y true range para todos los activos de un
+    panel (arrays activos x velas) en una sola pasada temporal. Devuelve un dict
+    con las mismas columnas que `calcular_indicadores` más 'tr' y, con `medias`,
+    las medias de ganancias y pérdidas del RSI ('ganancia_media', 'perdida_media').
+    """
+    activos, largo = close.shape
+    salida = {col: np.empty((activos, largo))
+              for col in COLUMNAS_INDICADORES + ["tr"] + (["ganancia_media", "perdida_media"] if medias else [])}
+    alphas_base = np.array([
+        _alpha(span=periodo_rapida), _alpha(span=periodo_lenta),
+        _alpha(alpha=1 / periodo_rsi), _alpha(alpha=1 / periodo_rsi), _alpha(span=periodo_atr),
+    ])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for ini in range(0, activos, bloque):
+            fin = min(ini + bloque, activos)
+            n = fin - ini
+            h, l, c = high[ini:fin], low[ini:fin], close[ini:fin]
+
+            # Entradas de las 5 EMAs apiladas: cierre, cierre, ganancia, pérdida, TR
+            entradas = np.empty((5 * n, largo))
+            entradas[0:n] = c
+            entradas[n:2 * n] = c
+
+            delta = entradas[2 * n:3 * n]
+            delta[:, 0] = np.nan
+            np.subtract(c[:, 1:], c[:, :-1], out=delta[:, 1:])
+            perdida = entradas[3 * n:4 * n]
+            np.minimum(delta, 0.0, out=perdida)
+            np.copyto(perdida, 0.0, where=np.isnan(delta))
+            np.negative(perdida, out=perdida)
+            np.maximum(delta, 0.0, out=delta)
+            np.copyto(delta, 0.0, where=np.isnan(delta))
+            np.copyto(delta, np.nan, where=np.isnan(c))
+            np.copyto(perdida, np.nan, where=np.isnan(c))
+
+            tr = salida["tr"][ini:fin]
+            np.subtract(h, l, out=tr)
+            previo = np.empty_like(c)
+            previo[:, 0] = np.nan
+            previo[:, 1:] = c[:, :-1]
+            aux = np.abs(h - previo)
+            np.fmax(tr, aux, out=tr)
+            np.subtract(l, previo, out=aux)
+            np.abs(aux, out=aux)
+            np.fmax(tr, aux, out=tr)
+            entradas[4 * n:] = tr
+
+            emas = _ema_filas(entradas, np.repeat(alphas_base, n), np.empty_like(entradas))
+
+            salida["ema_rapida"][ini:fin] = emas[0:n]
+            salida["ema_lenta"][ini:fin] = emas[n:2 * n]
+            salida["atr"][ini:fin] = emas[4 * n:]
+            if medias:
+                salida["ganancia_media"][ini:fin] = emas[2 * n:3 * n]
+                salida["perdida_media"][ini:fin] = emas[3 * n:4 * n]
+            rsi = salida["rsi"][ini:fin]
+            np.divide(emas[2 * n:3 * n], emas[3 * n:4 * n], out=rsi)
+            rsi += 1
+            np.divide(100, rsi, out=rsi)
+            np.subtract(100, rsi, out=rsi)
+
+    return salida
+
+def calcular_periodos_panel(close, periodos_ema=(), periodos_rsi=()):
+    """
+    EMA y RSI de varios períodos sobre un panel de cierres (activos x velas) en una
+    sola pasada temporal: cada período se calcula una vez aunque lo usen muchas
+    combinaciones. Devuelve {("ema", periodo) | ("rsi", periodo): array activos x velas}.
+    """
+    periodos_ema = list(dict.fromkeys(periodos_ema))
+    periodos_rsi = list(dict.fromkeys(periodos_rsi))
+    activos = close.shape[0]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delta = np.full_like(close, np.nan)
+        np.subtract(close[:, 1:], close[:, :-1], out=delta[:, 1:])
+        ganancia = np.where(delta > 0, delta, 0.0)
+        perdida = np.where(delta < 0, -delta, 0.0)
+        ganancia[np.isnan(close)] = np.nan
+        perdida[np.isnan(close)] = np.nan
+
+        entradas = np.concatenate([close] * len(periodos_ema) + [ganancia, perdida] * len(periodos_rsi))
+        alphas = np.concatenate(
+            [np.full(activos, _alpha(span=p)) for p in periodos_ema]
+            + [np.full(2 * activos, _alpha(alpha=1 / p)) for p in periodos_rsi]
+        )
+        emas = _ema_filas(entradas, alphas, np.empty_like(entradas))
+
+        salida = {}
+        for i, periodo in enumerate(periodos_ema):
+            salida[("ema", periodo)] = emas[i * activos:(i + 1) * activos]
+        base = len(periodos_ema) * activos
+        for j, periodo in enumerate(periodos_rsi):
+            fila = base + 2 * j * activos
+            rsi = emas[fila:fila + activos] / emas[fila + activos:fila + 2 * activos]
+            rsi += 1
+            np.divide(100, rsi, out=rsi)
+            np.subtract(100, rsi, out=rsi)
+            salida[("rsi", periodo)] = rsi
+    return salida
+
+def calcular_indicadores_lote(dfs):
+    """Versión multi-activo de `calcular_indicadores`: {nombre: df} -> {nombre: df con indicadores}."""
+    validos = {nombre: df for nombre, df in dfs.items() if df is not None and len(df)}
+    if not validos:
+        return dict(dfs)
+
+    for df in validos.values():
+        df.columns = [col.lower() for col in df.columns]
+
+    nombres, panel = construir_panel(validos, ("high", "low", "close"))
+    salida = calcular_indicadores_panel(panel["high"], panel["low"], panel["close"])
+
+    resultado = dict(dfs)
+    for i, nombre in enumerate(nombres):
+        df = validos[nombre]
+        for col in COLUMNAS_INDICADORES:
+            df[col] = salida[col][i, salida[col].shape[1] - len(df):]
+        resultado[nombre] = df
+    return resultado
+
+
+# ============== Indicadores persistentes por activo ==============
+
+class HistoriaIndicadores:
+    """
+    Indicadores por vela de la ventana de un activo junto con su estado incremental.
+    Si la ventana nueva continúa la ya calculada, solo se calculan sus velas nuevas
+    (y la última conocida, por si el proveedor la revisó) en O(1) por vela; los valores
+    son los de `calcular_indicadores` sobre toda la historia procesada desde el inicio.
+    """
+    __slots__ = ("estado", "ts", "valores")
+
+    def __init__(self, estado=None, ts=None, valores=None):
+        self.estado = estado
+        self.ts = np.empty(0, dtype=np.int64) if ts is None else ts
+        self.valores = np.empty((len(COLUMNAS_INDICADORES), 0)) if valores is None else valores
+
+    def _conocidas(self, fechas):
+        """Velas iniciales de `fechas` ya calculadas, o None si la ventana no continúa la historia."""
+        if self.estado is None or not len(self.ts) or not len(fechas):
+            return None
+        if self.estado.ultima_fecha != pd.Timestamp(self.ts[-1]):
+            return None
+        inicio = int(np.searchsorted(self.ts, fechas[0]))
+        conocidas = len(self.ts) - inicio
+        if not conocidas or conocidas > len(fechas) or not np.array_equal(self.ts[inicio:], fechas[:conocidas]):
+            return None
+        return conocidas
+
+    def continuar(self, fechas, high, low, close):
+        """
+        Incorpora la ventana `fechas` (int64, ns) si continúa la historia calculada.
+        Devuelve (indicadores 4 x n alineados con la ventana, True si cambiaron) o
+        None si hay que recalcularla entera (`reiniciar`).
+        """
+        conocidas = self._conocidas(fechas)
+        if conocidas is None:
+            return None
+        desde = conocidas - 1
+        nuevas = np.empty((len(COLUMNAS_INDICADORES), len(fechas) - desde))
+        for k, j in enumerate(range(desde, len(fechas))):
+            valores = self.estado.actualizar(pd.Timestamp(fechas[j]), high[j], low[j], close[j])
+            nuevas[:, k] = [valores[col] for col in COLUMNAS_INDICADORES]
+        cambio = nuevas.shape[1] > 1 or not np.array_equal(nuevas[:, 0], self.valores[:, -1], equal_nan=True)
+        valores = np.concatenate([self.valores[:, len(self.valores[0]) - conocidas:-1], nuevas], axis=1)
+        self.ts, self.valores = np.array(fechas, dtype=np.int64), valores
+        return valores, cambio
+
+    def reiniciar(self, fechas, high, low, close, columnas=None):
+        """
+        Rehace la historia con la ventana entera. `columnas` son sus indicadores ya
+        calculados (`calcular_indicadores_panel` con `medias`); si faltan, o hay NaN al
+        final, se calculan vela a vela.
+        """
+        ultimas = np.concatenate([high[-2:], low[-2:], close[-2:]])
+        if columnas is not None and len(fechas) >= 2 and not np.isnan(ultimas).any():
+            self.estado = IndicadoresIncrementales.desde_columnas(fechas, close, columnas)
+            valores = np.stack([columnas[col] for col in COLUMNAS_INDICADORES])
+        else:
+            self.estado = IndicadoresIncrementales()
+            valores = np.empty((len(COLUMNAS_INDICADORES), len(fechas)))
+            for j in range(len(fechas)):
+                fila = self.estado.actualizar(pd.Timestamp(fechas[j]), high[j], low[j], close[j])
+                valores[:, j] = [fila[col] for col in COLUMNAS_INDICADORES]
+        self.ts, self.valores = np.array(fechas, dtype=np.int64), valores
+        return valores
+
+def _con_indicadores(df, valores):
+    """`df` con las columnas de indicadores como vistas de `valores` (la historia los conserva), sin copiarlas."""
+    columnas = {col: df[col].to_numpy() for col in df.columns if col not in COLUMNAS_INDICADORES}
+    columnas.update(zip(COLUMNAS_INDICADORES, valores))
+    return pd.DataFrame(columnas, index=df.index, copy=False)
+
+def actualizar_indicadores_lote(dfs, historias):
+    """
+    Como `calcular_indicadores_lote`, pero con el estado de cada activo en `historias`
+    ({nombre: HistoriaIndicadores}, se agregan las que falten): las ventanas que
+    continúan su historia solo calculan las velas nuevas y el resto se recalcula
+    junto en el kernel por panel. Devuelve ({nombre: DataFrame nuevo con los
+    indicadores}, nombres cuyos indicadores cambiaron).
+    """
+    resultado = dict(dfs)
+    cambiados = []
+    reiniciar = {}
+    for nombre, df in dfs.items():
+        if df is None or not len(df):
+            continue
+        df.columns = [col.lower() for col in df.columns]
+        historia = historias.setdefault(nombre, HistoriaIndicadores())
+        fechas = df.index.values.astype("datetime64[ns]").view(np.int64)
+        columnas = [df[col].to_numpy(dtype=float) for col in ("high", "low", "close")]
+        continuada = historia.continuar(fechas, *columnas)
+        if continuada is None:
+            reiniciar[nombre] = df
+            continue
+        valores, cambio = continuada
+        resultado[nombre] = _con_indicadores(df, valores)
+        if cambio:
+            cambiados.append(nombre)
+
+    if reiniciar:
+        nombres, panel = construir_panel(reiniciar, ("high", "low", "close"))
+        salida = calcular_indicadores_panel(panel["high"], panel["low"], panel["close"], medias=True)
+        for i, nombre in enumerate(nombres):
+            df = reiniciar[nombre]
+            n = len(df)
+            desde = panel["close"].shape[1] - n
+            columnas = {col: serie[i, desde:] for col, serie in salida.items()}
+            valores = historias[nombre].reiniciar(df.index.values.astype("datetime64[ns]").view(np.int64),
+                                                  panel["high"][i, desde:], panel["low"][i, desde:],
+                                                  panel["close"][i, desde:], columnas)
+            resultado[nombre] = _con_indicadores(df, valores)
+            cambiados.append(nombre)
+    return resultado, cambiados
@@ -0,0 +1,118 @@
+# limitador_api.py
+
+import time
+import logging
+import threading
+from config_activos import CONFIG
+
+logger = logging.getLogger(__name__)
+
+class APIRateLimiter:
+    """
+    Token bucket thread-safe para el presupuesto de la API.
+    Se reponen `max_requests` tokens cada `period` segundos y se permite una
+    ráfaga de hasta `rafaga` llamadas seguidas. Cada llamada HTTP (incluidos
+    los reintentos) debe pasar por `adquirir()`.
+    """
+
+    def __init__(self, max_requests=8, period=60, rafaga=None, reloj=time.monotonic, dormir=time.sleep):
+        self.max_requests = max_requests
+        self.period = period
+        self.capacidad = float(rafaga or max_requests)
+        self.tasa = max_requests / period
+        self.tokens = self.capacidad
+        self.request_count = 0
+        self.espera_total = 0.0
+        self._reloj = reloj
+        self._dormir = dormir
+        self._ultimo = reloj()
+        self._lock = threading.Lock()
+
+    def _reponer(self, ahora):
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def intentar(self, n=1):
+        """
+        Consume `n` tokens si hay disponibles. Devuelve 0 o los segundos a esperar.
+        Un pedido mayor que la ráfaga se concede con el cubo lleno y deja saldo
+        negativo, que las llamadas siguientes terminan de pagar.
+        """
+        with self._lock:
+            self._reponer(self._reloj())
+            necesario = min(n, self.capacidad)
+            if self.tokens >= necesario:
+                self.tokens -= n
+                self.request_count += n
+                return 0.0
+            return (necesario - self.tokens) / self.tasa
+
+    def adquirir(self, n=1):
+        """Bloquea el hilo actual hasta obtener `n` tokens. Devuelve el tiempo esperado."""
+        esperado = 0.0
+        while True:
+            espera = self.intentar(n)
+            if espera <= 0:
+                if esperado:
+                    with self._lock:
+                        self.espera_total += esperado
+                return esperado
+            if not esperado:
+                logger.warning(f"⏳ Límite API alcanzado. Esperando {espera:.1f}s...")
+            self._dormir(espera)
+            esperado += espera
+
+    # Compatibilidad con el nombre anterior
+    check_limit = adquirir
+
+class LimitadorDistribuido(APIRateLimiter):
+    """
+    Token bucket compartido por todos los workers a través del almacén de
+    coordinación: varios procesos con la misma API key respetan un único
+    presupuesto. `request_count` cuenta solo los créditos de este proceso.
+    """
+
+    def __init__(self, almacen, max_requests=8, period=60, rafaga=None, nombre="twelve_data",
+                 reloj=time.time, dormir=time.sleep):
+        super().__init__(max_requests, period, rafaga, reloj, dormir)
+        self.almacen = almacen
+        self.nombre = nombre
+
+    def intentar(self, n=1):
+        espera = self.almacen.consumir_tokens(self.nombre, n, self.capacidad, self.tasa, self._reloj())
+        if espera <= 0:
+            with self._lock:
+                self.request_count += n
+        return espera
+
+_limitador = None
+_limitadores = {}
+_lock_global = threading.Lock()
+
+def obtener_limitador(proveedor=None):
+    """
+    Limitador compartido por todo el proceso, configurado desde CONFIG['limite_api']
+    (Twelve Data) o, para otro `proveedor`, desde CONFIG['proveedores'][proveedor]['limite_api'].
+    Con coordinación entre workers el presupuesto se comparte entre todos ellos.
+    """
+    global _limitador
+    with _lock_global:
+        if proveedor in (None, "twelve_data"):
+            if _limitador is None:
+                _limitador = _crear(CONFIG.get("limite_api", {}), "twelve_data")
+            return _limitador
+        if proveedor not in _limitadores:
+            conf = CONFIG.get("proveedores", {}).get(proveedor, {}).get("limite_api", {})
+            _limitadores[proveedor] = _crear(conf, proveedor)
+        return _limitadores[proveedor]
+
+def _crear(conf, nombre):
+    parametros = dict(
+        max_requests=conf.get("max_requests", 8),
+        period=conf.get("periodo", 60),
+        rafaga=conf.get("rafaga"),
+    )
+    from coordinacion import obtener_almacen_coordinacion
+
+    almacen = obtener_almacen_coordinacion()
+    return LimitadorDistribuido(almacen, nombre=nombre, **parametros) if almacen else APIRateLimiter(**parametros)
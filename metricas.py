@@ -0,0 +1,256 @@
+# metricas.py
+
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config_activos import CONFIG
+
+logger = logging.getLogger(__name__)
+
+PREFIJO = "bot_"
+
+# Límites superiores de las cubetas de cada histograma (segundos salvo indicación)
+CUBETAS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+CUBETAS = {
+    "descarga_bytes": (1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+    "filas_parseadas": (10, 50, 100, 250, 500, 1000, 2500, 5000),
+}
+
+DESCRIPCIONES = {
+    "etapa_segundos": "Duración de cada etapa del ciclo",
+    "espera_limite_segundos": "Espera por el limitador de la API antes de cada petición",
+    "descarga_bytes": "Tamaño de cada respuesta por proveedor",
+    "filas_parseadas": "Velas parseadas por símbolo y respuesta",
+    "peticiones": "Peticiones HTTP por proveedor",
+    "latencia_proveedor_segundos": "Duración de cada descarga completa (con paginación) por proveedor",
+    "coberturas": "Lotes pedidos también al proveedor de respaldo por demora del principal",
+    "conmutaciones": "Activos que pasaron al siguiente proveedor por error o falta de datos",
+    "reintentos": "Reintentos por origen",
+    "fallos": "Fallos definitivos por origen",
+    "candidatos": "Activos que pasaron el filtro de rompimiento",
+    "senales": "Señales nuevas emitidas",
+    "senales_correlacionadas": "Señales omitidas por repetir la apuesta de un activo correlacionado",
+    "ciclos": "Ciclos de monitoreo completados",
+}
+
+_NULO = nullcontext()
+
+def _texto_etiquetas(etiquetas, extra=None):
+    pares = list(etiquetas) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pares) + "}"
+
+def _clave_resumen(nombre, etiquetas):
+    return nombre if not etiquetas else f"{nombre}{{{','.join(f'{k}={v}' for k, v in etiquetas)}}}"
+
+class _Histograma:
+    __slots__ = ("limites", "cubetas", "suma", "cuenta")
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.cuenta = 0
+
+    def observar(self, valor):
+        self.cubetas[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.cuenta += 1
+
+class _Cronometro:
+    __slots__ = ("metricas", "etapa", "inicio")
+
+    def __init__(self, metricas, etapa):
+        self.metricas = metricas
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.metricas.observar("etapa_segundos", time.perf_counter() - self.inicio, etapa=self.etapa)
+        return False
+
+class Metricas:
+    """
+    Temporizadores, histogramas y contadores del bot. Acumula totales para el
+    endpoint Prometheus y, por separado, los valores del ciclo en curso para el
+    resumen JSON que se emite al terminar cada ciclo. Desactivado, cada llamada
+    solo comprueba un booleano.
+    """
+
+    def __init__(self, activo=True, ruta_resumenes=None, reloj=time.monotonic):
+        self.activo = activo
+        self.ruta_resumenes = ruta_resumenes
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self._histogramas = {}
+        self._contadores = {}
+        self._ciclo = {}
+        self._contadores_ciclo = {}
+        self._inicio_ciclo = reloj()
+        self.ultimo_resumen = None
+
+    def medir(self, etapa):
+        """Context manager que registra la duración del bloque como `etapa`."""
+        if not self.activo:
+            return _NULO
+        return _Cronometro(self, etapa)
+
+    def observar(self, nombre, valor, **etiquetas):
+        if not self.activo:
+            return
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = _Histograma(CUBETAS.get(nombre, CUBETAS_SEGUNDOS))
+            histograma.observar(valor)
+            # En el resumen las etapas se listan por su nombre
+            clave_ciclo = etiquetas["etapa"] if nombre == "etapa_segundos" else _clave_resumen(*clave)
+            acumulado = self._ciclo.setdefault(clave_ciclo, [0, 0.0, 0.0])
+            acumulado[0] += 1
+            acumulado[1] += valor
+            acumulado[2] = max(acumulado[2], valor)
+
+    def contar(self, nombre, valor=1, **etiquetas):
+        if not self.activo:
+            return
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+            clave_ciclo = _clave_resumen(*clave)
+            self._contadores_ciclo[clave_ciclo] = self._contadores_ciclo.get(clave_ciclo, 0) + valor
+
+    def iniciar_ciclo(self):
+        """Marca el inicio del ciclo (la duración del resumen no incluye la espera entre ciclos)."""
+        self._inicio_ciclo = self._reloj()
+
+    def resumen_ciclo(self, **datos):
+        """
+        Cierra el ciclo en curso: devuelve (y registra en el log y en
+        `ruta_resumenes`, una línea JSON por ciclo) sus etapas y contadores.
+        """
+        if not self.activo:
+            return None
+        ahora = self._reloj()
+        with self._lock:
+            ciclo, contadores = self._ciclo, self._contadores_ciclo
+            self._ciclo, self._contadores_ciclo = {}, {}
+            duracion, self._inicio_ciclo = ahora - self._inicio_ciclo, ahora
+            clave = ("ciclos", ())
+            self._contadores[clave] = self._contadores.get(clave, 0) + 1
+
+        resumen = {
+            "fecha": datetime.utcnow().isoformat(timespec="seconds"),
+            "duracion": round(duracion, 4),
+            **datos,
+            "etapas": {
+                clave: {"n": n, "total": round(total, 4), "max": round(maximo, 4)}
+                for clave, (n, total, maximo) in sorted(ciclo.items())
+            },
+            "contadores": dict(sorted(contadores.items())),
+        }
+        self.ultimo_resumen = resumen
+
+        linea = json.dumps(resumen, ensure_ascii=False)
+        logger.info(f"📊 {linea}")
+        if self.ruta_resumenes:
+            try:
+                with open(self.ruta_resumenes, "a", encoding="utf-8") as f:
+                    f.write(linea + "\n")
+            except OSError as e:
+                logger.warning(f"⚠️ No se pudo guardar el resumen del ciclo: {e}")
+        return resumen
+
+    def exportar_prometheus(self):
+        """Totales acumulados en el formato de texto de Prometheus."""
+        with self._lock:
+            histogramas = sorted(
+                (k, list(h.limites), list(h.cubetas), h.suma, h.cuenta) for k, h in self._histogramas.items()
+            )
+            contadores = sorted(self._contadores.items())
+
+        lineas, declarados = [], set()
+        for (nombre, etiquetas), limites, cubetas, suma, cuenta in histogramas:
+            metrica = PREFIJO + nombre
+            if metrica not in declarados:
+                declarados.add(metrica)
+                lineas.append(f"# HELP {metrica} {DESCRIPCIONES.get(nombre, nombre)}")
+                lineas.append(f"# TYPE {metrica} histogram")
+            acumulado = 0
+            for limite, n in zip(list(limites) + ["+Inf"], cubetas):
+                acumulado += n
+                lineas.append(f"{metrica}_bucket{_texto_etiquetas(etiquetas, ('le', limite))} {acumulado}")
+            lineas.append(f"{metrica}_sum{_texto_etiquetas(etiquetas)} {suma}")
+            lineas.append(f"{metrica}_count{_texto_etiquetas(etiquetas)} {cuenta}")
+
+        for (nombre, etiquetas), valor in contadores:
+            metrica = f"{PREFIJO}{nombre}_total"
+            if metrica not in declarados:
+                declarados.add(metrica)
+                lineas.append(f"# HELP {metrica} {DESCRIPCIONES.get(nombre, nombre)}")
+                lineas.append(f"# TYPE {metrica} counter")
+            lineas.append(f"{metrica}{_texto_etiquetas(etiquetas)} {valor}")
+        return "\n".join(lineas) + "\n"
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    metricas = None
+
+    def do_GET(self):
+        if self.path.startswith("/metrics"):
+            cuerpo, tipo = self.metricas.exportar_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.startswith("/resumen"):
+            cuerpo, tipo = json.dumps(self.metricas.ultimo_resumen, ensure_ascii=False), "application/json"
+        else:
+            self.send_error(404)
+            return
+        datos = cuerpo.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, *_):
+        pass
+
+def servir_metricas(metricas, host="127.0.0.1", puerto=9108):
+    """Expone /metrics (Prometheus) y /resumen (último ciclo en JSON) en un hilo propio."""
+    manejador = type("ManejadorMetricas", (_ManejadorMetricas,), {"metricas": metricas})
+    servidor = ThreadingHTTPServer((host, puerto), manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    logger.info(f"📡 Métricas en http://{host}:{servidor.server_address[1]}/metrics")
+    return servidor
+
+_metricas = None
+_lock_global = threading.Lock()
+
+def obtener_metricas():
+    """Métricas compartidas por el proceso, configuradas desde CONFIG['metricas']."""
+    global _metricas
+    # Camino rápido sin lock: se llama varias veces por activo y etapa, también con las métricas apagadas
+    metricas = _metricas
+    if metricas is not None:
+        return metricas
+    with _lock_global:
+        if _metricas is None:
+            conf = CONFIG.get("metricas", {})
+            metricas = Metricas(activo=conf.get("activo", False), ruta_resumenes=conf.get("resumenes"))
+            if metricas.activo and conf.get("puerto"):
+                try:
+                    servir_metricas(metricas, conf.get("host", "127.0.0.1"), conf["puerto"])
+                except OSError as e:
+                    logger.error(f"❌ No se pudo abrir el puerto de métricas {conf['puerto']}: {e}")
+            # Se publica ya configurada: el camino rápido nunca ve una instancia a medio crear
+            _metricas = metricas
+        return _metricas
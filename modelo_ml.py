@@ -0,0 +1,137 @@
+# modelo_ml.py
+
+import os
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Features conocidas y cómo calcularlas a partir de velas OHLC en minúsculas
+CONSTRUCTORES_FEATURES = {
+    "H-L": lambda df: df["high"] - df["low"],
+    "O-C": lambda df: df["open"] - df["close"],
+    "MA10": lambda df: df["close"].rolling(10).mean(),
+    "MA50": lambda df: df["close"].rolling(50).mean(),
+    "STDDEV": lambda df: df["close"].rolling(10).std(),
+    "ATR": lambda df: df["atr"],
+    "EMA_Rapida": lambda df: df["ema_rapida"],
+    "EMA_Lenta": lambda df: df["ema_lenta"],
+    "RSI": lambda df: df["rsi"],
+}
+
+FEATURES_MODELO = ["H-L", "O-C", "MA10", "MA50", "STDDEV"]
+
+class EsquemaInvalido(ValueError):
+    """El modelo no es compatible con las features que el bot sabe calcular."""
+
+def calcular_features(df, features=FEATURES_MODELO):
+    """Calcula las columnas de `features` para todas las velas de `df`."""
+    df = df.rename(columns=str.lower)
+    return pd.DataFrame({nombre: CONSTRUCTORES_FEATURES[nombre](df) for nombre in features}, index=df.index)
+
+class ModeloML:
+    """Modelo entrenado junto con el esquema de features con el que se entrenó."""
+
+    def __init__(self, modelo, features, version=None):
+        self.modelo = modelo
+        self.features = list(features)
+        self.version = version
+        self.validar()
+
+    @property
+    def classes_(self):
+        return self.modelo.classes_
+
+    def validar(self):
+        desconocidas = [f for f in self.features if f not in CONSTRUCTORES_FEATURES]
+        if desconocidas:
+            raise EsquemaInvalido(f"Features sin constructor: {desconocidas}")
+
+        esperadas = getattr(self.modelo, "n_features_in_", len(self.features))
+        if esperadas != len(self.features):
+            raise EsquemaInvalido(f"El modelo espera {esperadas} features y el esquema declara {len(self.features)}")
+
+        nombres = getattr(self.modelo, "feature_names_in_", None)
+        if nombres is not None and list(nombres) != self.features:
+            raise EsquemaInvalido(f"Features del modelo {list(nombres)} != esquema {self.features}")
+
+    def predict_proba(self, X):
+        if isinstance(X, pd.DataFrame) and list(X.columns) != self.features:
+            raise EsquemaInvalido(f"Columnas de entrada {list(X.columns)} != esquema {self.features}")
+        return self.modelo.predict_proba(X)
+
+def guardar_modelo(modelo, features, ruta, version=None):
+    """Guarda el modelo con su esquema de features y una versión."""
+    import joblib
+
+    version = version or datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    ModeloML(modelo, features, version)
+    joblib.dump({"modelo": modelo, "features": list(features), "version": version}, ruta)
+    return version
+
+def exportar_compacto(modelo, features, directorio, version=None):
+    """Exporta un RandomForest a arrays NumPy memory-mappables (ver bosque_compacto)."""
+    from bosque_compacto import BosqueCompacto
+
+    bosque = BosqueCompacto.desde_sklearn(modelo, features, version)
+    ModeloML(bosque, features, version)
+    bosque.guardar(directorio)
+    return bosque
+
+def cargar_modelo(ruta, n_jobs=None):
+    """
+    Carga un artefacto y valida su esquema. `ruta` puede ser el directorio de un
+    bosque compacto (sin scikit-learn, con memory-mapping) o un .pkl de joblib,
+    también un estimador suelto entrenado con nombres de columnas.
+    Lanza EsquemaInvalido si no es utilizable.
+    """
+    if os.path.isdir(ruta):
+        from bosque_compacto import BosqueCompacto
+
+        bosque = BosqueCompacto.cargar(ruta)
+        return ModeloML(bosque, bosque.features, bosque.version)
+
+    import joblib
+
+    artefacto = joblib.load(ruta)
+    if isinstance(artefacto, dict):
+        modelo, features, version = artefacto["modelo"], artefacto["features"], artefacto.get("version")
+    else:
+        modelo = artefacto
+        nombres = getattr(modelo, "feature_names_in_", None)
+        if nombres is None:
+            raise EsquemaInvalido(f"{ruta} no incluye esquema de features; reentrena con entrenar_modelo_pro.py")
+        features, version = list(nombres), None
+
+    if n_jobs is not None and hasattr(modelo, "n_jobs"):
+        modelo.n_jobs = n_jobs
+    return ModeloML(modelo, features, version)
+
+def calcular_confianza(modelo, X):
+    """Confianza por fila: probabilidad de 'GANANCIA' si el modelo la tiene, si no la máxima."""
+    proba = modelo.predict_proba(X)
+    clases = list(modelo.classes_)
+    if "GANANCIA" in clases:
+        return proba[:, clases.index("GANANCIA")]
+    return np.max(proba, axis=1)
+
+def confianza_lote(modelo, filas):
+    """
+    Etapa de inferencia: puntúa en un único predict_proba las filas de features
+    de todos los activos candidatos del ciclo. `filas` es {nombre: Series}.
+    Devuelve {nombre: confianza}.
+    """
+    if not filas:
+        return {}
+    nombres = list(filas)
+    X = pd.DataFrame([filas[n] for n in nombres], columns=modelo.features)
+    validas = X.notna().all(axis=1).to_numpy()
+    confianzas = np.zeros(len(nombres))
+    if validas.any():
+        confianzas[validas] = calcular_confianza(modelo, X[validas])
+    for nombre in np.array(nombres)[~validas]:
+        logger.warning(f"⚠️ Features incompletas para {nombre}, confianza 0")
+    return dict(zip(nombres, confianzas))
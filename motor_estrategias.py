@@ -0,0 +1,136 @@
+# motor_estrategias.py
+
+import abc
+import importlib
+import inspect
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Features compartidas que calcula el llamador (una vez por activo y vela) para todas las
+# estrategias: en vivo una fila por candidato (estrategia_trading.features_candidatos) y en
+# backtest una fila por vela (backtest_estrategia.features_historia)
+FEATURES = {
+    "precio": "cierre de la vela",
+    "atr": "ATR 14",
+    "ema_rapida": "EMA 25 del cierre",
+    "ema_lenta": "EMA 50 del cierre",
+    "rsi": "RSI 14",
+    "rompe": "el cierre rompe el rango de alguna sesión",
+    "confianza": "probabilidad de GANANCIA del modelo ML",
+    "confirma_compra": "las temporalidades de confirmación acompañan una compra",
+    "confirma_venta": "las temporalidades de confirmación acompañan una venta",
+}
+
+ESTRATEGIAS = {}
+
+def registrar_estrategia(clase):
+    """Decorador: hace disponible la estrategia por su `nombre` en CONFIG['estrategias']."""
+    if inspect.isabstract(clase):
+        faltan = ", ".join(sorted(clase.__abstractmethods__))
+        raise TypeError(f"La estrategia {clase.__name__} no implementa: {faltan}")
+    ESTRATEGIAS[clase.nombre] = clase
+    return clase
+
+class Estrategia(abc.ABC):
+    """
+    Interfaz de las estrategias del motor. Una estrategia declara en `requiere` las
+    features de FEATURES que usa y define sus reglas sobre arrays (una fila por
+    activo en vivo o por vela en backtest), así la misma lógica sirve en ambos casos
+    y no repite el cálculo de datos ni de indicadores. `reglas` es obligatoria: sin
+    ella la clase no se registra ni se instancia.
+    """
+    nombre = None
+    requiere = ()
+    mult_sl = 1.5
+    mult_tp = 2
+
+    @abc.abstractmethod
+    def reglas(self, f):
+        """Máscaras (compra, venta) sobre las filas de `f` ({feature: array})."""
+
+    def candidatas(self, f):
+        """
+        Filas que podrían dar señal sin mirar la confianza; el modelo solo puntúa estas
+        en backtest. `f` trae todas las features requeridas salvo 'confianza'.
+        """
+        n = len(next(iter(f.values())))
+        return np.ones(n, dtype=bool)
+
+    def niveles(self, f, direccion, filas):
+        """Stop loss y take profit de las entradas `filas` en `direccion` (1 o -1)."""
+        precio, atr = f["precio"][filas], f["atr"][filas]
+        return precio - direccion * atr * self.mult_sl, precio + direccion * atr * self.mult_tp
+
+def _clase(nombre):
+    if nombre in ESTRATEGIAS:
+        return ESTRATEGIAS[nombre]
+    if ":" in nombre:
+        # Plugins fuera del repo: "paquete.modulo:Clase"
+        modulo, clase = nombre.split(":", 1)
+        return getattr(importlib.import_module(modulo), clase)
+    raise ValueError(f"Estrategia desconocida: {nombre} (registradas: {', '.join(ESTRATEGIAS)})")
+
+def cargar_estrategias(especificacion):
+    """
+    Instancia las estrategias de `especificacion`: nombres registrados, rutas
+    "modulo:Clase" o dicts {"nombre": ..., **parámetros del constructor}.
+    """
+    estrategias = []
+    for item in especificacion:
+        if isinstance(item, Estrategia):
+            estrategias.append(item)
+            continue
+        parametros = dict(item) if isinstance(item, dict) else {"nombre": item}
+        clase = _clase(parametros.pop("nombre"))
+        estrategias.append(clase(**parametros))
+    return estrategias
+
+class MotorEstrategias:
+    """
+    Evalúa todas las estrategias sobre un mismo conjunto de features: agregar una
+    estrategia solo suma el costo de sus reglas.
+    """
+
+    def __init__(self, estrategias):
+        self.estrategias = cargar_estrategias(estrategias)
+        nombres = [e.nombre for e in self.estrategias]
+        if len(set(nombres)) < len(nombres):
+            raise ValueError(f"Estrategias repetidas: {nombres}")
+        self.requeridas = set().union(*(e.requiere for e in self.estrategias))
+        desconocidas = self.requeridas - set(FEATURES)
+        if desconocidas:
+            raise ValueError(f"Features no soportadas por el motor: {sorted(desconocidas)}")
+
+    def requiere(self, feature):
+        return feature in self.requeridas
+
+    def todas_requieren(self, feature):
+        """True si ninguna estrategia puede dar señal sin `feature` (p. ej. sin rompimiento)."""
+        return all(feature in e.requiere for e in self.estrategias)
+
+    def candidatas(self, f):
+        """Filas que alguna estrategia que usa la confianza podría convertir en señal."""
+        usan = [e for e in self.estrategias if "confianza" in e.requiere]
+        n = len(next(iter(f.values())))
+        mascara = np.zeros(n, dtype=bool)
+        for estrategia in usan:
+            mascara |= estrategia.candidatas(f)
+        return mascara
+
+    def evaluar(self, f):
+        """
+        Aplica todas las estrategias a `f`. Devuelve una lista de entradas
+        (estrategia, dirección 1/-1, filas, sl, tp), en el orden de las estrategias.
+        """
+        entradas = []
+        for estrategia in self.estrategias:
+            compra, venta = estrategia.reglas(f)
+            for direccion, mascara in ((1, compra), (-1, venta)):
+                filas = np.flatnonzero(mascara)
+                if len(filas):
+                    sl, tp = estrategia.niveles(f, direccion, filas)
+                    entradas.append((estrategia, direccion, filas, sl, tp))
+        return entradas
@@ -0,0 +1,180 @@
+# planificador.py
+
+import time
+import logging
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from cache_barras import intervalo_a_timedelta
+from config_activos import CONFIG
+
+logger = logging.getLogger(__name__)
+
+DIAS = {"lun": 0, "mar": 1, "mie": 2, "jue": 3, "vie": 4, "sab": 5, "dom": 6}
+MINUTOS_SEMANA = 7 * 24 * 60
+
+MERCADOS_POR_DEFECTO = {
+    "forex": {"apertura": "dom 17:00", "cierre": "vie 17:00", "zona": "America/New_York"},
+    "cripto": {"siempre_abierto": True, "activos": ["BTC", "ETH", "SOLANA"]},
+}
+
+def _minuto_semana(texto):
+    """'vie 17:00' -> minutos desde el lunes 00:00."""
+    dia, hora = texto.split()
+    horas, minutos = hora.split(":")
+    return DIAS[dia.lower()[:3]] * 24 * 60 + int(horas) * 60 + int(minutos)
+
+class HorarioMercado:
+    """Horario semanal de un mercado (apertura y cierre en hora local de `zona`)."""
+
+    def __init__(self, apertura=None, cierre=None, zona="UTC", siempre_abierto=False, desfase_velas=0, **_):
+        self.siempre_abierto = siempre_abierto or apertura is None
+        self.apertura = None if self.siempre_abierto else _minuto_semana(apertura)
+        self.cierre = None if self.siempre_abierto else _minuto_semana(cierre)
+        self.zona = ZoneInfo(zona)
+        # Minutos que se corre el inicio de las velas respecto de los múltiplos UTC del intervalo
+        self.desfase = timedelta(minutes=desfase_velas)
+
+    def abierto(self, fecha):
+        """`fecha` en UTC (naive o con zona)."""
+        if self.siempre_abierto:
+            return True
+        fecha = pd.Timestamp(fecha)
+        local = (fecha.tz_localize("UTC") if fecha.tz is None else fecha).tz_convert(self.zona)
+        minuto = local.dayofweek * 24 * 60 + local.hour * 60 + local.minute
+        if self.apertura <= self.cierre:
+            return self.apertura <= minuto < self.cierre
+        return minuto >= self.apertura or minuto < self.cierre
+
+    def opero_entre(self, desde, hasta):
+        """True si el mercado estuvo abierto en algún momento de [desde, hasta)."""
+        if self.siempre_abierto:
+            return True
+        # Los cierres duran días: basta revisar los extremos y cada hora intermedia
+        paso = timedelta(hours=1)
+        fecha = desde
+        while fecha < hasta:
+            if self.abierto(fecha):
+                return True
+            fecha += paso
+        return self.abierto(hasta - timedelta(seconds=1))
+
+def cargar_mercados(activos, mercados=None):
+    """Devuelve ({mercado: HorarioMercado}, {activo: mercado}). Sin asignación explícita un activo es 'forex'."""
+    mercados = mercados or CONFIG.get("mercados", MERCADOS_POR_DEFECTO)
+    horarios = {nombre: HorarioMercado(**conf) for nombre, conf in mercados.items()}
+    asignacion = {}
+    for nombre in activos:
+        asignacion[nombre] = next((m for m, conf in mercados.items() if nombre in conf.get("activos", [])), "forex")
+        if asignacion[nombre] not in horarios:
+            horarios[asignacion[nombre]] = HorarioMercado(siempre_abierto=True)
+    return horarios, asignacion
+
+class Planificador:
+    """
+    Despierta en cada cierre de vela del intervalo (más un margen de asentamiento
+    para que el proveedor publique la vela) y evalúa solo los activos cuyo mercado
+    operó durante la vela recién cerrada, empezando por los de cierre más reciente.
+    `reloj` devuelve la hora UTC (naive) y `dormir` espera segundos; ambos son
+    inyectables para probar el calendario sin esperar.
+    Con un `coordinador` (ver coordinacion.py) solo se evalúan los activos que
+    este worker reclama, y entre velas se despierta en cada latido para tomar los
+    de workers caídos. Si una vuelta falla, se reintenta tras `reintento` segundos
+    (o en el próximo cierre, si llega antes).
+    """
+
+    def __init__(self, activos, intervalo, mercados=None, asentamiento=30, reloj=datetime.utcnow, dormir=time.sleep,
+                 coordinador=None, reintento=60):
+        self.activos = dict(activos)
+        self.paso = intervalo_a_timedelta(intervalo)
+        self.horarios, self.mercado_de = cargar_mercados(self.activos, mercados)
+        self.asentamiento = timedelta(seconds=asentamiento)
+        self.reloj = reloj
+        self.dormir = dormir
+        self.coordinador = coordinador
+        self.reintento = timedelta(seconds=reintento)
+        self.evaluadas = {}
+
+    def _horario(self, nombre):
+        return self.horarios[self.mercado_de[nombre]]
+
+    def ultimo_cierre(self, nombre, ahora):
+        """Cierre de la última vela del activo ya asentada a la hora `ahora`."""
+        desfase = self._horario(nombre).desfase
+        segundos = int(self.paso.total_seconds())
+        epoch = int(pd.Timestamp(ahora - self.asentamiento - desfase).timestamp())
+        return datetime.utcfromtimestamp(epoch - epoch % segundos) + desfase
+
+    def pendientes(self, ahora):
+        """
+        Activos con una vela cerrada sin evaluar y mercado abierto durante ella.
+        Devuelve {nombre: (ticker, cierre)} ordenado por cierre más reciente.
+        """
+        pendientes = []
+        for orden, (nombre, ticker) in enumerate(self.activos.items()):
+            cierre = self.ultimo_cierre(nombre, ahora)
+            if self.evaluadas.get(nombre) == cierre:
+                continue
+            if not self._horario(nombre).opero_entre(cierre - self.paso, cierre):
+                continue
+            pendientes.append((-cierre.timestamp(), orden, nombre, ticker, cierre))
+        return {nombre: (ticker, cierre) for _, _, nombre, ticker, cierre in sorted(pendientes)}
+
+    def marcar(self, pendientes):
+        for nombre, (_, cierre) in pendientes.items():
+            self.evaluadas[nombre] = cierre
+
+    def proximo_despertar(self, ahora):
+        """Próximo cierre de vela (de cualquier activo) más el asentamiento."""
+        return min(self.ultimo_cierre(nombre, ahora) + self.paso for nombre in self.activos) + self.asentamiento
+
+    def ejecutar(self, ciclo, max_ciclos=None):
+        """
+        Bucle principal: `ciclo` recibe {nombre: ticker} con los activos a evaluar.
+        Una excepción en la vuelta se registra y deja las velas sin marcar para el reintento.
+        `max_ciclos` limita las vueltas (pruebas).
+        """
+        vueltas = 0
+        while max_ciclos is None or vueltas < max_ciclos:
+            vueltas += 1
+            pendientes = {}
+            fallo = False
+            try:
+                pendientes = self.pendientes(self.reloj())
+                if self.coordinador is not None:
+                    # Los activos de otros workers no se marcan: si su dueño cae, se reclaman en otra vuelta
+                    pendientes = self.coordinador.reclamar(pendientes)
+                if pendientes:
+                    cierre = max(c for _, c in pendientes.values())
+                    try:
+                        ciclo({nombre: ticker for nombre, (ticker, _) in pendientes.items()})
+                    except Exception:
+                        # Sin completar, los leases se sueltan: si no, el latido los renovaría para siempre
+                        if self.coordinador is not None:
+                            self.coordinador.liberar(pendientes)
+                        raise
+                    if self.coordinador is not None:
+                        self.coordinador.completar(pendientes)
+                    self.marcar(pendientes)
+                    latencia = (self.reloj() - cierre).total_seconds()
+                    logger.info(f"⏱️ {len(pendientes)} activos evaluados {latencia:.0f}s después del cierre de vela")
+                elif self.coordinador is None:
+                    logger.info("💤 Sin velas nuevas (mercados cerrados), se omite el ciclo")
+            except Exception as e:
+                # Un fallo de la vuelta (ciclo, almacén de coordinación) no detiene el bucle: las velas
+                # quedan sin marcar y `pendientes` las devuelve mientras no cierre una más nueva
+                fallo = True
+                logger.error(f"❌ Error en el ciclo ({type(e).__name__}: {e}), se reintenta en "
+                             f"{self.reintento.total_seconds():.0f}s", exc_info=True)
+
+            ahora = self.reloj()
+            despertar = self.proximo_despertar(ahora)
+            if fallo:
+                despertar = min(despertar, ahora + self.reintento)
+            if pendientes or self.coordinador is None:
+                logger.info(f"⏸️ Próximo ciclo a las {despertar:%Y-%m-%d %H:%M:%S} UTC")
+            if self.coordinador is not None:
+                despertar = min(despertar, ahora + timedelta(seconds=self.coordinador.intervalo_latido))
+            self.dormir(max((despertar - ahora).total_seconds(), 0))
@@ -0,0 +1,459 @@
+# proveedores_datos.py
+
+import os
+import abc
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from buffer_velas import BufferVelas, parsear_valores
+from limitador_api import obtener_limitador
+from metricas import obtener_metricas
+from config_activos import CONFIG
+
+load_dotenv()
+API_KEY = os.getenv("TWELVE_DATA_API_KEY")
+BASE_URL = os.getenv("TWELVE_DATA_URL", "https://api.twelvedata.com")
+ALPACA_KEY = os.getenv("APCA_API_KEY_ID")
+ALPACA_SECRET = os.getenv("APCA_API_SECRET_KEY")
+ALPACA_URL = os.getenv("APCA_DATA_URL", "https://data.alpaca.markets")
+
+# Velas máximas por respuesta de /time_series
+TAMANO_PAGINA_TWELVE = 5000
+
+logger = logging.getLogger(__name__)
+
+_sesion = None
+_lock_sesion = threading.Lock()
+
+def obtener_sesion():
+    """Sesión HTTP keep-alive compartida (un pool de conexiones para todos los hilos)."""
+    global _sesion
+    with _lock_sesion:
+        if _sesion is None:
+            _sesion = requests.Session()
+            tamano = max(CONFIG.get("workers_red", 4), 1) * 2
+            _sesion.mount("https://", HTTPAdapter(pool_connections=tamano, pool_maxsize=tamano))
+            _sesion.mount("http://", HTTPAdapter(pool_connections=tamano, pool_maxsize=tamano))
+        return _sesion
+
+class ErrorProveedor(Exception):
+    """El proveedor no pudo responder la petición completa (HTTP, red o formato)."""
+
+class CuotaAgotada(ErrorProveedor):
+    """El proveedor rechazó la petición por límite de peticiones o créditos agotados."""
+
+def _unir(paginas):
+    """Une páginas de velas (BufferVelas) sin solaparse, en cualquier orden, en un solo buffer."""
+    paginas = sorted((p for p in paginas if p is not None and len(p)), key=lambda p: p.fechas()[0])
+    if not paginas:
+        return None
+    if len(paginas) == 1:
+        return paginas[0]
+    return BufferVelas.desde_arrays(np.concatenate([p.fechas() for p in paginas]),
+                                    np.concatenate([p.bloque() for p in paginas], axis=1),
+                                    any(p.volumen for p in paginas))
+
+class Proveedor(abc.ABC):
+    """
+    Interfaz de un proveedor de velas: `descargar` devuelve {ticker: BufferVelas | None}
+    con el mismo esquema (fechas UTC de inicio de vela y OHLCV float64) para todos.
+    Lanza ErrorProveedor si falla la petición entera (CuotaAgotada si es por cuota).
+    Una subclase sin `descargar` no se puede instanciar.
+    """
+    nombre = None
+
+    def __init__(self):
+        self._suspendido_hasta = 0.0
+
+    def disponible(self):
+        return time.monotonic() >= self._suspendido_hasta
+
+    def suspender(self, segundos):
+        self._suspendido_hasta = time.monotonic() + segundos
+        logger.warning(f"⛔ Cuota agotada en {self.nombre}, se suspende {segundos:.0f}s")
+
+    def soporta(self, ticker, intervalo):
+        return True
+
+    @abc.abstractmethod
+    def descargar(self, tickers, intervalo, desde, hasta):
+        """{ticker: BufferVelas | None} de las velas entre `desde` y `hasta`."""
+
+# ============== Twelve Data ==============
+
+def parsear_twelve_data(ticker, data):
+    """Convierte la respuesta de un símbolo en un BufferVelas OHLCV ordenado por fecha."""
+    if "status" in data and data["status"] == "error":
+        logger.error(f"❌ Error al obtener datos de {ticker}: {data.get('message')}")
+        return None
+
+    valores = data.get("values", [])
+    if not valores:
+        logger.warning(f"⚠️ Sin datos para {ticker}")
+        return None
+
+    with obtener_metricas().medir("parseo"):
+        try:
+            buffer = BufferVelas.desde_arrays(*parsear_valores(valores))
+        except (KeyError, ValueError, TypeError):
+            # Formato inesperado (p. ej. sin 'close'): camino general con pandas
+            df = _normalizar(ticker, valores)
+            buffer = None if df is None else BufferVelas.desde_df(df)
+    if buffer is None:
+        return None
+
+    obtener_metricas().observar("filas_parseadas", len(buffer))
+    logger.info(f"✅ Datos obtenidos para {ticker} ({len(buffer)} registros)")
+    return buffer
+
+def _normalizar(ticker, valores):
+    """Lista de velas de la respuesta -> DataFrame numérico ordenado por fecha."""
+    df = pd.DataFrame(valores)
+    df.columns = [col.lower() for col in df.columns]
+
+    logger.info(f"📊 Columnas recibidas para {ticker}: {df.columns.tolist()}")
+
+    if "close" not in df.columns:
+        logger.warning("⚠️ 'close' no disponible. Estimando como promedio OHLC")
+        if all(col in df.columns for col in ["open", "high", "low"]):
+            df["close"] = df[["open", "high", "low"]].astype(float).mean(axis=1)
+        else:
+            logger.error(f"❌ Faltan columnas para generar 'close' en {ticker}")
+            return None
+
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    df.set_index("datetime", inplace=True)
+    df = df.sort_index()
+
+    for col in ["open", "high", "low", "close", "volume"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    df.dropna(inplace=True)
+    return df
+
+class TwelveData(Proveedor):
+    """/time_series de Twelve Data: varios símbolos por petición y paginación hacia atrás."""
+    nombre = "twelve_data"
+
+    def __init__(self, api_key, url=BASE_URL):
+        super().__init__()
+        self.api_key = api_key
+        self.url = url
+
+    def _pedir(self, simbolos, intervalo, fecha_inicio, fecha_fin):
+        """Hace la petición a /time_series y devuelve el JSON decodificado."""
+        params = {
+            "symbol": ",".join(simbolos),
+            "interval": intervalo,
+            "start_date": fecha_inicio.strftime("%Y-%m-%d %H:%M:%S"),
+            "end_date": fecha_fin.strftime("%Y-%m-%d %H:%M:%S"),
+            "timezone": "UTC",
+            "apikey": self.api_key,
+            "format": "JSON",
+            "outputsize": TAMANO_PAGINA_TWELVE
+        }
+        # Twelve Data cobra un crédito por símbolo, también dentro de un lote
+        creditos = CONFIG.get("limite_api", {}).get("creditos_por_simbolo", 1) * len(simbolos)
+        metricas = obtener_metricas()
+        metricas.observar("espera_limite_segundos", obtener_limitador().adquirir(creditos), proveedor=self.nombre)
+        with metricas.medir("descarga"):
+            response = obtener_sesion().get(f"{self.url}/time_series", params=params, timeout=30)
+        metricas.contar("peticiones", estado=response.status_code, proveedor=self.nombre)
+        metricas.observar("descarga_bytes", len(response.content), proveedor=self.nombre)
+        if response.status_code == 429:
+            raise CuotaAgotada(f"HTTP 429 de {self.nombre}")
+        if response.status_code >= 500:
+            raise ErrorProveedor(f"HTTP {response.status_code} de {self.nombre}")
+        with metricas.medir("parseo"):
+            data = response.json()
+        if data.get("status") == "error" and data.get("code") == 429:
+            raise CuotaAgotada(data.get("message"))
+        return data
+
+    def _serie(self, ticker, data, intervalo, desde):
+        """Parsea la respuesta de un símbolo y, si llenó la página, pide las anteriores."""
+        if data.get("status") == "error" and data.get("code") == 429:
+            self.suspender(CONFIG.get("proveedores", {}).get("enfriamiento_segundos", 60))
+        pagina = parsear_twelve_data(ticker, data)
+        paginas = [pagina]
+        while (pagina is not None and len(data.get("values", [])) >= TAMANO_PAGINA_TWELVE
+               and pd.Timestamp(pagina.fechas()[0]) > pd.Timestamp(desde)):
+            fin = pd.Timestamp(pagina.fechas()[0]).to_pydatetime() - timedelta(seconds=1)
+            data = self._pedir([ticker], intervalo, desde, fin)
+            pagina = parsear_twelve_data(ticker, data)
+            paginas.append(pagina)
+        return _unir(paginas)
+
+    def descargar(self, tickers, intervalo, desde, hasta):
+        data = self._pedir(tickers, intervalo, desde, hasta)
+        if len(tickers) == 1:
+            return {tickers[0]: self._serie(tickers[0], data, intervalo, desde)}
+
+        if data.get("status") == "error":
+            raise ErrorProveedor(f"Error al obtener el lote {tickers}: {data.get('message')}")
+
+        resultado = {}
+        for ticker in tickers:
+            try:
+                resultado[ticker] = self._serie(ticker, data.get(ticker, {}), intervalo, desde)
+            except ErrorProveedor:
+                raise
+            except Exception as e:
+                logger.exception(f"❌ Excepción al procesar datos de {ticker}: {e}")
+                resultado[ticker] = None
+        return resultado
+
+# ============== Alpaca ==============
+
+_MARCOS_ALPACA = {"min": "Min", "h": "Hour", "day": "Day", "week": "Week", "month": "Month"}
+
+def _marco_alpaca(intervalo):
+    """'4h' -> '4Hour', '15min' -> '15Min', '1day' -> '1Day'; None si no se reconoce."""
+    for sufijo in sorted(_MARCOS_ALPACA, key=len, reverse=True):
+        if intervalo.endswith(sufijo):
+            cantidad = intervalo[:-len(sufijo)] or "1"
+            return f"{cantidad}{_MARCOS_ALPACA[sufijo]}" if cantidad.isdigit() else None
+    return None
+
+def parsear_alpaca(ticker, barras):
+    """Lista de barras de Alpaca ({t, o, h, l, c, v}) -> BufferVelas con el esquema común."""
+    if not barras:
+        logger.warning(f"⚠️ Sin datos para {ticker} en Alpaca")
+        return None
+    with obtener_metricas().medir("parseo"):
+        volumen = "v" in barras[0]
+        bloque = np.array([(b["o"], b["h"], b["l"], b["c"], b.get("v", np.nan)) for b in barras],
+                          dtype=np.float64).T.copy()
+        fechas = pd.to_datetime([b["t"] for b in barras], utc=True).tz_convert(None).as_unit("ns").asi8
+        if len(fechas) > 1 and (np.diff(fechas) <= 0).any():
+            fechas, unicas = np.unique(fechas[::-1], return_index=True)
+            bloque = bloque[:, ::-1][:, unicas]
+    obtener_metricas().observar("filas_parseadas", len(fechas))
+    logger.info(f"✅ Datos obtenidos para {ticker} desde Alpaca ({len(fechas)} registros)")
+    return BufferVelas.desde_arrays(fechas, bloque, volumen)
+
+class Alpaca(Proveedor):
+    """
+    Barras de la API de datos de Alpaca (forex y cripto), varios símbolos por petición
+    y todas las páginas de `next_page_token`.
+    """
+    nombre = "alpaca"
+
+    def __init__(self, clave, secreto, url=ALPACA_URL, rutas=None, limite_pagina=10000, cripto=()):
+        super().__init__()
+        self.url = url
+        self.cabeceras = {"APCA-API-KEY-ID": clave, "APCA-API-SECRET-KEY": secreto}
+        self.rutas = rutas or {"forex": "/v1beta1/forex/bars", "cripto": "/v1beta3/crypto/us/bars"}
+        self.limite_pagina = limite_pagina
+        self.cripto = set(cripto)
+
+    def _mercado(self, ticker):
+        return "cripto" if ticker in self.cripto else "forex"
+
+    def _simbolo(self, ticker):
+        # Forex sin barra (EURUSD); cripto como par (BTC/USD)
+        return ticker if ticker in self.cripto else ticker.replace("/", "")
+
+    def soporta(self, ticker, intervalo):
+        return _marco_alpaca(intervalo) is not None and self._mercado(ticker) in self.rutas
+
+    def _pedir(self, ruta, params):
+        metricas = obtener_metricas()
+        metricas.observar("espera_limite_segundos", obtener_limitador(self.nombre).adquirir(1), proveedor=self.nombre)
+        with metricas.medir("descarga"):
+            response = obtener_sesion().get(f"{self.url}{ruta}", params=params, headers=self.cabeceras, timeout=30)
+        metricas.contar("peticiones", estado=response.status_code, proveedor=self.nombre)
+        metricas.observar("descarga_bytes", len(response.content), proveedor=self.nombre)
+        if response.status_code == 429:
+            raise CuotaAgotada(f"HTTP 429 de {self.nombre}")
+        if response.status_code != 200:
+            raise ErrorProveedor(f"HTTP {response.status_code} de {self.nombre}: {response.text[:200]}")
+        with metricas.medir("parseo"):
+            return response.json()
+
+    def descargar(self, tickers, intervalo, desde, hasta):
+        mercados = {}
+        for ticker in tickers:
+            mercados.setdefault(self._mercado(ticker), []).append(ticker)
+
+        resultado = {}
+        for mercado, grupo in mercados.items():
+            simbolos = {self._simbolo(t): t for t in grupo}
+            barras = {simbolo: [] for simbolo in simbolos}
+            params = {
+                "symbols": ",".join(simbolos),
+                "timeframe": _marco_alpaca(intervalo),
+                "start": desde.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "end": hasta.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "limit": self.limite_pagina,
+            }
+            while True:
+                data = self._pedir(self.rutas[mercado], params)
+                # v1beta3 agrupa en "bars"; las rutas antiguas ponen cada símbolo en la raíz
+                pagina = data.get("bars") if isinstance(data.get("bars"), dict) else data
+                for simbolo, lista in pagina.items():
+                    if simbolo in barras and isinstance(lista, list):
+                        barras[simbolo].extend(lista)
+                token = data.get("next_page_token")
+                if not token:
+                    break
+                params["page_token"] = token
+            for simbolo, ticker in simbolos.items():
+                resultado[ticker] = parsear_alpaca(ticker, barras[simbolo])
+        return resultado
+
+# ============== Cadena con cobertura y conmutación ==============
+
+class CadenaProveedores:
+    """
+    Proveedores en orden de preferencia. Cada lote se pide al primero disponible; si
+    tarda más que el `percentil` de sus latencias recientes (`espera` segundos mientras
+    tenga menos de `muestras`), se pide lo mismo al siguiente en paralelo y gana la
+    primera respuesta con datos. Los activos que un proveedor no entrega (error, cuota
+    agotada o símbolo sin datos) pasan al siguiente.
+    """
+
+    def __init__(self, proveedores, cobertura=True, percentil=95, muestras=20, espera=10,
+                 enfriamiento=60, workers=4):
+        self.proveedores = list(proveedores)
+        self.cobertura = cobertura
+        self.percentil = percentil
+        self.muestras = muestras
+        self.espera = espera
+        self.enfriamiento = enfriamiento
+        self.latencias = {p.nombre: deque(maxlen=200) for p in self.proveedores}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(2 * workers, 2), thread_name_prefix="proveedor")
+
+    def umbral(self, proveedor):
+        """Segundos de espera antes de cubrir una petición a `proveedor`."""
+        with self._lock:
+            latencias = list(self.latencias[proveedor.nombre])
+        if len(latencias) < self.muestras:
+            return self.espera
+        return float(np.percentile(latencias, self.percentil))
+
+    def _llamar(self, proveedor, tickers, intervalo, desde, hasta):
+        inicio = time.perf_counter()
+        try:
+            resultado = proveedor.descargar(tickers, intervalo, desde, hasta)
+        except CuotaAgotada:
+            proveedor.suspender(self.enfriamiento)
+            raise
+        except ErrorProveedor:
+            raise
+        except Exception as e:
+            # Red, JSON inválido o una respuesta con otro formato (p. ej. KeyError al
+            # parsear): los activos pasan al siguiente proveedor en vez de abortar la cadena
+            raise ErrorProveedor(f"{proveedor.nombre}: {type(e).__name__}: {e}") from e
+        duracion = time.perf_counter() - inicio
+        with self._lock:
+            self.latencias[proveedor.nombre].append(duracion)
+        obtener_metricas().observar("latencia_proveedor_segundos", duracion, proveedor=proveedor.nombre)
+        return resultado
+
+    def _con_cobertura(self, primario, respaldo, tickers, intervalo, desde, hasta):
+        """Pide `tickers` a `primario` y, si se demora, también a `respaldo`. Devuelve (velas, proveedores consultados)."""
+        futuros = {self._pool.submit(self._llamar, primario, tickers, intervalo, desde, hasta): primario}
+        if respaldo is not None and self.cobertura:
+            umbral = self.umbral(primario)
+            hechos, _ = wait(list(futuros), timeout=umbral)
+            if not hechos:
+                propios = [t for t in tickers if respaldo.soporta(t, intervalo)]
+                logger.info(f"🛡️ {primario.nombre} tarda más de {umbral:.2f}s, se cubre el lote con {respaldo.nombre}")
+                obtener_metricas().contar("coberturas", proveedor=respaldo.nombre)
+                futuros[self._pool.submit(self._llamar, respaldo, propios, intervalo, desde, hasta)] = respaldo
+
+        # Gana la primera respuesta; la otra solo completa los activos que le falten
+        velas = {}
+        for listo in as_completed(futuros):
+            proveedor = futuros[listo]
+            try:
+                obtenidas = listo.result()
+            except ErrorProveedor as e:
+                logger.warning(f"⚠️ {proveedor.nombre} falló para {', '.join(tickers)}: {e}")
+                continue
+            for ticker, buffer in obtenidas.items():
+                if buffer is not None and velas.get(ticker) is None:
+                    velas[ticker] = buffer
+            if all(velas.get(t) is not None for t in tickers):
+                break
+        return velas, list(futuros.values())
+
+    def descargar(self, tickers, intervalo, desde, hasta):
+        """{ticker: BufferVelas | None} con cada activo del primer proveedor que lo entregue."""
+        resultado = dict.fromkeys(tickers)
+        pendientes = list(tickers)
+        consultados = set()
+        for i, proveedor in enumerate(self.proveedores):
+            if not pendientes:
+                break
+            if proveedor.nombre in consultados or not proveedor.disponible():
+                continue
+            propios = [t for t in pendientes if proveedor.soporta(t, intervalo)]
+            if not propios:
+                continue
+            respaldo = next((p for p in self.proveedores[i + 1:]
+                             if p.nombre not in consultados and p.disponible()
+                             and any(p.soporta(t, intervalo) for t in propios)), None)
+            velas, usados = self._con_cobertura(proveedor, respaldo, propios, intervalo, desde, hasta)
+            consultados.update(p.nombre for p in usados)
+            for ticker, buffer in velas.items():
+                if buffer is not None and ticker in resultado:
+                    resultado[ticker] = buffer
+            pendientes = [t for t in pendientes if resultado[t] is None]
+            faltantes = [t for t in propios if resultado[t] is None]
+            if faltantes and i + 1 < len(self.proveedores):
+                obtener_metricas().contar("conmutaciones", len(faltantes), proveedor=proveedor.nombre)
+                logger.warning(f"🔀 Sin datos de {proveedor.nombre} para {', '.join(faltantes)}, se prueba el siguiente proveedor")
+        return resultado
+
+_cadena = None
+_lock_cadena = threading.Lock()
+
+def _tickers_cripto():
+    cripto = CONFIG.get("mercados", {}).get("cripto", {}).get("activos", [])
+    return {CONFIG["activos"][nombre] for nombre in cripto if nombre in CONFIG["activos"]}
+
+def crear_proveedor(nombre):
+    """Proveedor configurado por nombre, o None si faltan sus credenciales."""
+    conf = CONFIG.get("proveedores", {}).get(nombre, {})
+    if nombre == "twelve_data":
+        return TwelveData(API_KEY, BASE_URL) if API_KEY else None
+    if nombre == "alpaca":
+        if not (ALPACA_KEY and ALPACA_SECRET):
+            return None
+        return Alpaca(ALPACA_KEY, ALPACA_SECRET, ALPACA_URL, conf.get("rutas"), conf.get("limite_pagina", 10000),
+                      _tickers_cripto())
+    raise ValueError(f"Proveedor de datos desconocido: {nombre}")
+
+def obtener_cadena():
+    """Cadena de proveedores compartida, con los de CONFIG['proveedores']['orden'] que tienen credenciales."""
+    global _cadena
+    with _lock_cadena:
+        if _cadena is None:
+            conf = CONFIG.get("proveedores", {})
+            proveedores = []
+            for nombre in conf.get("orden", ["twelve_data"]):
+                proveedor = crear_proveedor(nombre)
+                if proveedor is None:
+                    logger.info(f"ℹ️ Proveedor {nombre} sin credenciales en .env, se omite")
+                else:
+                    proveedores.append(proveedor)
+            _cadena = CadenaProveedores(
+                proveedores, conf.get("cobertura", True), conf.get("percentil_cobertura", 95),
+                conf.get("muestras_cobertura", 20), conf.get("espera_cobertura", 10),
+                conf.get("enfriamiento_segundos", 60), CONFIG.get("workers_red", 4),
+            )
+        return _cadena
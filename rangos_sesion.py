@@ -0,0 +1,204 @@
+# rangos_sesion.py
+
+from collections import OrderedDict, deque
+from datetime import time as hora_dia
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from config_activos import CONFIG
+
+SESIONES_POR_DEFECTO = {
+    "Asiático": {"inicio": "00:00", "fin": "06:00", "zona": "UTC"},
+    "Londres": {"inicio": "06:00", "fin": "12:00", "zona": "UTC"},
+    "EE.UU.": {"inicio": "13:00", "fin": "20:00", "zona": "UTC"},
+}
+
+def cargar_sesiones(sesiones=None):
+    """Normaliza la definición de sesiones (por defecto CONFIG['sesiones'])."""
+    sesiones = sesiones or CONFIG.get("sesiones", SESIONES_POR_DEFECTO)
+    return {
+        nombre: (hora_dia.fromisoformat(s["inicio"]), hora_dia.fromisoformat(s["fin"]), ZoneInfo(s.get("zona", "UTC")))
+        for nombre, s in sesiones.items()
+    }
+
+def mascara_sesion(indice, inicio, fin, zona):
+    """
+    Velas de `indice` (UTC naive o con zona) cuya hora local en `zona` cae entre
+    `inicio` y `fin`, ambos inclusive como en `DataFrame.between_time`.
+    Devuelve la máscara y el día local en que empieza la sesión de cada vela: si la
+    sesión cruza la medianoche (`inicio` > `fin`), sus velas tras la medianoche
+    pertenecen al día anterior.
+    """
+    indice = pd.DatetimeIndex(indice)
+    local = (indice.tz_localize("UTC") if indice.tz is None else indice).tz_convert(zona)
+    minutos = local.hour * 60 + local.minute
+    desde = inicio.hour * 60 + inicio.minute
+    hasta = fin.hour * 60 + fin.minute
+    dias = local.normalize().tz_localize(None)
+    if desde <= hasta:
+        mascara = (minutos >= desde) & (minutos <= hasta)
+    else:
+        mascara = (minutos >= desde) | (minutos <= hasta)
+        dias = dias - pd.to_timedelta(np.asarray(minutos <= hasta, dtype=np.int64), unit="D")
+    return np.asarray(mascara), dias
+
+class _Ventana:
+    """Máximo y mínimo de los días cerrados con colas monótonas (consulta en O(1))."""
+    __slots__ = ("maximos", "minimos")
+
+    def __init__(self):
+        self.maximos = deque()
+        self.minimos = deque()
+
+    def agregar(self, dia, high, low):
+        while self.maximos and self.maximos[-1][1] <= high:
+            self.maximos.pop()
+        self.maximos.append((dia, high))
+        while self.minimos and self.minimos[-1][1] >= low:
+            self.minimos.pop()
+        self.minimos.append((dia, low))
+
+    def recortar(self, dia):
+        while self.maximos and self.maximos[0][0] < dia:
+            self.maximos.popleft()
+        while self.minimos and self.minimos[0][0] < dia:
+            self.minimos.popleft()
+
+    def rango(self, actual=None):
+        """(máximo, mínimo) de los días de la ventana y, si se pasa, del día en curso (high, low)."""
+        maximo = self.maximos[0][1] if self.maximos else -np.inf
+        minimo = self.minimos[0][1] if self.minimos else np.inf
+        if actual is not None:
+            maximo, minimo = max(maximo, actual[0]), min(minimo, actual[1])
+        return maximo, minimo
+
+class IndiceSesiones:
+    """
+    Índice por activo con el máximo y mínimo de cada sesión por día (el día en que
+    empieza la sesión, aunque cruce la medianoche).
+
+    Se alimenta vela a vela (la última vela puede revisarse) y responde en O(1) el
+    rango de cada sesión sobre toda la ventana retenida o sobre los últimos N días
+    (el de la sesión en curso y los N - 1 anteriores). Cada N tiene su propia cola
+    monótona: las de `dias_rango` (por defecto CONFIG['dias_rango']) se mantienen
+    desde el inicio y las demás desde su primera consulta. Las sesiones se definen
+    con hora de inicio/fin y zona horaria.
+    """
+
+    def __init__(self, sesiones=None, dias_rango=None):
+        self.sesiones = cargar_sesiones(sesiones)
+        self.dias = {nombre: OrderedDict() for nombre in self.sesiones}
+        self.ventanas = {nombre: _Ventana() for nombre in self.sesiones}
+        # {N: ventana de los N - 1 días cerrados más recientes} y esos días, para recortarlas
+        self.ventanas_dias = {nombre: {} for nombre in self.sesiones}
+        self.cerrados = {nombre: deque(maxlen=0) for nombre in self.sesiones}
+        self.dia_actual = {nombre: None for nombre in self.sesiones}
+        self.velas_actuales = {nombre: {} for nombre in self.sesiones}
+        self.ultima_fecha = None
+        for dias in CONFIG.get("dias_rango", []) if dias_rango is None else dias_rango:
+            for nombre in self.sesiones:
+                self._ventana_dias(nombre, dias)
+
+    @classmethod
+    def desde_df(cls, df, sesiones=None, dias_rango=None):
+        indice = cls(sesiones, dias_rango)
+        indice.agregar_df(df)
+        return indice
+
+    def _ventana_dias(self, nombre, dias):
+        """Ventana de los últimos `dias` días de la sesión; la primera vez se llena con los días retenidos."""
+        ventana = self.ventanas_dias[nombre].get(dias)
+        if ventana is not None:
+            return ventana
+        if dias < 1:
+            raise ValueError(f"La ventana de días debe ser positiva: {dias}")
+
+        ventana = self.ventanas_dias[nombre][dias] = _Ventana()
+        agregados = self.dias[nombre]
+        cerrados = [dia for dia in agregados if dia != self.dia_actual[nombre]]
+        if dias > 1:
+            for dia in cerrados[-(dias - 1):]:
+                ventana.agregar(dia, *agregados[dia])
+        largo = max(self.ventanas_dias[nombre]) - 1
+        self.cerrados[nombre] = deque(cerrados[-largo:] if largo else [], maxlen=largo)
+        return ventana
+
+    def _cerrar_dia(self, nombre):
+        dia = self.dia_actual[nombre]
+        if dia is not None and dia in self.dias[nombre]:
+            high, low = self.dias[nombre][dia]
+            self.ventanas[nombre].agregar(dia, high, low)
+            cerrados = self.cerrados[nombre]
+            cerrados.append(dia)
+            for dias, ventana in self.ventanas_dias[nombre].items():
+                if dias > 1:
+                    ventana.agregar(dia, high, low)
+                    if len(cerrados) >= dias - 1:
+                        ventana.recortar(cerrados[-(dias - 1)])
+        self.velas_actuales[nombre] = {}
+
+    def agregar_df(self, df):
+        """Incorpora las velas de `df` posteriores a la última (o igual, si fue revisada)."""
+        if self.ultima_fecha is not None:
+            df = df[df.index >= self.ultima_fecha]
+        if df.empty:
+            return
+        high = df["high" if "high" in df.columns else "HIGH"].to_numpy(dtype=float)
+        low = df["low" if "low" in df.columns else "LOW"].to_numpy(dtype=float)
+
+        for nombre, (inicio, fin, zona) in self.sesiones.items():
+            mascara, dias_locales = mascara_sesion(df.index, inicio, fin, zona)
+            # Timestamps de una vez: indexar el DatetimeIndex vela a vela es lo más caro del bucle
+            for dia, fecha, h, l in zip(dias_locales[mascara].tolist(), df.index[mascara].tolist(),
+                                        high[mascara], low[mascara]):
+                self._agregar_sesion(nombre, dia, fecha, h, l)
+        self.ultima_fecha = df.index[-1]
+
+    def agregar(self, fecha, high, low):
+        """Incorpora una vela suelta."""
+        self.agregar_df(pd.DataFrame({"high": [high], "low": [low]}, index=pd.DatetimeIndex([fecha])))
+
+    def _agregar_sesion(self, nombre, dia, fecha, high, low):
+        if self.dia_actual[nombre] is not None and dia < self.dia_actual[nombre]:
+            return
+        if dia != self.dia_actual[nombre]:
+            self._cerrar_dia(nombre)
+            self.dia_actual[nombre] = dia
+        velas = self.velas_actuales[nombre]
+        velas[fecha] = (high, low)
+        self.dias[nombre][dia] = (max(h for h, _ in velas.values()), min(l for _, l in velas.values()))
+
+    def recortar(self, desde):
+        """Descarta las sesiones que empezaron antes del día de `desde` (granularidad diaria)."""
+        desde = pd.DatetimeIndex([desde])
+        for nombre, (inicio, fin, zona) in self.sesiones.items():
+            dia = mascara_sesion(desde, inicio, fin, zona)[1][0]
+            dias = self.dias[nombre]
+            while dias and next(iter(dias)) < dia:
+                dias.popitem(last=False)
+            self.ventanas[nombre].recortar(dia)
+            for ventana in self.ventanas_dias[nombre].values():
+                ventana.recortar(dia)
+            cerrados = self.cerrados[nombre]
+            while cerrados and cerrados[0] < dia:
+                cerrados.popleft()
+
+    def rango(self, sesion, dias=None):
+        """(máximo, mínimo) de la sesión en la ventana completa o en los últimos `dias` días, en O(1)."""
+        agregados = self.dias[sesion]
+        if not agregados:
+            return None
+        actual = agregados.get(self.dia_actual[sesion])
+        ventana = self.ventanas[sesion] if dias is None else self._ventana_dias(sesion, dias)
+        return ventana.rango(actual)
+
+    def rompimientos(self, precio, dias=None):
+        """Sesiones cuyo rango rompe `precio` por arriba o por abajo."""
+        rotos = []
+        for sesion in self.sesiones:
+            rango = self.rango(sesion, dias)
+            if rango is not None and (precio > rango[0] or precio < rango[1]):
+                rotos.append(sesion)
+        return rotos
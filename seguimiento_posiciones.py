@@ -0,0 +1,223 @@
+# seguimiento_posiciones.py
+
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from config_activos import CONFIG
+from diario_senales import obtener_diario
+
+logger = logging.getLogger(__name__)
+
+_CAMPOS = {
+    "id": np.int64,
+    "activo": np.int32,
+    "direccion": np.int8,
+    "precio": np.float64,
+    "sl": np.float64,
+    "tp": np.float64,
+    "entrada": np.int64,   # inicio de la vela de la señal (ns)
+    "hasta": np.int64,     # última vela ya evaluada (ns)
+    "velas": np.int32,     # velas evaluadas desde la entrada
+}
+_SIN_VELA = np.iinfo(np.int64).min
+
+def _ns(fechas):
+    return pd.DatetimeIndex(fechas).values.astype("datetime64[ns]").view(np.int64)
+
+class SeguimientoPosiciones:
+    """
+    Posiciones de papel abiertas (una por señal con SL y TP) en columnas NumPy.
+    Cada `actualizar` resuelve de una vez, para todas las posiciones, el primer toque
+    de SL o TP en las velas cerradas nuevas de su activo con el criterio de
+    `backtest_estrategia.resolver_salidas`: si ambos se tocan en la misma vela se
+    asume el SL y, sin toque, la posición expira al cierre de la vela `horizonte`.
+    """
+
+    def __init__(self, horizonte=30, capacidad=1024):
+        self.horizonte = horizonte
+        self.n = 0
+        self.columnas = {campo: np.empty(capacidad, dtype=tipo) for campo, tipo in _CAMPOS.items()}
+        self.activos = []
+        self._codigos = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_diario(cls, diario, horizonte=30):
+        """Retoma las señales que el diario tiene abiertas."""
+        seguimiento = cls(horizonte)
+        abiertas = diario.abiertas()
+        if len(abiertas):
+            seguimiento.abrir(abiertas.to_dict("records"))
+        return seguimiento
+
+    def __len__(self):
+        return self.n
+
+    def exposiciones(self):
+        """Pares (activo, dirección 1/-1) con alguna posición abierta, sin repetir."""
+        with self._lock:
+            pares = np.unique(np.stack([self.columnas["activo"][:self.n],
+                                        self.columnas["direccion"][:self.n].astype(np.int32)], axis=1), axis=0)
+            return [(self.activos[a], int(d)) for a, d in pares]
+
+    def _codigo(self, activo):
+        if activo not in self._codigos:
+            self._codigos[activo] = len(self.activos)
+            self.activos.append(activo)
+        return self._codigos[activo]
+
+    def _reservar(self, n):
+        capacidad = len(self.columnas["id"])
+        if self.n + n <= capacidad:
+            return
+        capacidad = max(2 * capacidad, self.n + n)
+        for campo, columna in self.columnas.items():
+            nueva = np.empty(capacidad, dtype=columna.dtype)
+            nueva[:self.n] = columna[:self.n]
+            self.columnas[campo] = nueva
+
+    def abrir(self, señales):
+        """
+        Empieza a seguir las señales registradas (con `id` del diario, SL, TP y
+        `fecha_vela`); las demás y las que ya se siguen se ignoran. Devuelve cuántas se abrieron.
+        """
+        validas = [s for s in señales
+                   if s.get("id") is not None and s.get("tipo") in ("BUY", "SELL")
+                   and not pd.isna(s.get("sl")) and not pd.isna(s.get("tp")) and not pd.isna(s.get("fecha_vela"))]
+        if not validas:
+            return 0
+        with self._lock:
+            ids = np.array([s["id"] for s in validas], dtype=np.int64)
+            nuevas = ~np.isin(ids, self.columnas["id"][:self.n])
+            validas = [s for s, nueva in zip(validas, nuevas) if nueva]
+            if not validas:
+                return 0
+            entrada = _ns([s["fecha_vela"] for s in validas])
+            valores = {
+                "id": ids[nuevas],
+                "activo": [self._codigo(s["activo"]) for s in validas],
+                "direccion": [1 if s["tipo"] == "BUY" else -1 for s in validas],
+                "precio": [s["precio"] for s in validas],
+                "sl": [s["sl"] for s in validas],
+                "tp": [s["tp"] for s in validas],
+                "entrada": entrada,
+                "hasta": entrada,
+                "velas": 0,
+            }
+            self._reservar(len(validas))
+            for campo, valor in valores.items():
+                self.columnas[campo][self.n:self.n + len(validas)] = valor
+            self.n += len(validas)
+        return len(validas)
+
+    def _panel(self, velas, desde, limite):
+        """Velas nuevas de cada activo (posteriores a `desde` y anteriores a `limite`), alineadas por fila."""
+        tramos = {}
+        for activo, df in velas.items():
+            codigo = self._codigos.get(activo)
+            if codigo is None or df is None or df.empty:
+                continue
+            fechas = _ns(df.index)
+            i = np.searchsorted(fechas, desde[codigo], side="right")
+            j = np.searchsorted(fechas, limite, side="left")
+            if j > i:
+                tramos[codigo] = (fechas, df, i, j)
+
+        ancho = max((j - i for _, _, i, j in tramos.values()), default=0)
+        fechas = np.full((len(self.activos), ancho), _SIN_VELA, dtype=np.int64)
+        panel = {col: np.full((len(self.activos), ancho), np.nan) for col in ("high", "low", "close")}
+        for codigo, (ts, df, i, j) in tramos.items():
+            fechas[codigo, :j - i] = ts[i:j]
+            for col, matriz in panel.items():
+                matriz[codigo, :j - i] = df[col].to_numpy(dtype=np.float64)[i:j]
+        return fechas, panel
+
+    def actualizar(self, velas, hasta=None):
+        """
+        Evalúa las velas de `velas` ({activo: DataFrame OHLC}) que empiezan antes de
+        `hasta` (las cerradas) y aún no se evaluaron. Quita las posiciones resueltas
+        y las devuelve como dicts (id, activo, tipo, estado TP/SL/EXPIRA, precio y
+        fecha de cierre, retorno y velas).
+        """
+        with self._lock:
+            n = self.n
+            if not n:
+                return []
+            c = {campo: columna[:n] for campo, columna in self.columnas.items()}
+            # Cada activo se lee desde la vela evaluada más antigua entre sus posiciones
+            desde = np.full(len(self.activos), np.iinfo(np.int64).max, dtype=np.int64)
+            np.minimum.at(desde, c["activo"], c["hasta"])
+            limite = np.iinfo(np.int64).max if hasta is None else _ns([hasta])[0]
+            fechas, panel = self._panel(velas, desde, limite)
+            ancho = fechas.shape[1]
+            if not ancho:
+                return []
+
+            # Matrices posiciones x velas nuevas de su activo
+            fechas = fechas[c["activo"]]
+            high, low, close = (panel[col][c["activo"]] for col in ("high", "low", "close"))
+            validas = fechas > c["hasta"][:, None]
+            numero = c["velas"][:, None] + np.cumsum(validas, axis=1)
+            validas &= numero <= self.horizonte
+
+            compra = (c["direccion"] == 1)[:, None]
+            sl, tp = c["sl"][:, None], c["tp"][:, None]
+            toca_tp = validas & np.where(compra, high >= tp, low <= tp)
+            toca_sl = validas & np.where(compra, low <= sl, high >= sl)
+            primer_tp = np.where(toca_tp.any(axis=1), toca_tp.argmax(axis=1), ancho)
+            primer_sl = np.where(toca_sl.any(axis=1), toca_sl.argmax(axis=1), ancho)
+            primero = np.minimum(primer_tp, primer_sl)
+
+            evaluadas = validas.sum(axis=1)
+            ultima = ancho - 1 - validas[:, ::-1].argmax(axis=1)
+            tocadas = primero < ancho
+            expiradas = ~tocadas & (c["velas"] + evaluadas >= self.horizonte)
+            cerradas = tocadas | expiradas
+
+            filas = np.arange(n)
+            columna = np.where(tocadas, primero, ultima)
+            c["hasta"][:] = np.where(evaluadas > 0, fechas[filas, ultima], c["hasta"])
+            c["velas"] += evaluadas.astype(np.int32)
+
+            resueltas = []
+            if cerradas.any():
+                idx = np.flatnonzero(cerradas)
+                col = columna[idx]
+                es_sl = primer_sl[idx] <= primer_tp[idx]
+                estado = np.where(tocadas[idx], np.where(es_sl, "SL", "TP"), "EXPIRA")
+                precio_cierre = np.where(tocadas[idx], np.where(es_sl, c["sl"][idx], c["tp"][idx]),
+                                         close[idx, col])
+                direccion = c["direccion"][idx]
+                retorno = direccion * (precio_cierre - c["precio"][idx]) / c["precio"][idx]
+                cierre = pd.to_datetime(fechas[idx, col], unit="ns")
+                velas_cierre = numero[idx, col]
+                resueltas = [
+                    {"id": int(c["id"][k]), "activo": self.activos[c["activo"][k]],
+                     "tipo": "BUY" if direccion[i] == 1 else "SELL", "estado": str(estado[i]),
+                     "precio_cierre": float(precio_cierre[i]), "fecha_cierre": cierre[i],
+                     "retorno": float(retorno[i]), "velas": int(velas_cierre[i])}
+                    for i, k in enumerate(idx)
+                ]
+
+                conservar = ~cerradas
+                self.n = int(conservar.sum())
+                for campo, columna_campo in self.columnas.items():
+                    columna_campo[:self.n] = columna_campo[:n][conservar]
+            return resueltas
+
+_seguimiento = None
+_lock_global = threading.Lock()
+
+def obtener_seguimiento():
+    """Seguimiento compartido por el proceso, retomado de las señales abiertas del diario."""
+    global _seguimiento
+    with _lock_global:
+        if _seguimiento is None:
+            horizonte = CONFIG.get("seguimiento", {}).get("horizonte", 30)
+            _seguimiento = SeguimientoPosiciones.desde_diario(obtener_diario(), horizonte)
+            if len(_seguimiento):
+                logger.info(f"📂 {len(_seguimiento)} posiciones abiertas retomadas del diario")
+        return _seguimiento
@@ -0,0 +1,429 @@
+# streaming.py
+
+import os
+import csv
+import json
+import time
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from cache_barras import intervalo_a_timedelta
+from indicadores_tecnicos import IndicadoresIncrementales, COLUMNAS_INDICADORES
+from config_activos import CONFIG
+
+load_dotenv()
+API_KEY = os.getenv("TWELVE_DATA_API_KEY")
+WS_URL = os.getenv("TWELVE_DATA_WS_URL", "wss://ws.twelvedata.com/v1/quotes/price")
+
+logger = logging.getLogger(__name__)
+
+# ============== Agregación de ticks ==============
+
+class AgregadorVelas:
+    """
+    Agrupa ticks en velas OHLC en memoria por ticker e intervalo. Las velas se
+    alinean a múltiplos UTC del intervalo, como `cache_barras.inicio_vela`. Una
+    vela se cierra al llegar un tick de la siguiente o, sin ticks, cuando el
+    reloj pasa su fin (`cerrar_vencidas`).
+    """
+
+    def __init__(self, intervalos):
+        self.pasos = {intervalo: int(intervalo_a_timedelta(intervalo).total_seconds()) for intervalo in intervalos}
+        self.abiertas = {}
+        self.ultimo_cierre = {}
+
+    def _vela(self, ticker, intervalo, datos):
+        inicio, o, h, l, c, ticks = datos
+        return {
+            "ticker": ticker, "intervalo": intervalo, "fecha": pd.Timestamp(inicio, unit="s"),
+            "open": o, "high": h, "low": l, "close": c, "ticks": ticks,
+        }
+
+    def sembrar(self, ticker, intervalo, fecha, o, h, l, c):
+        """Parte de la vela en curso tal como la devolvió la API REST (tras un backfill)."""
+        inicio = int(pd.Timestamp(fecha).timestamp())
+        actual = self.abiertas.get((ticker, intervalo))
+        if actual is not None and actual[0] == inicio:
+            actual[2], actual[3] = max(actual[2], h), min(actual[3], l)
+            return
+        self.abiertas[(ticker, intervalo)] = [inicio, o, h, l, c, 0]
+
+    def descartar_hasta(self, ticker, intervalo, fecha):
+        """Da por cerradas las velas hasta `fecha` (inclusive), ya cubiertas por el backfill."""
+        clave = (ticker, intervalo)
+        inicio = int(pd.Timestamp(fecha).timestamp())
+        self.ultimo_cierre[clave] = max(self.ultimo_cierre.get(clave, -1), inicio)
+        actual = self.abiertas.get(clave)
+        if actual is not None and actual[0] <= inicio:
+            del self.abiertas[clave]
+
+    def agregar(self, ticker, ts, precio):
+        """Incorpora un tick (epoch en segundos). Devuelve las velas que cerró."""
+        cerradas = []
+        for intervalo, paso in self.pasos.items():
+            clave = (ticker, intervalo)
+            inicio = int(ts) - int(ts) % paso
+            if inicio <= self.ultimo_cierre.get(clave, -1):
+                continue  # tick tardío de una vela ya cerrada
+            actual = self.abiertas.get(clave)
+            if actual is not None and actual[0] < inicio:
+                cerradas.append(self._cerrar(clave))
+                actual = None
+            if actual is None:
+                self.abiertas[clave] = [inicio, precio, precio, precio, precio, 1]
+            else:
+                actual[2] = max(actual[2], precio)
+                actual[3] = min(actual[3], precio)
+                actual[4] = precio
+                actual[5] += 1
+        return cerradas
+
+    def _cerrar(self, clave):
+        datos = self.abiertas.pop(clave)
+        self.ultimo_cierre[clave] = datos[0]
+        return self._vela(clave[0], clave[1], datos)
+
+    def cerrar_vencidas(self, ahora, gracia=0):
+        """Cierra las velas cuyo fin (+ `gracia` segundos para ticks tardíos) ya pasó."""
+        return [
+            self._cerrar(clave) for clave, datos in list(self.abiertas.items())
+            if datos[0] + self.pasos[clave[1]] + gracia <= ahora
+        ]
+
+    def proximo_cierre(self):
+        """Epoch del fin de la vela abierta más próxima a cerrar, o None."""
+        fines = [datos[0] + self.pasos[clave[1]] for clave, datos in self.abiertas.items()]
+        return min(fines) if fines else None
+
+# ============== Historia con indicadores incrementales ==============
+
+COLUMNAS_SERIE = ["open", "high", "low", "close"] + COLUMNAS_INDICADORES
+
+class SerieEnVivo:
+    """
+    Velas cerradas de un activo e intervalo con sus indicadores actualizados en O(1)
+    por vela. Como `buffer_velas.BufferVelas`, fechas y valores viven en arrays
+    reservados al crearla: cada vela se escribe a continuación y la ventana de
+    `max_velas` se compacta al inicio una vez cada `holgura` velas.
+    """
+
+    def __init__(self, nombre, ticker, intervalo, max_velas=400):
+        self.nombre = nombre
+        self.ticker = ticker
+        self.intervalo = intervalo
+        self.paso = intervalo_a_timedelta(intervalo)
+        self.max_velas = max_velas
+        self.indicadores = IndicadoresIncrementales()
+        espacio = max_velas + max(max_velas // 4, 16)
+        self.ts = np.empty(espacio, dtype=np.int64)
+        self.valores = np.empty((len(COLUMNAS_SERIE), espacio))
+        self.inicio = 0
+        self.fin = 0
+
+    def __len__(self):
+        return self.fin - self.inicio
+
+    def ultima_fecha(self):
+        return pd.Timestamp(self.ts[self.fin - 1]) if len(self) else None
+
+    def agregar_vela(self, fecha, o, h, l, c):
+        """Incorpora (o reemplaza, si es la última) una vela cerrada. False si es anterior a la última."""
+        fecha = pd.Timestamp(fecha)
+        if len(self) and fecha.value < self.ts[self.fin - 1]:
+            return False
+        valores = self.indicadores.actualizar(fecha, h, l, c)
+        if len(self) and fecha.value == self.ts[self.fin - 1]:
+            self.fin -= 1
+        elif self.fin == len(self.ts):
+            # Compactación: las últimas max_velas - 1 velas pasan al inicio
+            conservar = min(len(self), self.max_velas - 1)
+            desde = self.fin - conservar
+            self.ts[:conservar] = self.ts[desde:self.fin]
+            self.valores[:, :conservar] = self.valores[:, desde:self.fin]
+            self.inicio, self.fin = 0, conservar
+        self.ts[self.fin] = fecha.value
+        self.valores[:, self.fin] = [o, h, l, c] + [valores[col] for col in COLUMNAS_INDICADORES]
+        self.fin += 1
+        self.inicio = max(self.inicio, self.fin - self.max_velas)
+        return True
+
+    def instantanea(self):
+        """Copia de la ventana vigente como DataFrame, independiente de las velas que lleguen después."""
+        fechas = self.ts[self.inicio:self.fin].astype("datetime64[ns]")
+        # Un solo bloque copiado; el DataFrame lo adopta tal cual (columnas x velas)
+        bloque = self.valores[:, self.inicio:self.fin].copy()
+        return pd.DataFrame(bloque.T, index=pd.DatetimeIndex(fechas, name="datetime"), columns=COLUMNAS_SERIE)
+
+    def completar(self, df, ahora):
+        """
+        Incorpora el backfill REST: agrega las velas cerradas posteriores a la última
+        conocida (la última se reemplaza por si fue revisada) y devuelve la vela en
+        curso (Series) si la respuesta la incluye, para sembrar el agregador.
+        """
+        if df is None or df.empty:
+            return None
+        df = df.rename(columns=str.lower)
+        cerradas = df[df.index + self.paso <= ahora]
+        if len(self):
+            cerradas = cerradas[cerradas.index >= self.ultima_fecha()]
+        for fecha, fila in zip(cerradas.index, cerradas[["open", "high", "low", "close"]].to_numpy(float)):
+            self.agregar_vela(fecha, *fila)
+        en_curso = df[df.index + self.paso > ahora]
+        return en_curso.iloc[-1] if len(en_curso) else None
+
+# ============== Cliente WebSocket ==============
+
+class MotorStreaming:
+    """
+    Consume el WebSocket de precios de Twelve Data, agrega los ticks en velas por
+    intervalo y llama a `al_cerrar(nombre, intervalo, df)` con la historia
+    actualizada en cuanto cierra cada vela. Las velas cerradas se encolan y una sola
+    tarea las evalúa de a una en un hilo propio: la lectura del socket nunca espera
+    a la estrategia y dos velas no se evalúan a la vez. Se reconecta con backoff exponencial y,
+    tras cada (re)conexión, completa los huecos con la API REST (`descargar`,
+    por defecto `data_providers.obtener_datos_lote`).
+    """
+
+    def __init__(self, activos, intervalos, al_cerrar, url=None, api_key=None, descargar=None,
+                 periodo=None, gracia=2, reloj=time.time, grabar=None, max_velas=400):
+        self.activos = dict(activos)
+        self.nombres = {ticker: nombre for nombre, ticker in self.activos.items()}
+        self.intervalos = list(intervalos)
+        self.al_cerrar = al_cerrar
+        self.url = url or WS_URL
+        self.api_key = api_key or API_KEY
+        self.descargar = descargar
+        self.periodo = periodo or CONFIG["periodo"]
+        self.gracia = gracia
+        self.reloj = reloj
+        self.grabar = grabar
+        self.agregador = AgregadorVelas(self.intervalos)
+        self.series = {
+            (nombre, intervalo): SerieEnVivo(nombre, ticker, intervalo, max_velas)
+            for nombre, ticker in self.activos.items() for intervalo in self.intervalos
+        }
+        self.ticks = 0
+        self.velas_cerradas = 0
+        self.conexiones = 0
+        self._archivo = None
+        self._escritor = None
+        self._cola = None
+        self._ejecutor = None
+
+    # ----- Backfill -----
+
+    def completar_huecos(self):
+        """Pide por REST la historia de cada intervalo y la incorpora a las series."""
+        if self.descargar is None:
+            from data_providers import obtener_datos_lote
+            self.descargar = obtener_datos_lote
+
+        ahora = pd.Timestamp(self.reloj(), unit="s")
+        for intervalo in self.intervalos:
+            datos = self.descargar(list(self.activos.values()), intervalo, self.periodo)
+            for nombre, ticker in self.activos.items():
+                df = datos.get(ticker)
+                if df is None:
+                    logger.warning(f"⚠️ Sin backfill para {nombre} ({intervalo})")
+                    continue
+                serie = self.series[(nombre, intervalo)]
+                en_curso = serie.completar(df, ahora)
+                if len(serie):
+                    self.agregador.descartar_hasta(ticker, intervalo, serie.ultima_fecha())
+                if en_curso is not None:
+                    self.agregador.sembrar(ticker, intervalo, en_curso.name, *en_curso[["open", "high", "low", "close"]])
+        logger.info(f"📥 Backfill completado para {len(self.activos)} activos en {', '.join(self.intervalos)}")
+
+    # ----- Ticks y velas -----
+
+    def procesar_tick(self, ticker, ts, precio):
+        """Incorpora un tick y devuelve las (nombre, intervalo) cuya vela cerró."""
+        if ticker not in self.nombres:
+            return []
+        self.ticks += 1
+        if self._escritor is not None:
+            self._escritor.writerow([ticker, ts, precio])
+        return [self._vela_cerrada(vela) for vela in self.agregador.agregar(ticker, ts, precio)]
+
+    def cerrar_vencidas(self):
+        return [self._vela_cerrada(vela) for vela in self.agregador.cerrar_vencidas(self.reloj(), self.gracia)]
+
+    def _vela_cerrada(self, vela):
+        nombre = self.nombres[vela["ticker"]]
+        serie = self.series[(nombre, vela["intervalo"])]
+        serie.agregar_vela(vela["fecha"], vela["open"], vela["high"], vela["low"], vela["close"])
+        self.velas_cerradas += 1
+        logger.info(f"🕯️ Vela {vela['intervalo']} de {nombre} cerrada {vela['fecha']} "
+                    f"(O={vela['open']:.5f} H={vela['high']:.5f} L={vela['low']:.5f} C={vela['close']:.5f}, {vela['ticks']} ticks)")
+        return nombre, vela["intervalo"]
+
+    def _encolar(self, cerradas):
+        """Encola la historia (copia) de cada vela cerrada para la tarea que evalúa la estrategia."""
+        for nombre, intervalo in cerradas:
+            self._cola.put_nowait((nombre, intervalo, self.series[(nombre, intervalo)].instantanea()))
+        if self._cola.qsize() > len(self.series):
+            logger.warning(f"⚠️ {self._cola.qsize()} velas esperan evaluación: la estrategia no da abasto")
+
+    async def _evaluar_cerradas(self):
+        """Única consumidora de la cola: evalúa las velas en orden, de a una, en el hilo de la estrategia."""
+        loop = asyncio.get_running_loop()
+        while True:
+            nombre, intervalo, df = await self._cola.get()
+            try:
+                await loop.run_in_executor(self._ejecutor, self.al_cerrar, nombre, intervalo, df)
+            except Exception as e:
+                logger.error(f"❌ Error evaluando {nombre} ({intervalo}): {e}")
+            finally:
+                self._cola.task_done()
+
+    # ----- Conexión -----
+
+    async def _latido(self, ws):
+        while True:
+            await asyncio.sleep(10)
+            await ws.send(json.dumps({"action": "heartbeat"}))
+
+    async def _reloj_velas(self):
+        """Cierra velas sin ticks nuevos en cuanto vence su intervalo."""
+        while True:
+            proximo = self.agregador.proximo_cierre()
+            espera = 1.0 if proximo is None else min(max(proximo + self.gracia - self.reloj(), 0.05), 60.0)
+            await asyncio.sleep(espera)
+            self._encolar(self.cerrar_vencidas())
+
+    async def _sesion(self, ws):
+        await ws.send(json.dumps({"action": "subscribe", "params": {"symbols": ",".join(self.activos.values())}}))
+        tareas = [asyncio.create_task(self._latido(ws)), asyncio.create_task(self._reloj_velas())]
+        try:
+            async for mensaje in ws:
+                try:
+                    evento = json.loads(mensaje)
+                    tipo = evento.get("event")
+                    if tipo == "price":
+                        tick = evento["symbol"], int(evento["timestamp"]), float(evento["price"])
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    # Un frame mal formado o incompleto se descarta sin cortar el streaming
+                    logger.warning(f"⚠️ Mensaje del streaming inválido, se omite ({type(e).__name__}: {e}): "
+                                   f"{str(mensaje)[:200]!r}")
+                    continue
+                if tipo == "price":
+                    self._encolar(self.procesar_tick(*tick))
+                elif tipo == "subscribe-status":
+                    fallidos = [s.get("symbol") for s in evento.get("fails") or []]
+                    if fallidos:
+                        logger.warning(f"⚠️ Símbolos rechazados por el streaming: {fallidos}")
+                    else:
+                        logger.info(f"📡 Suscripción activa para {len(self.activos)} símbolos")
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+
+    async def ejecutar(self, max_conexiones=None, espera_base=1, espera_maxima=60):
+        """Bucle de conexión con reconexión y backfill. `max_conexiones` limita los intentos (pruebas)."""
+        import websockets
+
+        if self.grabar:
+            self._archivo = open(self.grabar, "a", newline="")
+            self._escritor = csv.writer(self._archivo)
+
+        loop = asyncio.get_running_loop()
+        # La cola sobrevive a las reconexiones: lo ya cerrado se evalúa igual
+        self._cola = asyncio.Queue()
+        self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="estrategia")
+        evaluacion = asyncio.create_task(self._evaluar_cerradas())
+        espera = espera_base
+        try:
+            while max_conexiones is None or self.conexiones < max_conexiones:
+                self.conexiones += 1
+                try:
+                    await loop.run_in_executor(None, self.completar_huecos)
+                    url = f"{self.url}?apikey={self.api_key}" if self.api_key else self.url
+                    async with websockets.connect(url, ping_interval=20) as ws:
+                        logger.info(f"🔌 Conectado al streaming de precios ({self.conexiones})")
+                        espera = espera_base
+                        await self._sesion(ws)
+                    logger.warning("⚠️ El servidor cerró el streaming")
+                except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                    logger.error(f"❌ Streaming desconectado: {e}")
+
+                # Al reconectar, el backfill reemplaza las velas perdidas durante el corte
+                if max_conexiones is None or self.conexiones < max_conexiones:
+                    logger.info(f"🔄 Reconectando en {espera}s...")
+                    await asyncio.sleep(espera)
+                    espera = min(espera * 2, espera_maxima)
+            await self._cola.join()
+        finally:
+            evaluacion.cancel()
+            self._ejecutor.shutdown(wait=True)
+            if self._archivo is not None:
+                self._archivo.close()
+
+# ============== Servidor local de reproducción ==============
+
+def cargar_ticks(ruta):
+    """Lee ticks grabados (ticker, epoch, precio) por `MotorStreaming(grabar=...)`."""
+    ticks = pd.read_csv(ruta, names=["ticker", "ts", "precio"])
+    return list(ticks.itertuples(index=False, name=None))
+
+async def servidor_replay(ticks, host="127.0.0.1", puerto=8765, velocidad=0.0, cerrar_al_terminar=True):
+    """
+    Sustituto local del WebSocket de Twelve Data que reproduce ticks grabados con
+    el mismo protocolo (subscribe, subscribe-status, price, heartbeat).
+    `velocidad` > 0 respeta los tiempos originales divididos por ese factor. Un
+    elemento de `ticks` que sea texto se envía tal cual (frames inválidos en pruebas).
+    Devuelve el servidor (usar con `async with` o `.close()`).
+    """
+    import websockets
+
+    async def atender(ws):
+        suscritos = set()
+        async for mensaje in ws:
+            peticion = json.loads(mensaje)
+            if peticion.get("action") == "subscribe":
+                suscritos = set(peticion["params"]["symbols"].split(","))
+                await ws.send(json.dumps({"event": "subscribe-status", "status": "ok",
+                                          "success": [{"symbol": s} for s in suscritos], "fails": []}))
+                break
+        previo = None
+        for tick in ticks:
+            if isinstance(tick, str):
+                await ws.send(tick)
+                continue
+            ticker, ts, precio = tick
+            if ticker not in suscritos:
+                continue
+            if velocidad and previo is not None:
+                await asyncio.sleep(max(ts - previo, 0) / velocidad)
+            previo = ts
+            await ws.send(json.dumps({"event": "price", "symbol": ticker, "timestamp": int(ts), "price": float(precio)}))
+        if cerrar_al_terminar:
+            await ws.close()
+        else:
+            await ws.wait_closed()
+
+    return await websockets.serve(atender, host, puerto)
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que reproduce ticks grabados")
+    parser.add_argument("ticks", help="CSV grabado con MotorStreaming(grabar=...)")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--velocidad", type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    async def servir():
+        servidor = await servidor_replay(cargar_ticks(args.ticks), puerto=args.puerto,
+                                         velocidad=args.velocidad, cerrar_al_terminar=False)
+        logger.info(f"🎞️ Reproduciendo {args.ticks} en ws://127.0.0.1:{args.puerto}")
+        await servidor.serve_forever()
+
+    asyncio.run(servir())
+
+if __name__ == "__main__":
+    main()
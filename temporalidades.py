@@ -0,0 +1,218 @@
+# temporalidades.py
+
+import numpy as np
+import pandas as pd
+
+from cache_barras import intervalo_a_timedelta
+
+def _es_calendario(intervalo):
+    return intervalo.endswith(("day", "week", "month"))
+
+def _validar(intervalo):
+    if _es_calendario(intervalo) and intervalo not in ("1day", "1week", "1month"):
+        raise ValueError(f"Temporalidad no soportada para derivar: {intervalo} (use 1day, 1week o 1month)")
+
+def _hora(alineacion):
+    horas, minutos = (alineacion or {}).get("hora", "00:00").split(":")
+    return pd.Timedelta(hours=int(horas), minutes=int(minutos))
+
+def etiquetas(indice, intervalo, alineacion=None):
+    """
+    Inicio (UTC, naive) de la vela de `intervalo` que contiene cada fecha de `indice`.
+    Las velas intradía se alinean a múltiplos UTC del intervalo, como las de la API
+    (`cache_barras.inicio_vela`). Las diarias, semanales y mensuales empiezan a la
+    `hora` local de `zona` de `alineacion` (p. ej. 17:00 de Nueva York, el cierre
+    de forex), respetando los cambios de horario.
+    """
+    _validar(intervalo)
+    indice = pd.DatetimeIndex(indice)
+    if not _es_calendario(intervalo):
+        paso = intervalo_a_timedelta(intervalo)
+        return indice.floor(pd.Timedelta(paso))
+
+    alineacion = alineacion or {}
+    zona = alineacion.get("zona", "UTC")
+    hora = _hora(alineacion)
+    # Reloj de pared local desplazado para que cada vela empiece a medianoche
+    pared = indice.tz_localize("UTC").tz_convert(zona).tz_localize(None) - hora
+    if intervalo == "1day":
+        inicio = pared.floor("D")
+    elif intervalo == "1week":
+        inicio = pared.floor("D") - pd.to_timedelta(pared.dayofweek, unit="D")
+    else:
+        inicio = pared.to_period("M").to_timestamp()
+    inicio = (inicio + hora).tz_localize(zona, ambiguous=True, nonexistent="shift_forward")
+    return inicio.tz_convert("UTC").tz_localize(None)
+
+def fin_vela(inicio, intervalo, alineacion=None):
+    """Fin (UTC, naive) de la vela de `intervalo` que empieza en `inicio`."""
+    inicio = pd.Timestamp(inicio)
+    if not _es_calendario(intervalo):
+        return inicio + pd.Timedelta(intervalo_a_timedelta(intervalo))
+    zona = (alineacion or {}).get("zona", "UTC")
+    local = inicio.tz_localize("UTC").tz_convert(zona).tz_localize(None)
+    siguiente = local + {"1day": pd.DateOffset(days=1), "1week": pd.DateOffset(weeks=1),
+                         "1month": pd.DateOffset(months=1)}[intervalo]
+    siguiente = siguiente.tz_localize(zona, ambiguous=True, nonexistent="shift_forward")
+    return siguiente.tz_convert("UTC").tz_localize(None)
+
+def _sin_anidar(indice, paso_base, intervalo, alineacion):
+    """Velas base de `indice` que cruzan el límite de una vela de `intervalo`."""
+    inicio = etiquetas(indice, intervalo, alineacion)
+    return inicio, inicio != etiquetas(indice + paso_base - pd.Timedelta(seconds=1), intervalo, alineacion)
+
+def validar_anidamiento(intervalo_base, intervalos, alineacion=None):
+    """
+    Comprueba (al iniciar, no en cada ciclo) que las velas de `intervalo_base` anidan
+    en cada uno de `intervalos` con la `alineacion` dada, probando un año de velas
+    base para cubrir los cambios de horario. Lanza ValueError con la primera vela
+    que cruza un límite y qué cambiar en la configuración.
+    """
+    paso_base = pd.Timedelta(intervalo_a_timedelta(intervalo_base))
+    for intervalo in intervalos:
+        if intervalo == intervalo_base:
+            continue
+        _validar(intervalo)
+        if not _es_calendario(intervalo) and pd.Timedelta(intervalo_a_timedelta(intervalo)) < paso_base:
+            raise ValueError(f"{intervalo} es más fino que la temporalidad base {intervalo_base}")
+        # Año completo desde un lunes a las 00:00 UTC, alineado a la base como las velas de la API
+        prueba = pd.date_range("2024-01-01", "2025-01-01", freq=paso_base, inclusive="left")
+        _, cruzan = _sin_anidar(prueba, paso_base, intervalo, alineacion)
+        if cruzan.any():
+            raise ValueError(
+                f"Las velas de {intervalo_base} no anidan en {intervalo} con la alineación {alineacion} "
+                f"(p. ej. la de {prueba[np.argmax(cruzan)]} UTC): use una `base` más fina (p. ej. 1h) "
+                f"o una alineación en un múltiplo UTC de {intervalo_base}"
+            )
+
+def remuestrear(df, intervalo, intervalo_base, alineacion=None):
+    """
+    Agrega velas de `intervalo_base` en velas de `intervalo`: open de la primera,
+    high máximo, low mínimo, close de la última y volumen sumado. Lanza ValueError
+    si alguna vela base cruza el límite de una vela destino (p. ej. velas de 4h
+    alineadas a UTC contra días que empiezan a las 17:00 de Nueva York).
+    Devuelve el DataFrame derivado y, para la última vela, si ya está completa.
+    """
+    paso_base = pd.Timedelta(intervalo_a_timedelta(intervalo_base))
+    if df is None or df.empty:
+        return df, False
+    if not _es_calendario(intervalo) and pd.Timedelta(intervalo_a_timedelta(intervalo)) < paso_base:
+        raise ValueError(f"{intervalo} es más fino que la temporalidad base {intervalo_base}")
+
+    df = df.rename(columns=str.lower)
+    inicio, cruzan = _sin_anidar(df.index, paso_base, intervalo, alineacion)
+    if cruzan.any():
+        raise ValueError(f"Las velas de {intervalo_base} no anidan en {intervalo} con la alineación {alineacion}")
+
+    valores = inicio.asi8
+    cortes = np.flatnonzero(np.r_[True, valores[1:] != valores[:-1]])
+    finales = np.r_[cortes[1:], len(df)] - 1
+    salida = {
+        "open": df["open"].to_numpy(float)[cortes],
+        "high": np.maximum.reduceat(df["high"].to_numpy(float), cortes),
+        "low": np.minimum.reduceat(df["low"].to_numpy(float), cortes),
+        "close": df["close"].to_numpy(float)[finales],
+    }
+    if "volume" in df.columns:
+        salida["volume"] = np.add.reduceat(df["volume"].to_numpy(float), cortes)
+    derivado = pd.DataFrame(salida, index=pd.DatetimeIndex(inicio[cortes], name="datetime"))
+
+    completa = df.index[-1] + paso_base >= fin_vela(derivado.index[-1], intervalo, alineacion)
+    return derivado, bool(completa)
+
+class SerieMultiTemporal:
+    """
+    Serie base de un activo (la temporalidad más fina, la única que se descarga)
+    y sus temporalidades derivadas. Cada `actualizar` solo vuelve a agregar las
+    velas destino que tocan las velas base nuevas o revisadas.
+    """
+
+    def __init__(self, intervalo_base, intervalos=(), alineacion=None):
+        self.intervalo_base = intervalo_base
+        self.paso_base = pd.Timedelta(intervalo_a_timedelta(intervalo_base))
+        self.alineacion = alineacion
+        self.base = None
+        self.derivadas = {}
+        self.completas = {}
+        for intervalo in intervalos:
+            self.agregar_temporalidad(intervalo)
+
+    def agregar_temporalidad(self, intervalo):
+        if intervalo == self.intervalo_base or intervalo in self.derivadas:
+            return
+        _validar(intervalo)
+        self.derivadas[intervalo] = None
+        self.completas[intervalo] = False
+        if self.base is not None:
+            self._recalcular(intervalo, self.base.index[0])
+
+    def _recalcular(self, intervalo, desde):
+        """Vuelve a agregar desde la vela destino que contiene `desde`."""
+        inicio = etiquetas(pd.DatetimeIndex([desde]), intervalo, self.alineacion)[0]
+        previo = self.derivadas[intervalo]
+        cola, completa = remuestrear(self.base[self.base.index >= inicio], intervalo, self.intervalo_base,
+                                     self.alineacion)
+        if previo is not None and len(previo):
+            cola = pd.concat([previo[previo.index < inicio], cola])
+        # Lo anterior a la ventana base se descarta; sin la primera vela base de su
+        # período, la primera vela derivada está incompleta y también
+        primera = etiquetas(self.base.index[:1], intervalo, self.alineacion)[0]
+        cola = cola[cola.index > primera] if primera < self.base.index[0] else cola[cola.index >= primera]
+        self.derivadas[intervalo] = cola
+        self.completas[intervalo] = completa
+
+    def actualizar(self, df, reemplazar=False):
+        """
+        Incorpora velas base: las de `df` reemplazan a las guardadas desde su primera
+        fecha y lo anterior se conserva. Con `reemplazar`, `df` es la ventana completa
+        (lo anterior se descarta) pero solo se reagrega desde la primera vela que cambia.
+        """
+        if df is None or df.empty:
+            return self
+        # Copia propia: `df` puede ser una vista de un buffer que se sobrescribe
+        df = df.rename(columns=str.lower).sort_index().copy()
+        if self.base is None:
+            self.base = df
+            desde = df.index[0]
+        else:
+            # Primera vela que cambia respecto de lo guardado (la última se suele revisar)
+            comunes = self.base.index.intersection(df.index)
+            iguales = (self.base.loc[comunes, ["open", "high", "low", "close"]]
+                       .eq(df.loc[comunes, ["open", "high", "low", "close"]]).all(axis=1))
+            distintas = comunes[~iguales.to_numpy()]
+            nuevas = df.index.difference(self.base.index)
+            cambios = distintas.append(nuevas)
+            recorte = reemplazar and df.index[0] > self.base.index[0]
+            if reemplazar or df.index[0] <= self.base.index[0]:
+                self.base = df
+            else:
+                self.base = pd.concat([self.base[self.base.index < df.index[0]], df])
+            if len(cambios):
+                desde = cambios.min()
+            elif recorte:
+                desde = self.base.index[0]
+            else:
+                return self
+
+        for intervalo in self.derivadas:
+            self._recalcular(intervalo, desde)
+        return self
+
+    def obtener(self, intervalo, incluir_parcial=True):
+        """
+        Copia de las velas de `intervalo` (la base o una derivada), que el llamador
+        puede modificar; sin `incluir_parcial` se omite la vela derivada en curso.
+        """
+        if intervalo == self.intervalo_base:
+            return None if self.base is None else self.base.copy()
+        if intervalo not in self.derivadas:
+            self.agregar_temporalidad(intervalo)
+        df = self.derivadas[intervalo]
+        if df is None:
+            return None
+        if not incluir_parcial and not self.completas[intervalo]:
+            df = df.iloc[:-1]
+        return df.copy()
+
+    def obtener_varias(self, intervalos, incluir_parcial=True):
+        return {intervalo: self.obtener(intervalo, incluir_parcial) for intervalo in intervalos}
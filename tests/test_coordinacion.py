@@ -0,0 +1,102 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config_activos import CONFIG
+from coordinacion import AlmacenSQLite, AnilloConsistente, Coordinador
+from correlacion_activos import MatrizCorrelacion
+from planificador import Planificador
+
+CIERRE = datetime(2024, 1, 3, 8)
+PENDIENTES = {nombre: (ticker, CIERRE) for nombre, ticker in CONFIG["activos"].items()}
+
+def _coordinadores(tmp_path, reloj):
+    almacen = AlmacenSQLite(str(tmp_path / "coordinacion.db"))
+    return [Coordinador(almacen, worker, ttl=30, reloj=reloj, hilo=False) for worker in ("a", "b")]
+
+def test_dos_workers_se_reparten_los_activos_por_el_anillo(tmp_path):
+    a, b = _coordinadores(tmp_path, lambda: 1000.0)
+    a.latir()
+    de_a, de_b = a.asignados(PENDIENTES), b.asignados(PENDIENTES)
+    assert de_a and de_b
+    assert set(de_a).isdisjoint(de_b) and set(de_a) | set(de_b) == set(PENDIENTES)
+    anillo = AnilloConsistente(["a", "b"])
+    assert all(anillo.asignar(nombre) == "a" for nombre in de_a)
+
+def test_vela_tomada_o_completada_no_se_evalua_dos_veces(tmp_path):
+    ahora = [1000.0]
+    a, b = _coordinadores(tmp_path, lambda: ahora[0])
+    a.latir()
+    reclamados = a.reclamar(PENDIENTES)
+    assert reclamados == a.asignados(PENDIENTES)
+    assert a.reclamar(PENDIENTES) == reclamados  # el lease propio es reentrante
+
+    # Aunque el anillo de b le asigne todo (p. ej. durante un cambio de workers), los leases de a lo excluyen
+    b.anillo = AnilloConsistente(["b"])
+    assert set(b.reclamar(PENDIENTES)).isdisjoint(reclamados)
+
+    a.completar(reclamados)
+    ahora[0] += 60  # vencido el latido de a, sus velas completadas siguen sin poder tomarse
+    b.latir()
+    assert set(b.reclamar(PENDIENTES)).isdisjoint(reclamados)
+
+def test_activos_de_un_worker_sin_latido_pasan_al_sobreviviente(tmp_path):
+    ahora = [1000.0]
+    a, b = _coordinadores(tmp_path, lambda: ahora[0])
+    a.latir()
+    de_a = a.asignados(PENDIENTES)
+    a.reclamar(PENDIENTES)
+
+    ahora[0] += 20
+    assert b.latir() == ["a", "b"]
+    ahora[0] += 11  # a dejó de latir hace más de `ttl`
+    assert b.latir() == ["b"]
+    assert b.asignados(PENDIENTES) == PENDIENTES
+    assert set(de_a) <= set(b.reclamar(PENDIENTES))
+
+def test_ciclo_fallido_suelta_los_leases(tmp_path):
+    a, b = _coordinadores(tmp_path, lambda: 1000.0)
+    a.latir()
+
+    def ciclo(activos):
+        raise RuntimeError("fallo del ciclo")
+
+    planificador = Planificador(CONFIG["activos"], "4h", asentamiento=0, reloj=lambda: CIERRE,
+                                dormir=lambda segundos: None, coordinador=a)
+    planificador.ejecutar(ciclo, max_ciclos=1)
+    assert not a._leases and not planificador.evaluadas
+    # Los activos de a quedan libres para quien el anillo se los asigne
+    b.anillo = AnilloConsistente(["b"])
+    assert set(b.reclamar(planificador.pendientes(CIERRE))) >= set(a.asignados(PENDIENTES))
+
+def test_exposiciones_compartidas_vencen_y_excluyen_las_propias(tmp_path):
+    ahora = [1000.0]
+    a, b = _coordinadores(tmp_path, lambda: ahora[0])
+    a.publicar_exposiciones([("EURUSD", 1), ("BTC", -1)], ttl=60)
+    b.publicar_exposiciones([("GBPJPY", 1)], ttl=60)
+    assert b.exposiciones_ajenas() == [("BTC", -1), ("EURUSD", 1)]
+    assert a.exposiciones_ajenas() == [("GBPJPY", 1)]
+    ahora[0] += 61
+    assert b.exposiciones_ajenas() == []
+
+def test_seccion_exclusiva_entre_workers_filtra_pares_de_otro_shard(tmp_path):
+    a, b = _coordinadores(tmp_path, lambda: 1000.0)
+    with a.exclusivo("cartera") as tomado:
+        assert tomado
+        with b.exclusivo("cartera", espera=0.1) as ajeno:
+            assert not ajeno
+    with b.exclusivo("cartera", espera=0) as tomado:
+        assert tomado
+
+    # Dos activos casi idénticos: la señal del worker b repite la apuesta publicada por a
+    fechas = pd.date_range("2024-01-01", periods=200, freq="4h")
+    precios = np.cumprod(1 + np.random.default_rng(0).normal(0, 0.01, len(fechas)))
+    matriz = MatrizCorrelacion(ventana=50, min_observaciones=10)
+    matriz.actualizar({"EURUSD": pd.DataFrame({"close": precios}, index=fechas),
+                       "GBPUSD": pd.DataFrame({"close": precios * 1.3}, index=fechas)})
+    matriz.aplicar()
+    a.publicar_exposiciones([("EURUSD", 1)], ttl=60)
+    aceptadas, suprimidas = matriz.filtrar([{"activo": "GBPUSD", "tipo": "BUY", "confianza": 0.9}], 0.8,
+                                           b.exposiciones_ajenas())
+    assert aceptadas == [] and suprimidas[0]["correlacionada_con"] == "EURUSD"
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_providers
+import limitador_api
+import proveedores_datos
+from datos_sinteticos import ServidorProveedores, generar_ohlcv
+from proveedores_datos import CadenaProveedores, TwelveData
+
+TICKERS = ["EUR/USD", "GBP/JPY", "BTC/USD"]
+
+@pytest.fixture
+def servidor(monkeypatch):
+    # Respuestas grabadas de Twelve Data servidas en local, sin presupuesto de API ni cache
+    monkeypatch.setattr(limitador_api, "_limitador", limitador_api.APIRateLimiter(10 ** 9, 1))
+    monkeypatch.setattr(proveedores_datos, "_sesion", None)
+    series = {ticker: generar_ohlcv(500, "cripto" if ticker == "BTC/USD" else "forex", indice=i)
+              for i, ticker in enumerate(TICKERS)}
+    with ServidorProveedores(series) as servidor:
+        monkeypatch.setattr(proveedores_datos, "_cadena",
+                            CadenaProveedores([TwelveData("clave", servidor.url)], cobertura=False))
+        yield servidor
+
+def _comprobar(servidor, ticker, df, periodo="60d"):
+    esperado = servidor.series[ticker]
+    esperado = esperado[esperado.index >= df.index[0]]
+    assert df.index[0] >= pd.Timestamp.now("UTC").tz_localize(None) - pd.Timedelta(periodo.replace("d", "D"))
+    np.testing.assert_array_equal(df.index, esperado.index)
+    np.testing.assert_allclose(df["close"].to_numpy(), esperado["close"].to_numpy(), atol=1e-4)
+
+def test_lote_separa_la_respuesta_de_varios_simbolos(servidor):
+    datos = data_providers.obtener_datos_lote(TICKERS, "4h", "60d", usar_cache=False)
+    # Una sola petición con los símbolos separados por comas
+    assert servidor.peticiones["twelve_data"] == 1
+    assert list(datos) == TICKERS
+    for ticker in TICKERS:
+        _comprobar(servidor, ticker, datos[ticker])
+    assert not datos["EUR/USD"]["close"].equals(datos["GBP/JPY"]["close"])
+
+def test_error_de_un_simbolo_no_afecta_al_resto_del_lote(servidor):
+    datos = data_providers.obtener_datos_lote(["EUR/USD", "XXX/YYY", "BTC/USD"], "4h", "60d", usar_cache=False)
+    assert servidor.peticiones["twelve_data"] == 1
+    assert datos["XXX/YYY"] is None
+    _comprobar(servidor, "EUR/USD", datos["EUR/USD"])
+    _comprobar(servidor, "BTC/USD", datos["BTC/USD"])
+
+def test_un_solo_simbolo_usa_la_respuesta_sin_anidar(servidor):
+    datos = data_providers.obtener_datos_lote(["GBP/JPY"], "4h", "60d", usar_cache=False)
+    assert servidor.peticiones["twelve_data"] == 1
+    _comprobar(servidor, "GBP/JPY", datos["GBP/JPY"])
+    _comprobar(servidor, "GBP/JPY", data_providers.obtener_datos("GBP/JPY", "4h", "60d", usar_cache=False))
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from dataset_particionado import DatasetParticionado
+
+TIPOS = {"close": "float32", "rsi": "float32"}
+
+def _sobre_mapeo(columna):
+    base = columna.to_numpy()
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    return base is not None
+
+def test_una_particion_se_lee_sin_copia_y_varias_se_concatenan(tmp_path):
+    dataset = DatasetParticionado(str(tmp_path))
+    fechas = pd.date_range("2024-06-01", "2025-03-01", freq="4h")
+    df = pd.DataFrame({"close": np.arange(len(fechas), dtype=float), "rsi": 50.0}, index=fechas)
+    dataset.escribir("EURUSD", df, TIPOS)
+
+    anio = dataset.leer(["close"], desde="2024-01-01", hasta="2024-12-31")
+    assert _sobre_mapeo(anio["close"])
+    np.testing.assert_array_equal(anio.index, fechas[fechas.year == 2024])
+    assert (anio["Activo"] == "EURUSD").all()
+
+    todo = dataset.leer()
+    assert not _sobre_mapeo(todo["close"])
+    np.testing.assert_array_equal(todo.index, fechas)
+    np.testing.assert_array_equal(todo["close"], df["close"].astype("float32"))
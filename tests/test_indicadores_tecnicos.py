@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from datos_sinteticos import generar_ohlcv
+from indicadores_tecnicos import (COLUMNAS_INDICADORES, IndicadoresIncrementales, actualizar_indicadores_lote,
+                                  calcular_indicadores)
+
+FIN = pd.Timestamp("2024-06-28 20:00")
+
+def _referencia(df):
+    return calcular_indicadores(df.copy())[COLUMNAS_INDICADORES].to_numpy()
+
+def _incremental(estado, df):
+    return np.array([[estado.actualizar(fecha, h, l, c)[col] for col in COLUMNAS_INDICADORES]
+                     for fecha, h, l, c in zip(df.index, df["high"], df["low"], df["close"])])
+
+@pytest.mark.parametrize("regimen", ["forex", "cripto"])
+def test_incremental_identico_a_calcular_indicadores(regimen):
+    df = generar_ohlcv(500, regimen, semilla=3, fin=FIN)
+    np.testing.assert_array_equal(_incremental(IndicadoresIncrementales(), df), _referencia(df))
+
+def test_revision_de_la_ultima_vela():
+    df = generar_ohlcv(300, "forex", semilla=5, fin=FIN)
+    estado = IndicadoresIncrementales.desde_historia(df)
+    revisada = df.copy()
+    revisada.iloc[-1, revisada.columns.get_loc("close")] *= 1.002
+    revisada.iloc[-1, revisada.columns.get_loc("high")] *= 1.003
+    valores = estado.actualizar_df(revisada)
+    np.testing.assert_array_equal([valores[col] for col in COLUMNAS_INDICADORES], _referencia(revisada)[-1])
+
+def test_estado_serializado_continua_identico():
+    df = generar_ohlcv(400, "cripto", semilla=7, fin=FIN)
+    estado = IndicadoresIncrementales.desde_historia(df.iloc[:250])
+    retomado = IndicadoresIncrementales.desde_dict(json.loads(json.dumps(estado.a_dict())))
+    # La vela 249 se repite como revisada: el estado previo también debe sobrevivir al reinicio
+    siguientes = _incremental(retomado, df.iloc[249:])
+    np.testing.assert_array_equal(siguientes, _referencia(df)[249:])
+
+def test_lote_continua_la_historia():
+    df = generar_ohlcv(600, "forex", semilla=11, fin=FIN)
+    historias = {}
+    primero, cambiados = actualizar_indicadores_lote({"A": df.iloc[:400].copy()}, historias)
+    np.testing.assert_array_equal(primero["A"][COLUMNAS_INDICADORES].to_numpy(), _referencia(df.iloc[:400]))
+    assert cambiados == ["A"]
+
+    # Misma ventana: nada cambia
+    _, cambiados = actualizar_indicadores_lote({"A": df.iloc[:400].copy()}, historias)
+    assert cambiados == []
+
+    # La ventana avanza 50 velas (se descartan las más antiguas): solo se calculan las nuevas
+    ventana = df.iloc[50:450].copy()
+    segundo, cambiados = actualizar_indicadores_lote({"A": ventana}, historias)
+    np.testing.assert_array_equal(segundo["A"][COLUMNAS_INDICADORES].to_numpy(), _referencia(df.iloc[:450])[50:])
+    assert cambiados == ["A"]
+
+def test_estado_persistido_junto_a_la_cache(tmp_path, monkeypatch):
+    import data_providers
+    import indicadores_tecnicos
+    from cache_barras import AlmacenBarras
+
+    monkeypatch.setattr(data_providers, "_almacen", AlmacenBarras(str(tmp_path)))
+    monkeypatch.setattr(data_providers, "_indicadores", {})
+    df = generar_ohlcv(500, "forex", semilla=13, fin=FIN)
+    data_providers.obtener_indicadores_lote({"EUR/USD": df.iloc[:300].copy()}, "4h")
+
+    # Reinicio del bot: el estado se retoma del disco y solo se calculan las velas nuevas
+    data_providers._indicadores.clear()
+
+    def sin_recalcular(*args, **kwargs):
+        raise AssertionError("la ventana debía continuar el estado guardado")
+    monkeypatch.setattr(indicadores_tecnicos, "calcular_indicadores_panel", sin_recalcular)
+    resultado = data_providers.obtener_indicadores_lote({"EUR/USD": df.iloc[:320].copy()}, "4h")
+    np.testing.assert_array_equal(resultado["EUR/USD"][COLUMNAS_INDICADORES].to_numpy(), _referencia(df.iloc[:320]))
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+from planificador import Planificador
+
+ACTIVOS = {"EURUSD": "EUR/USD", "GBPJPY": "GBP/JPY", "BTC": "BTC/USD"}
+MERCADOS = {
+    "forex": {"apertura": "dom 17:00", "cierre": "vie 17:00", "zona": "America/New_York"},
+    "cripto": {"siempre_abierto": True, "activos": ["BTC"]},
+}
+
+class Reloj:
+    """Reloj falso: `dormir` avanza la hora en lugar de esperar."""
+
+    def __init__(self, ahora):
+        self.ahora = ahora
+        self.esperas = []
+
+    def __call__(self):
+        return self.ahora
+
+    def dormir(self, segundos):
+        self.esperas.append(segundos)
+        self.ahora += timedelta(seconds=segundos)
+
+def test_despierta_en_el_cierre_mas_el_asentamiento():
+    planificador = Planificador(ACTIVOS, "4h", MERCADOS, asentamiento=30)
+    # Miércoles: la vela de 08:00 solo cuenta como cerrada tras el asentamiento
+    assert planificador.ultimo_cierre("EURUSD", datetime(2024, 1, 3, 8, 0, 10)) == datetime(2024, 1, 3, 4)
+    assert planificador.ultimo_cierre("EURUSD", datetime(2024, 1, 3, 8, 0, 30)) == datetime(2024, 1, 3, 8)
+    assert planificador.proximo_despertar(datetime(2024, 1, 3, 9, 15)) == datetime(2024, 1, 3, 12, 0, 30)
+
+def test_fin_de_semana_omite_forex_y_evalua_cripto():
+    planificador = Planificador(ACTIVOS, "4h", MERCADOS, asentamiento=30)
+    assert list(planificador.pendientes(datetime(2024, 1, 6, 12, 0, 30))) == ["BTC"]
+    # La vela del viernes que cierra a las 20:00 UTC todavía operó (cierre de forex 17:00 NY = 22:00 UTC)
+    assert set(planificador.pendientes(datetime(2024, 1, 5, 20, 0, 30))) == set(ACTIVOS)
+
+def test_ordena_por_cierre_mas_reciente():
+    mercados = {"temprano": {"siempre_abierto": True, "activos": ["EURUSD", "GBPJPY"]},
+                "tardio": {"siempre_abierto": True, "desfase_velas": 60, "activos": ["BTC"]}}
+    planificador = Planificador(ACTIVOS, "4h", mercados, asentamiento=0)
+    pendientes = planificador.pendientes(datetime(2024, 1, 3, 9, 30))
+    assert list(pendientes) == ["BTC", "EURUSD", "GBPJPY"]
+    assert pendientes["BTC"][1] == datetime(2024, 1, 3, 9) and pendientes["EURUSD"][1] == datetime(2024, 1, 3, 8)
+
+def test_un_ciclo_fallido_no_detiene_el_bucle_y_se_reintenta():
+    reloj = Reloj(datetime(2024, 1, 3, 8, 0, 30))
+    llamadas = []
+
+    def ciclo(activos):
+        llamadas.append(dict(activos))
+        if len(llamadas) == 1:
+            raise RuntimeError("fallo del ciclo")
+
+    planificador = Planificador(ACTIVOS, "4h", MERCADOS, asentamiento=30, reloj=reloj, dormir=reloj.dormir,
+                                reintento=60)
+    planificador.ejecutar(ciclo, max_ciclos=2)
+    # La vela de 08:00 se reintenta al minuto, no al próximo cierre, y luego se espera el de 12:00
+    assert llamadas == [ACTIVOS, ACTIVOS]
+    assert reloj.esperas[0] == 60
+    assert planificador.evaluadas == dict.fromkeys(ACTIVOS, datetime(2024, 1, 3, 8))
+    assert reloj.ahora == datetime(2024, 1, 3, 12, 0, 30)
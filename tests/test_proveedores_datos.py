@@ -0,0 +1,76 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import limitador_api
+import proveedores_datos
+from datos_sinteticos import ServidorProveedores, generar_ohlcv
+from proveedores_datos import Alpaca, CadenaProveedores, TwelveData
+
+TICKERS = ["EUR/USD", "BTC/USD"]
+FIN = pd.Timestamp("2025-06-02 00:00")
+
+@pytest.fixture
+def servidor(monkeypatch):
+    # Sin presupuesto de API ni sesión previa: todas las peticiones van al servidor local
+    monkeypatch.setattr(limitador_api, "_limitador", limitador_api.APIRateLimiter(10 ** 9, 1))
+    monkeypatch.setitem(limitador_api._limitadores, "alpaca", limitador_api.APIRateLimiter(10 ** 9, 1))
+    monkeypatch.setattr(proveedores_datos, "_sesion", None)
+    series = {ticker: generar_ohlcv(350, "cripto" if ticker == "BTC/USD" else "forex", indice=i, fin=FIN)
+              for i, ticker in enumerate(TICKERS)}
+    with ServidorProveedores(series) as servidor:
+        yield servidor
+
+def _alpaca(servidor, limite_pagina=10000):
+    return Alpaca("clave", "secreto", servidor.url, limite_pagina=limite_pagina, cripto={"BTC/USD"})
+
+def _comprobar(servidor, velas, tickers=TICKERS):
+    for ticker in tickers:
+        esperado = servidor.series[ticker]
+        buffer = velas[ticker]
+        assert buffer is not None and len(buffer) == len(esperado)
+        np.testing.assert_array_equal(pd.DatetimeIndex(buffer.fechas()), esperado.index)
+        np.testing.assert_allclose(buffer.bloque()[3], esperado["close"].to_numpy(), atol=1e-4)
+
+def _rango(servidor):
+    fechas = servidor.series[TICKERS[0]].index
+    return fechas[0].to_pydatetime(), fechas[-1].to_pydatetime()
+
+def test_twelve_data_pagina_hacia_atras(servidor, monkeypatch):
+    monkeypatch.setattr(proveedores_datos, "TAMANO_PAGINA_TWELVE", 100)
+    velas = TwelveData("clave", servidor.url).descargar(TICKERS, "4h", *_rango(servidor))
+    _comprobar(servidor, velas)
+    # Un lote y tres páginas anteriores por símbolo
+    assert servidor.peticiones["twelve_data"] == 1 + 2 * 3
+
+def test_alpaca_sigue_next_page_token(servidor):
+    velas = _alpaca(servidor, limite_pagina=64).descargar(TICKERS, "4h", *_rango(servidor))
+    _comprobar(servidor, velas)
+    # Forex y cripto van por rutas distintas, cada una en páginas de 64 barras
+    assert servidor.peticiones["alpaca"] == 2 * int(np.ceil(350 / 64))
+
+@pytest.mark.parametrize("falla", ["estado", "malformado"])
+def test_conmuta_al_siguiente_proveedor(servidor, falla):
+    if falla == "estado":
+        servidor.estado["twelve_data"] = 500
+    else:
+        servidor.malformado.add("twelve_data")
+    cadena = CadenaProveedores([TwelveData("clave", servidor.url), _alpaca(servidor)], cobertura=False)
+    _comprobar(servidor, cadena.descargar(TICKERS, "4h", *_rango(servidor)))
+    assert servidor.peticiones["alpaca"] == 2
+
+def test_respuesta_inesperada_de_alpaca_no_aborta_la_cadena(servidor):
+    servidor.malformado.add("alpaca")
+    cadena = CadenaProveedores([_alpaca(servidor), TwelveData("clave", servidor.url)], cobertura=False)
+    _comprobar(servidor, cadena.descargar(TICKERS, "4h", *_rango(servidor)))
+
+def test_cubre_al_proveedor_lento(servidor):
+    servidor.latencia["twelve_data"] = 1.5
+    cadena = CadenaProveedores([TwelveData("clave", servidor.url), _alpaca(servidor)], espera=0.1)
+    inicio = time.perf_counter()
+    velas = cadena.descargar(TICKERS, "4h", *_rango(servidor))
+    assert time.perf_counter() - inicio < 1.0
+    _comprobar(servidor, velas)
+    assert servidor.peticiones["twelve_data"] == 1 and servidor.peticiones["alpaca"] == 2
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from datos_sinteticos import generar_ohlcv
+from rangos_sesion import IndiceSesiones, cargar_sesiones, mascara_sesion
+
+SESIONES = {
+    "Noche": {"inicio": "22:00", "fin": "04:00", "zona": "UTC"},
+    "NY": {"inicio": "09:00", "fin": "16:00", "zona": "America/New_York"},
+}
+
+def _rango_bruto(df, sesion, dias=None, desde=None):
+    inicio, fin, zona = cargar_sesiones(SESIONES)[sesion]
+    mascara, dia = mascara_sesion(df.index, inicio, fin, zona)
+    por_dia = pd.DataFrame({"high": df["high"].to_numpy()[mascara], "low": df["low"].to_numpy()[mascara]},
+                           index=dia[mascara]).groupby(level=0).agg({"high": "max", "low": "min"})
+    if desde is not None:
+        por_dia = por_dia[por_dia.index >= mascara_sesion(pd.DatetimeIndex([desde]), inicio, fin, zona)[1][0]]
+    if dias is not None:
+        por_dia = por_dia.iloc[-dias:]
+    return por_dia["high"].max(), por_dia["low"].min()
+
+def test_sesion_que_cruza_la_medianoche_es_un_solo_dia():
+    indice = pd.date_range("2024-02-19 20:00", periods=12, freq="h")
+    inicio, fin, zona = cargar_sesiones(SESIONES)["Noche"]
+    mascara, dias = mascara_sesion(indice, inicio, fin, zona)
+    assert set(dias[mascara]) == {pd.Timestamp("2024-02-19")}
+
+@pytest.mark.parametrize("dias", [None, 1, 3, 5])
+def test_rango_de_los_ultimos_dias(dias):
+    df = generar_ohlcv(700, "cripto", semilla=1, intervalo="1h", fin=pd.Timestamp("2024-03-20"))
+    indice = IndiceSesiones(SESIONES, dias_rango=[3])
+    for fin in range(100, len(df), 7):
+        indice.agregar_df(df.iloc[:fin])
+        for sesion in SESIONES:
+            assert indice.rango(sesion, dias) == _rango_bruto(df.iloc[:fin], sesion, dias)
+
+    indice.agregar_df(df)
+    desde = df.index[-200]
+    indice.recortar(desde)
+    for sesion in SESIONES:
+        assert indice.rango(sesion, dias) == _rango_bruto(df, sesion, dias, desde)
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicadores_tecnicos import calcular_indicadores
+from streaming import COLUMNAS_SERIE, MotorStreaming, SerieEnVivo, servidor_replay
+
+websockets = pytest.importorskip("websockets")
+
+def test_serie_en_vivo_conserva_la_ventana_y_los_indicadores():
+    rng = np.random.default_rng(3)
+    fechas = pd.date_range("2025-01-01", periods=300, freq="4h")
+    close = 100 + np.cumsum(rng.normal(0, 1, len(fechas)))
+    df = pd.DataFrame({"open": close, "high": close + 1, "low": close - 1, "close": close}, index=fechas)
+
+    serie = SerieEnVivo("EURUSD", "EUR/USD", "4h", max_velas=50)
+    for fecha, fila in zip(fechas, df.to_numpy()):
+        serie.agregar_vela(fecha, *fila)
+    # Vela revisada y vela atrasada
+    serie.agregar_vela(fechas[-1], *df.iloc[-1])
+    assert not serie.agregar_vela(fechas[-2], *df.iloc[-2])
+
+    instantanea = serie.instantanea()
+    esperado = calcular_indicadores(df.copy())[COLUMNAS_SERIE].iloc[-50:]
+    assert len(serie) == 50 and serie.ultima_fecha() == fechas[-1]
+    np.testing.assert_array_equal(instantanea.index, esperado.index)
+    np.testing.assert_allclose(instantanea.to_numpy(), esperado.to_numpy(), rtol=1e-12)
+    # La copia entregada no cambia con las velas siguientes
+    serie.agregar_vela(fechas[-1] + pd.Timedelta("4h"), 1.0, 1.0, 1.0, 1.0)
+    assert instantanea.index[-1] == fechas[-1]
+
+def test_las_velas_se_evaluan_de_a_una_sin_frenar_la_lectura():
+    inicio = 1_750_000_000 - 1_750_000_000 % 14400
+    ticks = [(ticker, inicio + i * 3600, 1.0 + i) for i in range(12) for ticker in ("EUR/USD", "BTC/USD")]
+    leidos = threading.Event()
+    en_curso, evaluadas, solapadas = [0], [], []
+
+    def al_cerrar(nombre, intervalo, df):
+        en_curso[0] += 1
+        solapadas.append(en_curso[0] > 1)
+        # Si la lectura del socket esperara a la estrategia, nunca llegarían los demás ticks
+        assert leidos.wait(5)
+        evaluadas.append((nombre, df.index[-1]))
+        en_curso[0] -= 1
+
+    async def probar():
+        servidor = await servidor_replay(ticks, puerto=0)
+        puerto = next(iter(servidor.sockets)).getsockname()[1]
+        motor = MotorStreaming({"EURUSD": "EUR/USD", "BTC": "BTC/USD"}, ["4h"], al_cerrar,
+                               url=f"ws://127.0.0.1:{puerto}", api_key="", descargar=lambda *_: {},
+                               reloj=lambda: inicio)
+        tarea = asyncio.create_task(motor.ejecutar(max_conexiones=1))
+        while motor.ticks < len(ticks):
+            await asyncio.sleep(0.01)
+        leidos.set()
+        await asyncio.wait_for(tarea, 10)
+        servidor.close()
+
+    asyncio.run(probar())
+    assert not any(solapadas)
+    assert sorted(evaluadas) == sorted((n, pd.Timestamp(inicio + k * 14400, unit="s"))
+                                       for n in ("EURUSD", "BTC") for k in (0, 1))
+
+def test_frames_invalidos_se_omiten_sin_cortar_el_streaming():
+    inicio = 1_750_000_000 - 1_750_000_000 % 14400
+    buenos = [("EUR/USD", inicio + i * 3600, 1.0 + i) for i in range(9)]
+    malos = ["no es json", '{"event": "price", "symbol": "EUR/USD"}',
+             '{"event": "price", "symbol": "EUR/USD", "timestamp": "x", "price": 1}', "[1, 2]"]
+    ticks = buenos[:3] + malos + buenos[3:]
+    evaluadas = []
+
+    async def probar():
+        servidor = await servidor_replay(ticks, puerto=0)
+        puerto = next(iter(servidor.sockets)).getsockname()[1]
+        motor = MotorStreaming({"EURUSD": "EUR/USD"}, ["4h"],
+                               lambda nombre, intervalo, df: evaluadas.append(df.index[-1]),
+                               url=f"ws://127.0.0.1:{puerto}", api_key="", descargar=lambda *_: {},
+                               reloj=lambda: inicio)
+        await asyncio.wait_for(motor.ejecutar(max_conexiones=1), 10)
+        servidor.close()
+        return motor
+
+    motor = asyncio.run(probar())
+    assert motor.ticks == len(buenos)
+    assert evaluadas == [pd.Timestamp(inicio + k * 14400, unit="s") for k in (0, 1)]
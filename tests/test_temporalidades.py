@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from temporalidades import remuestrear, validar_anidamiento
+
+NUEVA_YORK = {"zona": "America/New_York", "hora": "17:00"}
+
+def test_base_de_4h_no_anida_en_dias_de_nueva_york():
+    with pytest.raises(ValueError, match="base"):
+        validar_anidamiento("4h", ["4h", "1day"], NUEVA_YORK)
+    validar_anidamiento("1h", ["4h", "1day", "1week", "1month"], NUEVA_YORK)
+    validar_anidamiento("4h", ["4h", "1day", "1week", "1month"], {"zona": "UTC", "hora": "00:00"})
+
+def test_validacion_coincide_con_remuestrear():
+    fechas = pd.date_range("2024-03-01", "2024-04-15", freq="4h")
+    precios = np.linspace(1, 2, len(fechas))
+    df = pd.DataFrame({"open": precios, "high": precios, "low": precios, "close": precios}, index=fechas)
+    with pytest.raises(ValueError, match="no anidan"):
+        remuestrear(df, "1day", "4h", NUEVA_YORK)
+    diario, _ = remuestrear(df, "1day", "4h", {"zona": "UTC", "hora": "00:00"})
+    assert (diario.index == diario.index.normalize()).all()
@@ -0,0 +1,38 @@
+from whatsapp_sender import DespachadorNotificaciones, TransporteFalso
+
+def _señal(activo="EURUSD", tipo="BUY"):
+    return {"activo": activo, "tipo": tipo, "mensaje": f"{tipo} {activo}"}
+
+def _despachador(transporte, reloj, **opciones):
+    return DespachadorNotificaciones(transporte=transporte, max_intentos=2, espera_reintento=0,
+                                     ventana_duplicados=100, reloj=lambda: reloj[0], dormir=lambda _: None, **opciones)
+
+def test_ventana_de_duplicados_empieza_con_la_entrega():
+    reloj = [0.0]
+    transporte = TransporteFalso()
+    despachador = _despachador(transporte, reloj)
+    assert despachador.publicar_ciclo([_señal()]) == 1
+    # Repetida mientras la primera sigue en la cola o dentro de la ventana desde su entrega
+    assert despachador.publicar_ciclo([_señal()]) == 0
+    despachador.esperar()
+    reloj[0] = 50.0
+    assert despachador.publicar_ciclo([_señal()]) == 0
+    reloj[0] = 150.0
+    assert despachador.publicar_ciclo([_señal()]) == 1
+    despachador.esperar()
+    despachador.cerrar(5)
+    assert transporte.enviados == ["BUY EURUSD", "BUY EURUSD"]
+
+def test_entrega_fallida_no_marca_la_ventana():
+    reloj = [0.0]
+    transporte = TransporteFalso(fallos=2)
+    despachador = _despachador(transporte, reloj, agrupar=True)
+    assert despachador.publicar_ciclo([_señal(), _señal("BTC", "SELL")]) == 2
+    despachador.esperar()
+    assert transporte.enviados == [] and despachador.fallidos == 1
+    # Nada se entregó: las mismas señales vuelven a avisarse y ya quedan marcadas
+    assert despachador.publicar_ciclo([_señal(), _señal("BTC", "SELL")]) == 2
+    despachador.esperar()
+    assert len(transporte.enviados) == 1
+    assert despachador.publicar_ciclo([_señal("BTC", "SELL")]) == 0
+    despachador.cerrar(5)
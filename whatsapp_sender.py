@@ -1,20 +1,240 @@
 import os
+import time
+import queue
+import atexit
+import logging
+import threading
 from dotenv import load_dotenv
-from twilio.rest import Client
+from config_activos import CONFIG
+from metricas import obtener_metricas
 
 load_dotenv()
 
-def enviar_whatsapp(mensaje):
-    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-    from_whatsapp_number = 'whatsapp:+14155238886'
-    to_whatsapp_number = os.getenv("TO_WHATSAPP")
-
-    client = Client(account_sid, auth_token)
-    message = client.messages.create(
-        body=mensaje,
-        from_=from_whatsapp_number,
-        to=to_whatsapp_number
-    )
-    print(f"✅ WhatsApp enviado. SID: {message.sid}")
+logger = logging.getLogger(__name__)
+
+# Límite de caracteres del cuerpo de un mensaje de WhatsApp en Twilio
+LIMITE_MENSAJE = 1600
+
+class TransporteTwilio:
+    """Envío por Twilio con un único Client reutilizado entre mensajes."""
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+        self.from_whatsapp_number = 'whatsapp:+14155238886'
+        self.to_whatsapp_number = os.getenv("TO_WHATSAPP")
+
+    def _obtener_client(self):
+        with self._lock:
+            if self._client is None:
+                # Importación diferida: twilio solo se carga al enviar el primer mensaje
+                from twilio.rest import Client
+
+                self._client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
+            return self._client
+
+    def enviar(self, mensaje):
+        message = self._obtener_client().messages.create(
+            body=mensaje,
+            from_=self.from_whatsapp_number,
+            to=self.to_whatsapp_number
+        )
+        return message.sid
+
+class TransporteFalso:
+    """Transporte local que registra los envíos (pruebas y modo sin Twilio)."""
+
+    def __init__(self, fallos=0):
+        self.enviados = []
+        self.fallos = fallos
+        self.intentos = 0
+
+    def enviar(self, mensaje):
+        self.intentos += 1
+        if self.fallos > 0:
+            self.fallos -= 1
+            raise ConnectionError("Fallo simulado del transporte")
+        self.enviados.append(mensaje)
+        return f"FALSO{len(self.enviados)}"
+
+class DespachadorNotificaciones:
+    """
+    Cola de notificaciones atendida por un hilo propio: la evaluación solo encola
+    y sigue, y el hilo envía con reintentos acotados y backoff exponencial.
+    Opcionalmente agrupa las señales de un ciclo en un único resumen y descarta
+    señales repetidas del mismo activo y dirección dentro de `ventana_duplicados`
+    segundos desde la última entregada (o mientras otra igual espera en la cola):
+    si la entrega falla del todo, la señal puede volver a avisarse.
+    """
+
+    def __init__(self, transporte=None, max_intentos=3, espera_reintento=2, agrupar=False,
+                 ventana_duplicados=0, reloj=time.monotonic, dormir=time.sleep):
+        self.transporte = transporte or TransporteTwilio()
+        self.max_intentos = max_intentos
+        self.espera_reintento = espera_reintento
+        self.agrupar = agrupar
+        self.ventana_duplicados = ventana_duplicados
+        self._reloj = reloj
+        self._dormir = dormir
+        self._ultimos = {}
+        self._en_cola = set()
+        self._lock = threading.Lock()
+        self._cola = queue.Queue()
+        self.enviados = 0
+        self.fallidos = 0
+        self.suprimidos = 0
+        self._hilo = threading.Thread(target=self._atender, name="notificaciones", daemon=True)
+        self._hilo.start()
+
+    def _clave(self, señal):
+        if not self.ventana_duplicados or "activo" not in señal:
+            return None
+        return (señal["activo"], señal.get("tipo"))
+
+    def _es_duplicada(self, clave):
+        """Repetida si otra igual se entregó dentro de la ventana o sigue en la cola; si no, la reserva."""
+        if clave is None:
+            return False
+        ahora = self._reloj()
+        with self._lock:
+            previo = self._ultimos.get(clave)
+            if clave in self._en_cola or (previo is not None and ahora - previo < self.ventana_duplicados):
+                return True
+            self._en_cola.add(clave)
+        return False
+
+    def _liberar(self, claves, entregado):
+        """La ventana empieza con la entrega; si falló, la clave se libera sin marcarla."""
+        ahora = self._reloj()
+        with self._lock:
+            for clave in claves:
+                self._en_cola.discard(clave)
+                if entregado:
+                    self._ultimos[clave] = ahora
 
+    def publicar(self, mensaje):
+        """Encola un mensaje de texto suelto."""
+        self._cola.put((mensaje, ()))
+
+    def publicar_ciclo(self, señales):
+        """
+        Encola las señales de un ciclo (dicts con 'activo', 'tipo' y 'mensaje').
+        Devuelve cuántas se encolaron tras descartar duplicadas.
+        """
+        validas = []
+        for señal in señales:
+            clave = self._clave(señal)
+            if self._es_duplicada(clave):
+                self.suprimidos += 1
+                logger.info(f"🔕 Señal {señal.get('tipo')} de {señal['activo']} repetida dentro de la ventana, se omite")
+            else:
+                validas.append((señal, clave))
+
+        if self.agrupar and len(validas) > 1:
+            partes = _partes_resumen([señal for señal, _ in validas])
+            for mensaje, parte in zip(_textos_resumen(partes), partes):
+                self._cola.put((mensaje, [c for c in map(self._clave, parte) if c is not None]))
+        else:
+            for señal, clave in validas:
+                self._cola.put((señal["mensaje"], () if clave is None else (clave,)))
+        return len(validas)
+
+    def _atender(self):
+        while True:
+            item = self._cola.get()
+            try:
+                if item is None:
+                    return
+                mensaje, claves = item
+                entregado = False
+                try:
+                    entregado = self._entregar(mensaje)
+                finally:
+                    self._liberar(claves, entregado)
+            finally:
+                self._cola.task_done()
+
+    def _entregar(self, mensaje):
+        metricas = obtener_metricas()
+        for intento in range(1, self.max_intentos + 1):
+            try:
+                with metricas.medir("notificacion"):
+                    sid = self.transporte.enviar(mensaje)
+                self.enviados += 1
+                logger.info(f"✅ WhatsApp enviado. SID: {sid}")
+                return True
+            except Exception as e:
+                if intento == self.max_intentos:
+                    self.fallidos += 1
+                    metricas.contar("fallos", origen="notificacion")
+                    logger.error(f"❌ Notificación descartada tras {intento} intentos: {e}")
+                    return False
+                espera = self.espera_reintento * 2 ** (intento - 1)
+                metricas.contar("reintentos", origen="notificacion")
+                logger.warning(f"🔄 Error enviando WhatsApp ({e}), reintento en {espera}s")
+                self._dormir(espera)
+
+    def esperar(self):
+        """Bloquea hasta que la cola quede vacía."""
+        self._cola.join()
+
+    def cerrar(self, timeout=None):
+        """Envía lo pendiente y detiene el hilo."""
+        if self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join(timeout)
+
+_SEPARADOR_RESUMEN = "\n\n— — —\n\n"
+
+def _partes_resumen(señales, limite=LIMITE_MENSAJE):
+    """Reparte las señales en grupos cuyos mensajes unidos respetan el límite de WhatsApp."""
+    partes, actual = [], []
+    for señal in señales:
+        candidato = _SEPARADOR_RESUMEN.join([s["mensaje"] for s in actual] + [señal["mensaje"]])
+        if actual and len(candidato) + 40 > limite:
+            partes.append(actual)
+            actual = []
+        actual.append(señal)
+    if actual:
+        partes.append(actual)
+    return partes
+
+def _textos_resumen(partes):
+    total = len(partes)
+    return [
+        f"📬 Resumen de señales ({len(p)}){f' {i}/{total}' if total > 1 else ''}\n\n"
+        + _SEPARADOR_RESUMEN.join(s["mensaje"] for s in p)
+        for i, p in enumerate(partes, 1)
+    ]
+
+def resumir_senales(señales, limite=LIMITE_MENSAJE):
+    """Une los mensajes de varias señales en resúmenes que respetan el límite de WhatsApp."""
+    return _textos_resumen(_partes_resumen(señales, limite))
+
+# Un solo cliente de Twilio para la cola y para los envíos directos
+_transporte_twilio = TransporteTwilio()
+_despachador = None
+_lock_global = threading.Lock()
+
+def obtener_despachador():
+    """Despachador compartido por el proceso, configurado desde CONFIG['notificaciones']."""
+    global _despachador
+    with _lock_global:
+        if _despachador is None:
+            conf = CONFIG.get("notificaciones", {})
+            # "transporte": "falso" registra los mensajes sin llamar a Twilio (ensayos en seco)
+            transporte = TransporteFalso() if conf.get("transporte") == "falso" else _transporte_twilio
+            _despachador = DespachadorNotificaciones(
+                transporte=transporte,
+                max_intentos=conf.get("max_intentos", 3),
+                espera_reintento=conf.get("espera_reintento", 2),
+                agrupar=conf.get("agrupar", False),
+                ventana_duplicados=conf.get("ventana_duplicados", 0),
+            )
+            atexit.register(_despachador.cerrar, 30)
+        return _despachador
+
+def enviar_whatsapp(mensaje):
+    """Envío síncrono directo (sin cola), reutilizando el cliente compartido."""
+    sid = _transporte_twilio.enviar(mensaje)
+    print(f"✅ WhatsApp enviado. SID: {sid}")